@@ -13,4 +13,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'govlink_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from network.live import live_websocket  # noqa: E402  (needs the app registry)
+
+WEBSOCKET_ROUTES = {
+    '/api/live/ws/': live_websocket,
+    '/api/network/live/ws/': live_websocket,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        handler = WEBSOCKET_ROUTES.get(scope['path'])
+        if handler is None:
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        return await handler(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -74,12 +74,24 @@ TEMPLATES = [
 
 # WSGI Application
 WSGI_APPLICATION = 'govlink_backend.wsgi.application'
+ASGI_APPLICATION = 'govlink_backend.asgi.application'
 
 # Database
+# WAL lets the dashboard read while collectors write; with WAL, synchronous=NORMAL
+# only risks the last commits on power loss, never corruption
+SQLITE_SYNCHRONOUS = config("SQLITE_SYNCHRONOUS", default="NORMAL")
+SQLITE_BUSY_TIMEOUT = config("SQLITE_BUSY_TIMEOUT", default=20.0, cast=float)
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': f'PRAGMA journal_mode=WAL; PRAGMA synchronous={SQLITE_SYNCHRONOUS}',
+            # Take the write lock at BEGIN, so writers queue on the busy timeout
+            # instead of failing when a read transaction tries to upgrade
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_BUSY_TIMEOUT,
+        },
     }
 }
 
@@ -117,7 +129,160 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.JSONParser',
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # Trusts the signed claims; no user query per request (see network/authentication.py)
+        "network.authentication.ClaimsJWTAuthentication",
     ),
 }
 AUTH_USER_MODEL = 'network.CustomUser'
+
+# Background bandwidth sampler
+BANDWIDTH_SAMPLE_INTERVAL = config("BANDWIDTH_SAMPLE_INTERVAL", default=1.0, cast=float)
+BANDWIDTH_BUFFER_SIZE = config("BANDWIDTH_BUFFER_SIZE", default=3600, cast=int)
+BANDWIDTH_INTERFACES = config(
+    "BANDWIDTH_INTERFACES", default="", cast=lambda v: [nic.strip() for nic in v.split(",") if nic.strip()]
+) or None
+
+# Time-series retention per tier, in days
+METRICS_RETENTION_DAYS = {
+    "raw": config("METRICS_RETENTION_RAW_DAYS", default=2, cast=int),
+    "1m": config("METRICS_RETENTION_1M_DAYS", default=14, cast=int),
+    "1h": config("METRICS_RETENTION_1H_DAYS", default=180, cast=int),
+    "1d": config("METRICS_RETENTION_1D_DAYS", default=1825, cast=int),
+}
+# Persist sampled bandwidth into the time-series tables every N seconds (0 disables)
+BANDWIDTH_PERSIST_INTERVAL = config("BANDWIDTH_PERSIST_INTERVAL", default=0, cast=float)
+BANDWIDTH_SERVICE_NAME = config("BANDWIDTH_SERVICE_NAME", default="local")
+
+# Concurrent ping sweeps (network-action "ping" with targets or a CIDR range)
+PING_SWEEP_CONCURRENCY = config("PING_SWEEP_CONCURRENCY", default=128, cast=int)
+PING_SWEEP_DEADLINE = config("PING_SWEEP_DEADLINE", default=15.0, cast=float)
+
+# Speed test jobs: reuse a finished result for this many seconds. Jobs are stored in
+# the database, so every worker sees the one running test; a job still active after
+# SPEED_TEST_MAX_RUNTIME seconds is assumed to have lost its worker and is failed
+SPEED_TEST_CACHE_TTL = config("SPEED_TEST_CACHE_TTL", default=300, cast=int)
+SPEED_TEST_HISTORY_SIZE = config("SPEED_TEST_HISTORY_SIZE", default=50, cast=int)
+SPEED_TEST_MAX_RUNTIME = config("SPEED_TEST_MAX_RUNTIME", default=300.0, cast=float)
+
+# Service probes: JSON inventory file plus optional inline targets
+PROBE_INVENTORY_FILE = config("PROBE_INVENTORY_FILE", default=str(BASE_DIR / "probe_inventory.json"))
+PROBE_TARGETS = []
+PROBE_CONCURRENCY = config("PROBE_CONCURRENCY", default=500, cast=int)
+PROBE_BATCH_SIZE = config("PROBE_BATCH_SIZE", default=500, cast=int)
+PROBE_FLUSH_INTERVAL = config("PROBE_FLUSH_INTERVAL", default=5.0, cast=float)
+
+# Uploaded packet captures are stored here before ingestion
+CAPTURE_DIR = config("CAPTURE_DIR", default=str(BASE_DIR / "captures"))
+CAPTURE_ANALYTICS_CACHE_SIZE = config("CAPTURE_ANALYTICS_CACHE_SIZE", default=4, cast=int)
+
+# Anomaly detection: EWMA weight per sample, samples before scoring, z-score thresholds
+ANOMALY_EWMA_ALPHA = config("ANOMALY_EWMA_ALPHA", default=0.05, cast=float)
+ANOMALY_WARMUP_SAMPLES = config("ANOMALY_WARMUP_SAMPLES", default=30, cast=int)
+ANOMALY_WARNING_Z = config("ANOMALY_WARNING_Z", default=3.0, cast=float)
+ANOMALY_CRITICAL_Z = config("ANOMALY_CRITICAL_Z", default=5.0, cast=float)
+# Open alerts not seen for this many minutes drop out of the alert feed
+ANOMALY_ALERT_TTL_MINUTES = config("ANOMALY_ALERT_TTL_MINUTES", default=60, cast=int)
+
+# Assistant LLM: OpenAI-compatible endpoint, response cache and upstream concurrency
+LLM_BASE_URL = config("LLM_BASE_URL", default="https://api.aimlapi.com/v1")
+LLM_MODEL = config("LLM_MODEL", default="mistralai/Mistral-7B-Instruct-v0.2")
+LLM_MAX_TOKENS = config("LLM_MAX_TOKENS", default=256, cast=int)
+LLM_TIMEOUT = config("LLM_TIMEOUT", default=60.0, cast=float)
+LLM_MAX_CONCURRENCY = config("LLM_MAX_CONCURRENCY", default=8, cast=int)
+LLM_CACHE_SIZE = config("LLM_CACHE_SIZE", default=256, cast=int)
+LLM_CACHE_TTL = config("LLM_CACHE_TTL", default=3600, cast=int)
+
+# Topology view: how many of the best-connected nodes a snapshot returns by default
+TOPOLOGY_SNAPSHOT_LIMIT = config("TOPOLOGY_SNAPSHOT_LIMIT", default=200, cast=int)
+
+# ISP failover: switch only when another uplink is this much cheaper for ROUTING_HOLD_SECONDS
+ROUTING_SWITCH_MARGIN = config("ROUTING_SWITCH_MARGIN", default=0.2, cast=float)
+ROUTING_HOLD_SECONDS = config("ROUTING_HOLD_SECONDS", default=30.0, cast=float)
+# Uplinks with no measurement for this long count as down; stored measurements are kept this long
+ROUTING_STALE_AFTER = config("ROUTING_STALE_AFTER", default=120.0, cast=float)
+ROUTING_MIN_THROUGHPUT = config("ROUTING_MIN_THROUGHPUT", default=0.0, cast=float)
+# Local uplinks by interface, e.g. "eth0=Zamtel,eth1=Liquid Telecom"
+ROUTING_LOCAL_SITE = config("ROUTING_LOCAL_SITE", default="Headquarters")
+ROUTING_INTERFACE_UPLINKS = config(
+    "ROUTING_INTERFACE_UPLINKS", default="",
+    cast=lambda v: dict(pair.split("=", 1) for pair in (p.strip() for p in v.split(",")) if "=" in pair),
+)
+
+# Response cache for read-only endpoints. It must be shared by every process that writes
+# (run_probes, web workers): "file" covers one host; any other value is used as a cache
+# backend path (e.g. Redis). Per-process LocMemCache is refused by a system check
+RESPONSE_CACHE_BACKEND = config("RESPONSE_CACHE_BACKEND", default="file")
+RESPONSE_CACHE_LOCATION = config("RESPONSE_CACHE_LOCATION", default=str(BASE_DIR / "cache"))
+RESPONSE_CACHE_TIMEOUT = config("RESPONSE_CACHE_TIMEOUT", default=300, cast=int)
+CACHES = {
+    "default": {
+        "BACKEND": {
+            "file": "django.core.cache.backends.filebased.FileBasedCache",
+        }.get(RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_BACKEND),
+        "LOCATION": RESPONSE_CACHE_LOCATION,
+        "TIMEOUT": RESPONSE_CACHE_TIMEOUT,
+    }
+}
+
+# JWT auth: seconds between denylist refreshes; a user cache size above 0 makes
+# request.user a cached CustomUser (one query per user per TTL) instead of the token's claims
+AUTH_DENYLIST_REFRESH = config("AUTH_DENYLIST_REFRESH", default=5.0, cast=float)
+AUTH_USER_CACHE_SIZE = config("AUTH_USER_CACHE_SIZE", default=0, cast=int)
+AUTH_USER_CACHE_TTL = config("AUTH_USER_CACHE_TTL", default=300, cast=int)
+
+# Prometheus metrics at /metrics for scrapers sending "Authorization: Bearer <METRICS_TOKEN>";
+# the endpoint refuses every scrape while METRICS_TOKEN is unset
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, "network.instrumentation.MetricsMiddleware")
+
+# manage.py startup_report: worker boot budget and modules that must stay lazily imported
+STARTUP_BUDGET_MS = config("STARTUP_BUDGET_MS", default=1500, cast=float)
+STARTUP_FORBIDDEN_IMPORTS = ["speedtest", "openai", "numpy", "psutil"]
+
+# Metric writes are queued and flushed in batches by one thread per process; set
+# METRIC_WRITE_BEHIND=False to write synchronously. Retention runs every METRIC_RETENTION_INTERVAL seconds
+# in run_probes only; without a prober, schedule manage.py prune_metrics instead
+METRIC_WRITE_BEHIND = config("METRIC_WRITE_BEHIND", default=True, cast=bool)
+METRIC_WRITER_FLUSH_ROWS = config("METRIC_WRITER_FLUSH_ROWS", default=5000, cast=int)
+METRIC_WRITER_FLUSH_INTERVAL = config("METRIC_WRITER_FLUSH_INTERVAL", default=1.0, cast=float)
+METRIC_WRITER_MAX_PENDING = config("METRIC_WRITER_MAX_PENDING", default=500000, cast=int)
+METRIC_RETENTION_INTERVAL = config("METRIC_RETENTION_INTERVAL", default=3600.0, cast=float)
+METRIC_PRUNE_CHUNK = config("METRIC_PRUNE_CHUNK", default=5000, cast=int)
+
+# Store-and-forward collector (manage.py run_agent) for offices on slow links. The
+# central server accepts its batches at /api/ingest/batches/ when AGENT_INGEST_TOKEN matches;
+# ingest is refused while no token is set
+AGENT_ID = config("AGENT_ID", default="")
+AGENT_SITE = config("AGENT_SITE", default="")
+AGENT_SERVER_URL = config("AGENT_SERVER_URL", default="http://localhost:8000/api/ingest/batches/")
+AGENT_INGEST_TOKEN = config("AGENT_INGEST_TOKEN", default="")
+AGENT_SPOOL_DIR = config("AGENT_SPOOL_DIR", default=str(BASE_DIR / "agent_spool"))
+AGENT_SEGMENT_SAMPLES = config("AGENT_SEGMENT_SAMPLES", default=5000, cast=int)
+AGENT_MAX_SPOOL_BYTES = config("AGENT_MAX_SPOOL_BYTES", default=64 * 1024 * 1024, cast=int)
+AGENT_PING_HOSTS = config(
+    "AGENT_PING_HOSTS", default="", cast=lambda v: [host.strip() for host in v.split(",") if host.strip()]
+)
+AGENT_PING_COUNT = config("AGENT_PING_COUNT", default=3, cast=int)
+AGENT_BANDWIDTH = config("AGENT_BANDWIDTH", default=True, cast=bool)
+AGENT_SAMPLE_INTERVAL = config("AGENT_SAMPLE_INTERVAL", default=60.0, cast=float)
+AGENT_UPLOAD_INTERVAL = config("AGENT_UPLOAD_INTERVAL", default=300.0, cast=float)
+AGENT_MAX_BACKOFF = config("AGENT_MAX_BACKOFF", default=3600.0, cast=float)
+INGEST_MAX_BATCH_BYTES = config("INGEST_MAX_BATCH_BYTES", default=16 * 1024 * 1024, cast=int)
+
+# /api/dashboard/snapshot/: sections run on DASHBOARD_WORKERS threads and each gets
+# DASHBOARD_SECTION_TIMEOUT seconds (per-section overrides in DASHBOARD_SECTION_TIMEOUTS)
+DASHBOARD_WORKERS = config("DASHBOARD_WORKERS", default=8, cast=int)
+DASHBOARD_SECTION_TIMEOUT = config("DASHBOARD_SECTION_TIMEOUT", default=2.0, cast=float)
+DASHBOARD_SECTION_TIMEOUTS = {}
+
+# Async views (network/async_views.py): concurrent slots per external dependency; requests
+# wait up to ASYNC_QUEUE_TIMEOUT seconds for one, then get 503. The LLM API is capped by LLM_MAX_CONCURRENCY
+ASYNC_LIMITS = {
+    "ping": config("PING_MAX_CONCURRENCY", default=256, cast=int),
+    "ping_sweep": config("PING_SWEEP_MAX_CONCURRENT", default=4, cast=int),
+    "topology": config("TOPOLOGY_MAX_CONCURRENT", default=4, cast=int),
+}
+ASYNC_QUEUE_TIMEOUT = config("ASYNC_QUEUE_TIMEOUT", default=30.0, cast=float)
+SPEEDTEST_MAX_WAIT = config("SPEEDTEST_MAX_WAIT", default=60.0, cast=float)
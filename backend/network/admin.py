@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CollectorAgent, CustomUser
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -8,4 +8,7 @@ class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'is_staff', 'is_active')
     search_fields = ('username', 'email')
 
-
+@admin.register(CollectorAgent)
+class CollectorAgentAdmin(admin.ModelAdmin):
+    list_display = ('agent_id', 'site', 'epoch', 'last_seq', 'pending', 'last_upload_at')
+    search_fields = ('agent_id', 'site')
@@ -0,0 +1,460 @@
+"""
+Store-and-forward collector for offices behind slow or intermittent links.
+
+The agent measures locally with the same code the server uses (probes via
+``NetworkMonitor``, ``execute_ping``, ``RealTimeBandwidth``) and appends
+samples to an on-disk ``Spool``. Every ``segment_samples`` samples (or each
+upload interval) the open segment is sealed under the next sequence number.
+Sealed segments are uploaded oldest first and deleted only once the server
+acknowledges them, so a restart or a dropped link resumes where it stopped.
+
+The server treats ``(agent, epoch, seq)`` as an idempotency key: a batch it
+has already stored is acknowledged again without being written twice. The
+epoch is random per spool directory and the server binds each agent id to
+the first epoch it sees. Batches from any other epoch (a wiped spool, or
+another machine reusing the id) are refused with 409 and stay spooled until
+the agent's record is deleted on the server, which rebinds it.
+
+On the wire a batch is JSON grouped by series, with timestamps as
+millisecond deltas and values as decimal deltas, deflate-compressed. Regular
+sampling makes most deltas repeat, which keeps batches to a few bytes per
+sample.
+"""
+import json
+import os
+import secrets
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib import error, request
+
+FORMAT_VERSION = 1
+CONTENT_TYPE = "application/vnd.govlink.samples+json"
+VALUE_DIGITS = 3
+DEFAULT_SEGMENT_SAMPLES = 5000
+DEFAULT_MAX_SPOOL_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_BATCH_BYTES = 16 * 1024 * 1024  # decompressed
+
+_SEGMENT_SUFFIX = ".seg"
+_OPEN_SEGMENT = "open.log"
+_STATE_FILE = "state.json"
+
+
+def _write_atomic(path, data):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Spool:
+    """
+    Append-only sample queue on disk. Samples are appended to ``open.log``
+    as JSON lines; ``seal()`` renames it to ``<seq>.seg``. When the spool
+    outgrows ``max_bytes`` the oldest sealed segments are discarded.
+    """
+
+    def __init__(self, directory, segment_samples=DEFAULT_SEGMENT_SAMPLES, max_bytes=DEFAULT_MAX_SPOOL_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_samples = segment_samples
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        state_path = self.directory / _STATE_FILE
+        if state_path.exists():
+            with open(state_path) as f:
+                state = json.load(f)
+        else:
+            state = {"epoch": secrets.token_hex(8), "next_seq": 0}
+        sealed = self.sealed()
+        # The state file is written before each rename, so it is normally
+        # ahead; take the max in case it was restored from an older copy
+        state["next_seq"] = max(state["next_seq"], sealed[-1][0] + 1 if sealed else 0)
+        self.epoch = state["epoch"]
+        self.next_seq = state["next_seq"]
+        self._save_state()
+        self._open_path = self.directory / _OPEN_SEGMENT
+        self._open_count = 0
+        if self._open_path.exists():
+            # Rewrite without a torn tail so new appends don't land behind it
+            recovered = self.read(self._open_path)
+            _write_atomic(self._open_path, "".join(self._line(sample) for sample in recovered))
+            self._open_count = len(recovered)
+        self._open = open(self._open_path, "a")
+
+    def _save_state(self):
+        _write_atomic(self.directory / _STATE_FILE, json.dumps({"epoch": self.epoch, "next_seq": self.next_seq}))
+
+    @staticmethod
+    def _line(sample):
+        return json.dumps(sample, separators=(",", ":")) + "\n"
+
+    def append(self, samples):
+        """Queue ``(service, metric, epoch_ms, value)`` samples"""
+        lines = [self._line(sample) for sample in samples]
+        written = 0
+        while written < len(lines):
+            chunk = lines[written:written + self.segment_samples - self._open_count]
+            self._open.write("".join(chunk))
+            self._open.flush()
+            self._open_count += len(chunk)
+            written += len(chunk)
+            if self._open_count >= self.segment_samples:
+                self.seal()
+        return written
+
+    def seal(self):
+        """Close the open segment under the next sequence number; returns it, or None if empty"""
+        if not self._open_count:
+            return None
+        self._open.flush()
+        os.fsync(self._open.fileno())
+        self._open.close()
+        seq = self.next_seq
+        self.next_seq += 1
+        self._save_state()
+        os.replace(self._open_path, self.directory / f"{seq:012d}{_SEGMENT_SUFFIX}")
+        self._open = open(self._open_path, "a")
+        self._open_count = 0
+        self._enforce_limit()
+        return seq
+
+    def sealed(self):
+        """``[(seq, path)]`` of sealed segments, oldest first"""
+        segments = []
+        for path in self.directory.glob(f"*{_SEGMENT_SUFFIX}"):
+            if path.stem.isdigit():
+                segments.append((int(path.stem), path))
+        return sorted(segments)
+
+    @staticmethod
+    def read(path):
+        samples = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    samples.append(json.loads(line))
+                except ValueError:
+                    break  # torn write at the tail after a crash
+        return samples
+
+    def ack(self, seq):
+        (self.directory / f"{seq:012d}{_SEGMENT_SUFFIX}").unlink(missing_ok=True)
+
+    def quarantine(self, seq):
+        """Set aside a segment the server rejected so it doesn't block the queue"""
+        path = self.directory / f"{seq:012d}{_SEGMENT_SUFFIX}"
+        if path.exists():
+            os.replace(path, path.with_suffix(".rejected"))
+
+    def _enforce_limit(self):
+        segments = self.sealed()
+        total = sum(path.stat().st_size for _, path in segments)
+        while segments and total > self.max_bytes:
+            seq, path = segments.pop(0)
+            total -= path.stat().st_size
+            self.dropped += len(self.read(path))
+            path.unlink(missing_ok=True)
+            print(f"Agent spool full: dropped segment {seq}")
+
+    @property
+    def pending(self):
+        """Sealed segments waiting for upload"""
+        return len(self.sealed())
+
+    def close(self):
+        self._open.close()
+
+
+def _scaled(value):
+    return round(value * 10 ** VALUE_DIGITS)
+
+
+def encode_batch(samples, agent_id, epoch, seq, site="", pending=0, level=9):
+    """Compressed wire form of ``(service, metric, epoch_ms, value)`` samples"""
+    series = {}
+    for service, metric, timestamp, value in samples:
+        series.setdefault((service, metric), []).append((timestamp, _scaled(value)))
+    encoded = []
+    for (service, metric), points in series.items():
+        points.sort()
+        times, values = [], []
+        previous_time = previous_value = 0
+        for timestamp, value in points:
+            times.append(timestamp - previous_time)
+            values.append(value - previous_value)
+            previous_time, previous_value = timestamp, value
+        encoded.append([service, metric, times, values])
+    payload = {
+        "v": FORMAT_VERSION, "agent": agent_id, "site": site, "epoch": epoch, "seq": seq,
+        "pending": pending, "series": encoded,
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), level)
+
+
+def decode_batch(body, max_bytes=DEFAULT_MAX_BATCH_BYTES):
+    """
+    Inverse of ``encode_batch``: returns ``(header, samples)`` with samples
+    as ``(service, metric, datetime, value)``. Raises ``ValueError`` on
+    anything malformed, including payloads that inflate past ``max_bytes``.
+    """
+    inflater = zlib.decompressobj()
+    try:
+        raw = inflater.decompress(body, max_bytes)
+    except zlib.error as e:
+        raise ValueError(f"Invalid compressed body: {str(e)}")
+    if inflater.unconsumed_tail:
+        raise ValueError(f"Batch is larger than {max_bytes} bytes uncompressed")
+    try:
+        payload = json.loads(raw)
+        if payload.get("v") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported batch version: {payload.get('v')}")
+        header = {
+            "agent": str(payload["agent"]), "site": str(payload.get("site") or ""),
+            "epoch": str(payload["epoch"]), "seq": int(payload["seq"]), "pending": int(payload.get("pending") or 0),
+        }
+        samples = []
+        scale = 10 ** VALUE_DIGITS
+        for service, metric, times, values in payload["series"]:
+            if len(times) != len(values):
+                raise ValueError(f"Mismatched series for {service}/{metric}")
+            timestamp = value = 0
+            for time_delta, value_delta in zip(times, values):
+                timestamp += int(time_delta)
+                value += int(value_delta)
+                samples.append((
+                    str(service), str(metric), datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc), value / scale,
+                ))
+    except (AttributeError, KeyError, TypeError, OverflowError) as e:
+        raise ValueError(f"Malformed batch: {str(e)}")
+    if not header["agent"] or not header["epoch"] or header["seq"] < 0:
+        raise ValueError("agent, epoch and a non-negative seq are required")
+    return header, samples
+
+
+class EpochMismatch(Exception):
+    """A batch's epoch differs from the one its agent id is bound to"""
+
+
+class RejectedBatch(Exception):
+    """The server refused a batch outright; retrying it won't help"""
+
+
+def post_batch(url, token, body, timeout=30.0):
+    """Upload one encoded batch; returns the server's JSON acknowledgement"""
+    headers = {"Content-Type": CONTENT_TYPE, "Content-Encoding": "deflate"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        with request.urlopen(request.Request(url, data=body, headers=headers, method="POST"), timeout=timeout) as r:
+            return json.loads(r.read() or b"{}")
+    except error.HTTPError as e:
+        if e.code in (400, 413, 415):
+            raise RejectedBatch(f"HTTP {e.code}: {e.read()[:200]!r}")
+        raise
+
+
+class Agent:
+    """
+    Collects on ``sample_interval`` and uploads on ``upload_interval``. After
+    a failed upload the next attempt waits twice as long, up to
+    ``max_backoff``, so a down link costs one request per backoff period.
+    """
+
+    def __init__(self, spool, server_url, agent_id, site="", token="", targets=(), ping_hosts=(),
+                 ping_count=3, bandwidth=True, sample_interval=60.0, upload_interval=300.0,
+                 max_backoff=3600.0, send=None):
+        from .network_monitor import NetworkMonitor, RealTimeBandwidth
+
+        self.spool = spool
+        self.server_url = server_url
+        self.agent_id = agent_id
+        self.site = site or agent_id
+        self.token = token
+        self.monitor = NetworkMonitor(targets) if targets else None
+        self.ping_hosts = list(ping_hosts)
+        self.ping_count = ping_count
+        self.bandwidth = None
+        if bandwidth:
+            self.bandwidth = RealTimeBandwidth()
+            self.bandwidth.get_network_usage()  # baseline; the first reading averages since boot
+        self.sample_interval = sample_interval
+        self.upload_interval = upload_interval
+        self.max_backoff = max_backoff
+        self._send = send or (lambda body: post_batch(self.server_url, self.token, body))
+        self._backoff = 0.0
+        self._next_upload = 0.0
+        self.samples_collected = 0
+        self.batches_uploaded = 0
+        self.bytes_uploaded = 0
+
+    def _ping(self, host):
+        from .network_monitor import execute_ping
+
+        return host, execute_ping(host, self.ping_count)
+
+    def collect(self):
+        """Take one round of measurements and spool them; returns the sample count"""
+        from .timeseries import network_status_samples
+
+        now = datetime.now(timezone.utc)
+        samples = []
+        if self.monitor is not None:
+            samples.extend(network_status_samples(self.monitor.get_network_status(), now))
+        if self.ping_hosts:
+            with ThreadPoolExecutor(max_workers=min(len(self.ping_hosts), 16)) as pool:
+                for host, result in pool.map(self._ping, self.ping_hosts):
+                    stats = result.get("stats") or {}
+                    service = f"{self.site}/{host}"
+                    samples.append((service, "latency", now, stats.get("avg")))
+                    samples.append((service, "packet_loss", now, 100.0 if "error" in result else stats.get("loss")))
+        if self.bandwidth is not None:
+            usage = self.bandwidth.get_network_usage()
+            samples.append((self.site, "current_usage", now, usage["current_usage"]))
+
+        rows = []
+        for service, metric, timestamp, value in samples:
+            if value is None:
+                continue
+            rows.append((service, metric, int(timestamp.timestamp() * 1000), value))
+        self.spool.append(rows)
+        self.samples_collected += len(rows)
+        return len(rows)
+
+    def upload(self):
+        """
+        Seal the open segment and upload everything spooled, oldest first.
+        Returns the number of batches acknowledged; stops at the first
+        failure and leaves the rest for the next attempt.
+        """
+        self.spool.seal()
+        uploaded = 0
+        segments = self.spool.sealed()
+        for index, (seq, path) in enumerate(segments):
+            body = encode_batch(
+                self.spool.read(path), self.agent_id, self.spool.epoch, seq,
+                site=self.site, pending=len(segments) - index - 1,
+            )
+            try:
+                self._send(body)
+            except RejectedBatch as e:
+                print(f"Agent upload rejected batch {seq}: {str(e)}")
+                self.spool.quarantine(seq)
+                continue
+            except (OSError, ValueError) as e:  # URLError, timeouts and resets are OSErrors
+                print(f"Agent upload error: {str(e)}")
+                self._backoff = min(max(self._backoff * 2, self.upload_interval), self.max_backoff)
+                self._next_upload = time.monotonic() + self._backoff
+                return uploaded
+            self.spool.ack(seq)
+            uploaded += 1
+            self.batches_uploaded += 1
+            self.bytes_uploaded += len(body)
+        self._backoff = 0.0
+        self._next_upload = time.monotonic() + self.upload_interval
+        return uploaded
+
+    def run(self, duration=None):
+        """Collect and upload until ``duration`` seconds pass (forever when ``None``)"""
+        started = time.monotonic()
+        next_sample = started
+        while duration is None or time.monotonic() - started < duration:
+            now = time.monotonic()
+            if now >= next_sample:
+                try:
+                    self.collect()
+                except Exception as e:
+                    print(f"Agent collect error: {str(e)}")
+                next_sample = max(next_sample + self.sample_interval, now)
+            if now >= self._next_upload:
+                self.upload()
+            time.sleep(max(0.0, min(next_sample, self._next_upload) - time.monotonic()))
+        self.upload()
+
+
+def store_batch(header, samples, size=0):
+    """
+    Write a decoded batch unless it was stored before. Returns
+    ``(agent, stored)``; ``stored`` is False for a replayed batch. Raises
+    ``EpochMismatch`` for an epoch other than the one the agent is bound to.
+    """
+    from django.db import transaction
+    from django.utils import timezone as django_timezone
+
+    from .models import CollectorAgent
+    from .timeseries import record_samples
+
+    with transaction.atomic():
+        agent, _ = CollectorAgent.objects.select_for_update().get_or_create(
+            agent_id=header["agent"], defaults={"epoch": header["epoch"]},
+        )
+        if agent.epoch != header["epoch"]:
+            # Never reset last_seq from a batch: that would reopen every stored seq to replays
+            raise EpochMismatch(
+                f"Agent {agent.agent_id} is bound to another spool epoch; delete it on the server to rebind"
+            )
+        stored = header["seq"] > agent.last_seq
+        if stored:
+            record_samples(samples)
+            agent.last_seq = header["seq"]
+            agent.samples_received += len(samples)
+            agent.bytes_received += size
+            if samples:
+                newest = max(sample[2] for sample in samples)
+                agent.last_sample_at = max(agent.last_sample_at, newest) if agent.last_sample_at else newest
+        agent.site = header["site"] or agent.site
+        agent.pending = header["pending"]
+        agent.last_upload_at = django_timezone.now()
+        agent.save()
+    return agent, stored
+
+
+def agent_states():
+    """Sync state of every collector agent, least recently heard from first"""
+    from .models import CollectorAgent
+
+    return [
+        {
+            "agent": agent.agent_id,
+            "site": agent.site,
+            "status": "Pending" if agent.pending else "Synced",
+            "pending_batches": agent.pending,
+            "last_upload": agent.last_upload_at.isoformat() if agent.last_upload_at else None,
+            "last_sample": agent.last_sample_at.isoformat() if agent.last_sample_at else None,
+            "samples_received": agent.samples_received,
+            "bytes_received": agent.bytes_received,
+        }
+        for agent in CollectorAgent.objects.order_by("last_upload_at")
+    ]
+
+
+def get_agent(**overrides):
+    """Build an agent from the ``AGENT_*`` settings"""
+    from django.conf import settings
+
+    from .probes import load_inventory
+
+    options = {
+        "server_url": settings.AGENT_SERVER_URL,
+        "agent_id": settings.AGENT_ID,
+        "site": settings.AGENT_SITE,
+        "token": settings.AGENT_INGEST_TOKEN,
+        "targets": load_inventory(),
+        "ping_hosts": settings.AGENT_PING_HOSTS,
+        "ping_count": settings.AGENT_PING_COUNT,
+        "bandwidth": settings.AGENT_BANDWIDTH,
+        "sample_interval": settings.AGENT_SAMPLE_INTERVAL,
+        "upload_interval": settings.AGENT_UPLOAD_INTERVAL,
+        "max_backoff": settings.AGENT_MAX_BACKOFF,
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    spool = Spool(
+        settings.AGENT_SPOOL_DIR,
+        segment_samples=settings.AGENT_SEGMENT_SAMPLES,
+        max_bytes=settings.AGENT_MAX_SPOOL_BYTES,
+    )
+    return Agent(spool, **options)
@@ -0,0 +1,415 @@
+"""
+Streaming anomaly detection over service and bandwidth metrics.
+
+Every (service, metric) series keeps constant-size state: an EWMA mean and
+variance for a rolling z-score, plus per hour-of-day baselines that are
+folded in once per hour from that hour's running mean and variance. Each
+sample is scored against the state before it is absorbed, so the cost per
+update is O(1) and history is never rescanned. Detections are deduplicated
+into one open alert per (service, metric, rule) until the series recovers.
+
+Alert transitions are queued to the metric writer's thread and stored
+there, so probes and the bandwidth sampler never wait on the database.
+Every web worker samples the same interfaces, so the store joins an open
+row for the same (service, metric, rule) rather than opening another.
+"""
+import itertools
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+SEVERITIES = ("Info", "Warning", "Critical")
+SEVERITY_RANK = {name: rank for rank, name in enumerate(SEVERITIES)}
+
+# direction: which deviations matter; min_std: noise floor in the metric's unit
+METRICS = {
+    "latency": {"direction": "up", "min_std": 1.0, "unit": "ms", "label": "latency"},
+    "packet_loss": {"direction": "up", "min_std": 0.5, "unit": "%", "label": "packet loss"},
+    "current_usage": {"direction": "both", "min_std": 0.1, "unit": "Mbps", "label": "bandwidth usage"},
+    "download_mbps": {"direction": "both", "min_std": 0.1, "unit": "Mbps", "label": "download rate"},
+    "upload_mbps": {"direction": "both", "min_std": 0.1, "unit": "Mbps", "label": "upload rate"},
+}
+DEFAULT_METRIC = {"direction": "both", "min_std": 0.0, "unit": "", "label": None}
+
+ALPHA = 0.05  # EWMA weight; roughly a 40-sample memory
+SEASONAL_ALPHA = 0.2  # weight of each new day in an hour-of-day baseline
+WARMUP = 30
+SEASONAL_WARMUP = 3  # days of data before an hour's baseline is trusted
+RELATIVE_STD_FLOOR = 0.05
+WARNING_Z = 3.0
+CRITICAL_Z = 5.0
+CLEAR_AFTER = 5  # consecutive normal samples before an alert resolves
+REFRESH_INTERVAL = 60.0
+ANOMALOUS_WEIGHT = 0.1  # fraction of the usual EWMA weight given to an anomalous sample
+
+
+class SeriesState:
+    __slots__ = (
+        "count", "mean", "var",
+        "hour", "hour_count", "hour_mean", "hour_m2",
+        "seasonal_mean", "seasonal_var", "seasonal_days",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.hour = None
+        self.hour_count = 0
+        self.hour_mean = 0.0
+        self.hour_m2 = 0.0
+        self.seasonal_mean = array("d", bytes(8 * 24))
+        self.seasonal_var = array("d", bytes(8 * 24))
+        self.seasonal_days = array("H", bytes(2 * 24))
+
+    def _roll_hour(self, hour_index):
+        """Fold the finished hour into its hour-of-day baseline"""
+        if self.hour is not None and self.hour_count >= 2:
+            slot = self.hour % 24
+            variance = self.hour_m2 / (self.hour_count - 1)
+            if self.seasonal_days[slot] == 0:
+                self.seasonal_mean[slot] = self.hour_mean
+                self.seasonal_var[slot] = variance
+            else:
+                delta = self.hour_mean - self.seasonal_mean[slot]
+                self.seasonal_mean[slot] += SEASONAL_ALPHA * delta
+                self.seasonal_var[slot] = (1 - SEASONAL_ALPHA) * (self.seasonal_var[slot] + SEASONAL_ALPHA * delta * delta) \
+                    + SEASONAL_ALPHA * variance
+            self.seasonal_days[slot] = min(self.seasonal_days[slot] + 1, 65535)
+        self.hour = hour_index
+        self.hour_count = 0
+        self.hour_mean = 0.0
+        self.hour_m2 = 0.0
+
+    def update(self, value, hour_index, alpha=ALPHA):
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            self.mean += alpha * delta
+            self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+        self.count += 1
+
+        if hour_index != self.hour:
+            self._roll_hour(hour_index)
+        self.hour_count += 1
+        delta = value - self.hour_mean
+        self.hour_mean += delta / self.hour_count
+        self.hour_m2 += delta * (value - self.hour_mean)
+
+
+def _std(variance, mean, min_std):
+    return max(math.sqrt(max(variance, 0.0)), abs(mean) * RELATIVE_STD_FLOOR, min_std, 1e-9)
+
+
+class AnomalyDetector:
+    """
+    Scores samples as they arrive and keeps one open alert per
+    (service, metric, rule). ``on_change(alert, event)`` is called with
+    ``"opened"``, ``"escalated"`` and ``"resolved"`` as they happen, and with
+    ``"updated"`` at most every ``refresh_interval`` seconds while an alert
+    stays open, so a long incident costs a handful of writes, not one per sample.
+    """
+
+    def __init__(self, alpha=ALPHA, warmup=WARMUP, warning_z=WARNING_Z, critical_z=CRITICAL_Z,
+                 clear_after=CLEAR_AFTER, refresh_interval=REFRESH_INTERVAL, on_change=None):
+        self.alpha = alpha
+        self.warmup = warmup
+        self.warning_z = warning_z
+        self.critical_z = critical_z
+        self.clear_after = clear_after
+        self.refresh_interval = refresh_interval
+        self.on_change = on_change
+        self.series = {}
+        self.active = {}  # (service, metric) -> {rule: alert}
+        self._normal_streak = {}
+        self._synced = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def observe(self, service, metric, value, timestamp=None):
+        """Score one sample, then absorb it. Returns the alerts it opened or escalated."""
+        if value is None:
+            return []
+        value = float(value)
+        if not math.isfinite(value):
+            return []  # one NaN or inf would poison the EWMA state for good
+        timestamp = timestamp or datetime.now(timezone.utc)
+        key = (service, metric)
+
+        with self._lock:
+            state = self.series.get(key)
+            if state is None:
+                state = self.series[key] = SeriesState()
+            hour_index = int(timestamp.timestamp()) // 3600
+            findings = self._evaluate(state, metric, value, hour_index % 24)
+            # Anomalous samples barely move the baseline, so an ongoing incident
+            # isn't learned as the new normal within a few samples
+            alpha = self.alpha * ANOMALOUS_WEIGHT if findings else self.alpha
+            state.update(value, hour_index, alpha)
+            return self._record(service, metric, value, timestamp, findings)
+
+    def _evaluate(self, state, metric, value, slot):
+        if metric == "up":
+            return [("down", "Critical", None, 0.0)] if value < 0.5 else []
+
+        config = METRICS.get(metric, DEFAULT_METRIC)
+        findings = []
+        if state.count >= self.warmup:
+            findings.append(self._score("spike", config, value, state.mean, state.var))
+
+        if state.seasonal_days[slot] >= SEASONAL_WARMUP:
+            finding = self._score(
+                "seasonal", config, value, state.seasonal_mean[slot], state.seasonal_var[slot]
+            )
+            if finding:
+                # Unusual only for the time of day: a Warning on its own is reported as Info
+                rule, severity, expected, z = finding
+                findings.append((rule, "Info" if severity == "Warning" else severity, expected, z))
+        return [f for f in findings if f]
+
+    def _score(self, rule, config, value, mean, variance):
+        z = (value - mean) / _std(variance, mean, config["min_std"])
+        if config["direction"] == "up":
+            magnitude = z
+        elif config["direction"] == "down":
+            magnitude = -z
+        else:
+            magnitude = abs(z)
+        if magnitude >= self.critical_z:
+            severity = "Critical"
+        elif magnitude >= self.warning_z:
+            severity = "Warning"
+        else:
+            return None
+        return (rule, severity, mean, round(magnitude, 2))
+
+    def _notify(self, key, alert, event):
+        # Called with the lock held, so on_change must only queue the event
+        self._synced[key] = time.monotonic()
+        if self.on_change:
+            try:
+                self.on_change(alert, event)
+            except Exception as e:
+                print(f"Alert {event} error: {str(e)}")
+
+    def _record(self, service, metric, value, timestamp, findings):
+        raised = []
+        flagged = set()
+        open_rules = self.active.get((service, metric))
+        for rule, severity, expected, score in findings:
+            key = (service, metric, rule)
+            flagged.add(rule)
+            self._normal_streak.pop(key, None)
+            alert = open_rules.get(rule) if open_rules else None
+            if alert is None:
+                if open_rules is None:
+                    open_rules = self.active[(service, metric)] = {}
+                alert = open_rules[rule] = {
+                    "id": next(self._ids),
+                    "service": service,
+                    "metric": metric,
+                    "rule": rule,
+                    "severity": severity,
+                    "first_seen": timestamp,
+                    "count": 0,
+                }
+                event = "opened"
+            elif SEVERITY_RANK[severity] > SEVERITY_RANK[alert["severity"]]:
+                alert["severity"] = severity
+                event = "escalated"
+            elif time.monotonic() - self._synced.get(key, 0) >= self.refresh_interval:
+                event = "updated"
+            else:
+                event = None
+            alert.update({
+                "alert": _message(service, metric, rule, value, expected),
+                "value": value,
+                "expected": expected,
+                "score": max(score, alert.get("score", 0)),
+                "timestamp": timestamp,
+                "count": alert["count"] + 1,
+            })
+            if event:
+                self._notify(key, alert, event)
+                if event != "updated":
+                    raised.append(alert)
+
+        if not open_rules:
+            return raised
+        for rule in [r for r in open_rules if r not in flagged]:
+            key = (service, metric, rule)
+            streak = self._normal_streak.get(key, 0) + 1
+            if streak >= self.clear_after:
+                alert = open_rules.pop(rule)
+                self._normal_streak.pop(key, None)
+                alert["resolved_at"] = timestamp
+                self._notify(key, alert, "resolved")
+                self._synced.pop(key, None)
+            else:
+                self._normal_streak[key] = streak
+        if not open_rules:
+            del self.active[(service, metric)]
+        return raised
+
+
+def _message(service, metric, rule, value, expected):
+    if rule == "down":
+        return f"{service} is down"
+    config = METRICS.get(metric, DEFAULT_METRIC)
+    label = config["label"] or metric.replace("_", " ")
+    unit = f" {config['unit']}" if config["unit"] else ""
+    direction = "High" if value >= expected else "Low"
+    when = " for this time of day" if rule == "seasonal" else ""
+    return (
+        f"{direction} {label}{when} on {service}: {value:.2f}{unit} "
+        f"(expected ~{expected:.2f}{unit})"
+    )
+
+
+def as_dict(alert):
+    """Shape an ``Alert`` row the way the dashboard's alert feed expects"""
+    return {
+        "id": alert.pk,
+        "alert": alert.message,
+        "severity": alert.severity,
+        "timestamp": alert.last_seen.isoformat(),
+        "service": alert.service,
+        "metric": alert.metric,
+        "rule": alert.rule,
+        "value": alert.value,
+        "expected": alert.expected,
+        "score": alert.score,
+        "count": alert.count,
+        "first_seen": alert.first_seen.isoformat(),
+        "resolved_at": alert.resolved_at.isoformat() if alert.resolved_at else None,
+    }
+
+
+def open_alerts(min_rank=0):
+    """Unresolved alerts seen within ``ANOMALY_ALERT_TTL_MINUTES``, most severe first"""
+    from datetime import timedelta
+
+    from django.conf import settings
+    from django.utils import timezone as django_timezone
+
+    from .models import Alert
+
+    stale = django_timezone.now() - timedelta(minutes=settings.ANOMALY_ALERT_TTL_MINUTES)
+    return Alert.objects.filter(
+        severity_rank__gte=min_rank, resolved_at__isnull=True, last_seen__gte=stale,
+    ).order_by("-severity_rank", "-score", "-last_seen")
+
+
+_row_ids = {}  # detector alert id -> Alert pk; only used on the writer thread
+
+
+def _open_row(series, fields, first_seen):
+    """Update the open row for ``series`` with ``fields``, creating it if there is none"""
+    from django.db import IntegrityError, transaction
+
+    from .models import Alert
+
+    for attempt in range(2):
+        row = Alert.objects.filter(resolved_at__isnull=True, **series).first()
+        if row is not None:
+            for name, value in fields.items():
+                setattr(row, name, value)
+            row.save(update_fields=list(fields))
+            return row
+        try:
+            with transaction.atomic():
+                return Alert.objects.create(first_seen=first_seen, **series, **fields)
+        except IntegrityError:
+            # Another process opened it between the read and the insert
+            if attempt:
+                raise
+
+
+def _store(alert, event):
+    """Persist alert transitions so every process (web, probe runner) shares one feed"""
+    from .live import publish_alert
+    from .models import Alert
+
+    fields = {
+        "severity": alert["severity"],
+        "severity_rank": SEVERITY_RANK[alert["severity"]],
+        "message": alert["alert"][:512],
+        "value": round(alert["value"], 3),
+        "expected": round(alert["expected"], 3) if alert["expected"] is not None else None,
+        "score": alert["score"],
+        "count": alert["count"],
+        "last_seen": alert["timestamp"],
+        "resolved_at": alert.get("resolved_at"),
+    }
+    series = {"service": alert["service"], "metric": alert["metric"], "rule": alert["rule"]}
+    pk = _row_ids.get(alert["id"])
+    if pk is not None and Alert.objects.filter(pk=pk, resolved_at__isnull=True).update(**fields):
+        row = Alert(pk=pk, first_seen=alert["first_seen"], **series, **fields)
+    elif event == "resolved":
+        # Never stored, or another process already resolved it
+        _row_ids.pop(alert["id"], None)
+        return
+    else:
+        row = _open_row(series, fields, alert["first_seen"])
+    if event == "resolved":
+        _row_ids.pop(alert["id"], None)
+    else:
+        _row_ids[alert["id"]] = row.pk
+    if event != "updated":
+        publish_alert(as_dict(row))
+
+
+def _queue_store(alert, event):
+    """``on_change`` for the process-wide detector: store on the metric writer's thread, in order"""
+    from .metric_writer import get_writer
+
+    get_writer().defer(_store, dict(alert), event)
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """Return the process-wide detector, configured from settings"""
+    global _detector
+    if _detector is None:
+        from django.conf import settings
+
+        with _detector_lock:
+            if _detector is None:
+                _detector = AnomalyDetector(
+                    alpha=getattr(settings, "ANOMALY_EWMA_ALPHA", ALPHA),
+                    warmup=getattr(settings, "ANOMALY_WARMUP_SAMPLES", WARMUP),
+                    warning_z=getattr(settings, "ANOMALY_WARNING_Z", WARNING_Z),
+                    critical_z=getattr(settings, "ANOMALY_CRITICAL_Z", CRITICAL_Z),
+                    on_change=_queue_store,
+                )
+    return _detector
+
+
+def observe_status(rows):
+    """Feed ``NetworkStatus``-shaped results (latency, packet loss, up/down)"""
+    detector = get_detector()
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        timestamp = row.get("timestamp")
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        timestamp = timestamp or now
+        service = row["service"]
+        detector.observe(service, "up", 1.0 if row.get("status") == "Up" else 0.0, timestamp)
+        if row.get("status") == "Up":
+            # A down service already raises its own alert; its 100% loss would only duplicate it
+            detector.observe(service, "latency", row.get("latency"), timestamp)
+            detector.observe(service, "packet_loss", row.get("packet_loss"), timestamp)
+
+
+def observe_bandwidth(sample, service="local"):
+    detector = get_detector()
+    timestamp = datetime.fromisoformat(sample["timestamp"])
+    for metric in ("current_usage", "download_mbps", "upload_mbps"):
+        detector.observe(service, metric, sample[metric], timestamp)
@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class NetworkConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'network'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.models.signals import post_delete, post_save
+        from .authentication import user_saved
+        from .http_cache import bandwidth_metrics_changed, check_shared_cache, network_status_changed
+        from .live import network_status_saved
+        from .models import BandwidthMetrics, CustomUser, NetworkStatus
+
+        checks.register(check_shared_cache)
+        post_save.connect(network_status_saved, sender=NetworkStatus, dispatch_uid='network_status_live')
+        post_save.connect(user_saved, sender=CustomUser, dispatch_uid='user_token_revocation')
+        for name, signal in (('save', post_save), ('delete', post_delete)):
+            signal.connect(network_status_changed, sender=NetworkStatus, dispatch_uid=f'network_status_cache_{name}')
+            signal.connect(
+                bandwidth_metrics_changed, sender=BandwidthMetrics, dispatch_uid=f'bandwidth_metrics_cache_{name}',
+            )
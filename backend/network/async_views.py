@@ -0,0 +1,281 @@
+"""
+Async endpoints for requests that spend their time waiting on something
+outside the process: ping subprocesses, the LLM API, speed tests and the
+dashboard snapshot's section pool.
+
+Served through ``govlink_backend.asgi`` these run on the event loop, so a
+slow call holds a coroutine rather than a worker thread and one process can
+keep thousands of them in flight. Pings use asyncio subprocesses, LLM
+answers stream from ``AsyncOpenAI`` on the client's own loop and queries use
+the async ORM. Each external dependency has its own concurrency limit
+(``limits.ASYNC_LIMITS``); requests beyond it queue and eventually get 503.
+
+These are plain Django views, since DRF's ``@api_view`` is sync-only;
+``async_api`` supplies the method check, JWT authentication and JSON
+errors the DRF views get from the framework.
+"""
+import asyncio
+import json
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import dashboard
+from .anomaly import SEVERITY_RANK, as_dict as alert_as_dict, open_alerts
+from .authentication import aauthenticate
+from .limits import Busy, get_limiter
+from .llm import get_llm
+from .models import Alert
+from .network_monitor import aexecute_ping
+from .ping_sweep import ping_sweep
+from .speedtest_jobs import PENDING, RUNNING, get_runner as get_speed_test_runner
+from .topology import get_topology
+
+SPEED_TEST_POLL_SECONDS = 0.25
+
+
+def async_api(methods):
+    """Method check, JWT authentication and JSON error responses for a plain async view"""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                auth = await aauthenticate(request)
+            except AuthenticationFailed as e:
+                # Same body and challenge DRF sends for a bad token
+                detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+                response = JsonResponse(detail, status=401)
+                response['WWW-Authenticate'] = 'Bearer realm="api"'
+                return response
+            if auth is not None:
+                request.user, request.auth = auth
+            try:
+                return await view(request, *args, **kwargs)
+            except Busy as e:
+                response = JsonResponse({'error': str(e)}, status=503)
+                response['Retry-After'] = str(e.retry_after)
+                return response
+        return wrapper
+    return decorator
+
+
+def _json_body(request):
+    if not request.body:
+        return {}
+    try:
+        data = json.loads(request.body)
+    except ValueError as e:
+        raise ValueError(f'JSON parse error - {str(e)}')
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    return data
+
+
+@async_api(['POST'])
+async def network_action(request):
+    try:
+        data = _json_body(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    action = data.get('action')
+    ip_address = data.get('ip_address')
+    if ip_address is not None and not isinstance(ip_address, str):
+        return JsonResponse({'error': 'ip_address must be a string'}, status=400)
+    limiter = get_limiter()
+
+    if action == 'ping':
+        targets = data.get('targets')
+        if targets is not None and not (
+            isinstance(targets, str)
+            or isinstance(targets, list) and all(isinstance(t, str) for t in targets)
+        ):
+            return JsonResponse({'error': 'targets must be a string or a list of strings'}, status=400)
+        if not targets and ip_address and '/' in ip_address:
+            targets = ip_address
+        if targets:
+            try:
+                async with limiter.slot('ping_sweep'):
+                    result = await ping_sweep(
+                        targets,
+                        concurrency=settings.PING_SWEEP_CONCURRENCY,
+                        deadline=settings.PING_SWEEP_DEADLINE,
+                    )
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            return JsonResponse(result)
+
+        if not ip_address:
+            return JsonResponse({'error': 'IP address is required'}, status=400)
+        async with limiter.slot('ping'):
+            result = await aexecute_ping(ip_address)
+        return JsonResponse(result)
+
+    elif action == 'topology':
+        try:
+            # Bringing the graph up to date reads new rows with the sync ORM
+            async with limiter.slot('topology'):
+                snapshot = await sync_to_async(
+                    lambda: get_topology().snapshot(limit=settings.TOPOLOGY_SNAPSHOT_LIMIT)
+                )()
+            return JsonResponse({'result': snapshot})
+        except Busy:
+            raise
+        except Exception as e:
+            print(f"Topology error: {str(e)}")
+            return JsonResponse({'error': 'Failed to build network topology'}, status=500)
+
+    return JsonResponse({'error': 'Invalid action'}, status=400)
+
+
+@async_api(['POST'])
+async def ask_openai(request):
+    try:
+        data = _json_body(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    question = data.get('question')
+    if not isinstance(question, str) or not question.strip():
+        return JsonResponse({'error': 'Question must be a non-empty string'}, status=400)
+
+    try:
+        chunks, cached = get_llm().astream(question)
+        if not data.get('stream'):
+            answer = ''.join([chunk async for chunk in chunks])
+            return JsonResponse({'response': answer, 'cached': cached})
+
+        # Wait for the first token so upstream failures still get a proper status code
+        first = await anext(chunks, '')
+    except Exception as e:
+        print(f"AI/ML API Error: {str(e)}")
+        return JsonResponse({'error': 'Failed to get response from AI service'}, status=500)
+
+    async def relay():
+        yield first
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            print(f"AI/ML API Error: {str(e)}")
+            yield '\n\n[Response interrupted]'
+
+    response = StreamingHttpResponse(relay(), content_type='text/plain; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    response['X-Cache'] = 'HIT' if cached else 'MISS'
+    return response
+
+
+@async_api(['GET', 'POST'])
+async def speed_test(request):
+    """
+    POST starts a speed test (or joins the running one) and returns 202 with
+    the job; ``"wait": seconds`` holds the response until it finishes, up to
+    ``SPEEDTEST_MAX_WAIT``. GET returns the latest recent result.
+    """
+    runner = get_speed_test_runner()
+    if request.method == 'POST':
+        try:
+            data = _json_body(request)
+            wait = min(max(float(data.get('wait') or 0), 0), settings.SPEEDTEST_MAX_WAIT)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        job, created = await sync_to_async(runner.submit)(force=bool(data.get('force')))
+        # The test runs on some worker's runner thread; waiting here is just polling its row
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while job.status in (PENDING, RUNNING) and loop.time() < deadline:
+            await asyncio.sleep(min(SPEED_TEST_POLL_SECONDS, deadline - loop.time()))
+            job = await runner.aget(job.job_id) or job
+        status = 202 if job.status in (PENDING, RUNNING) else 200
+        return JsonResponse(job.as_dict(), status=status)
+
+    job = await sync_to_async(runner.latest)()
+    if job is None:
+        return JsonResponse({'error': 'No recent speed test result; POST to start one'}, status=404)
+    return JsonResponse(job.result)
+
+
+@async_api(['GET'])
+async def alerts(request):
+    """Open anomaly alerts, most severe first; ``?resolved=1`` lists recently resolved ones"""
+    params = request.GET
+    min_severity = params.get('min_severity', 'Info')
+    if min_severity not in SEVERITY_RANK:
+        return JsonResponse({'error': f"min_severity must be one of {', '.join(SEVERITY_RANK)}"}, status=400)
+    try:
+        limit = min(int(params.get('limit', 50)), 500)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    if limit < 1:
+        # A negative slice bound would count from the end of the query
+        return JsonResponse({'error': 'limit must be at least 1'}, status=400)
+
+    if params.get('resolved') in ('1', 'true'):
+        query = Alert.objects.filter(
+            severity_rank__gte=SEVERITY_RANK[min_severity], resolved_at__isnull=False,
+        ).order_by('-resolved_at')
+    else:
+        query = open_alerts(SEVERITY_RANK[min_severity])
+    return JsonResponse([alert_as_dict(alert) async for alert in query[:limit]], safe=False)
+
+
+def _count_param(params, name, default, maximum):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ValueError(f'{name} must be a non-negative integer')
+    return min(value, maximum)
+
+
+@async_api(['GET'])
+async def dashboard_snapshot(request):
+    """
+    Every dashboard panel in one response, computed concurrently. ``?fields=``
+    picks sections (default: all); a section that errors or misses its
+    timeout is listed under ``errors`` and the rest are still returned.
+    Sections run on the snapshot pool; this view only awaits them.
+    """
+    params = request.GET
+    names = [name for name in params.get('fields', '').split(',') if name] or list(dashboard.SECTIONS)
+    unknown = [name for name in names if name not in dashboard.SECTIONS]
+    if unknown:
+        return JsonResponse(
+            {'error': f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(dashboard.SECTIONS)}"},
+            status=400,
+        )
+    try:
+        options = {
+            'window': _count_param(params, 'window', dashboard.DEFAULT_WINDOW, settings.BANDWIDTH_BUFFER_SIZE),
+            'alert_limit': _count_param(params, 'alert_limit', dashboard.DEFAULT_ALERT_LIMIT, 500),
+            'topology_limit': _count_param(params, 'topology_limit', dashboard.DEFAULT_TOPOLOGY_LIMIT, 5000),
+        }
+        # A client may ask for a shorter wait than configured, never a longer one
+        try:
+            cap = float(params.get('timeout', 'inf'))
+        except ValueError:
+            cap = math.nan
+        if math.isnan(cap) or cap < 0:
+            raise ValueError('timeout must be a non-negative number of seconds')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    timeouts = {name: min(limit, cap) for name, limit in settings.DASHBOARD_SECTION_TIMEOUTS.items()}
+    result = await dashboard.get_pool().asnapshot(
+        list(dict.fromkeys(names)), options, min(settings.DASHBOARD_SECTION_TIMEOUT, cap), timeouts,
+    )
+    return JsonResponse({**result['sections'], 'errors': result['errors'], 'timings_ms': result['timings_ms'],
+                         'generated_at': timezone.now().isoformat()})
@@ -0,0 +1,200 @@
+"""
+JWT authentication that trusts the token's signed claims.
+
+``LoginView`` signs the user's id, email, username and staff flags into the
+token, so ``request.user`` can be a ``TokenUser`` built from the claims
+alone and authenticating a request costs no query. Revocation is checked
+against ``Denylist``, an in-process copy of the unexpired ``RevokedToken``
+rows that re-reads only rows added since its last refresh. Views that need
+real ``CustomUser`` instances can turn on a bounded user cache instead
+(``AUTH_USER_CACHE_SIZE``), which loads each user once per TTL.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .lru import LRUCache
+
+USER_CLAIMS = ("email", "username", "is_staff", "is_superuser")
+
+
+def tokens_for(user):
+    """Refresh token (and, through it, access token) carrying the user's claims"""
+    refresh = RefreshToken.for_user(user)
+    for claim in USER_CLAIMS:
+        refresh[claim] = getattr(user, claim)
+    return refresh
+
+
+class Denylist:
+    """Revoked token ids and per-user cutoffs, refreshed from the database every ``refresh_interval`` seconds"""
+
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self.jtis = {}  # jti -> expiry (epoch seconds)
+        self.cutoffs = {}  # user id -> (revoked before, expiry)
+        self.watermark = 0
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def due(self):
+        """Whether the next ``sync()`` would query"""
+        return self._checked is None or time.monotonic() - self._checked >= self.refresh_interval
+
+    def sync(self, force=False):
+        from .models import RevokedToken
+
+        now = time.monotonic()
+        if not force and self._checked is not None and now - self._checked < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked = now
+            rows = RevokedToken.objects.filter(id__gt=self.watermark).order_by("id")
+            for pk, jti, user_id, revoked_at, expires_at in rows.values_list(
+                "id", "jti", "user_id", "revoked_at", "expires_at"
+            ):
+                if jti:
+                    self.jtis[jti] = expires_at.timestamp()
+                elif user_id is not None:
+                    before, _ = self.cutoffs.get(str(user_id), (0, 0))
+                    self.cutoffs[str(user_id)] = (max(before, int(revoked_at.timestamp())), expires_at.timestamp())
+                self.watermark = pk
+            wall = time.time()
+            self.jtis = {jti: expiry for jti, expiry in self.jtis.items() if expiry > wall}
+            self.cutoffs = {user: entry for user, entry in self.cutoffs.items() if entry[1] > wall}
+
+    def is_revoked(self, token, refresh=True):
+        if refresh:
+            self.sync()
+        if token.get(api_settings.JTI_CLAIM) in self.jtis:
+            return True
+        cutoff = self.cutoffs.get(str(token.get(api_settings.USER_ID_CLAIM)))
+        # Tokens without "iat" predate the cutoff as far as we can tell
+        return cutoff is not None and token.get("iat", 0) <= cutoff[0]
+
+
+def _expiry(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def revoke(token):
+    """Deny one validated token (access or refresh) until it expires"""
+    from .models import RevokedToken
+
+    RevokedToken.objects.create(jti=token[api_settings.JTI_CLAIM], expires_at=_expiry(token["exp"]))
+    _after_revoke()
+
+
+def revoke_user(user_id):
+    """Deny every token issued to ``user_id`` so far (password change, deactivation)"""
+    from .models import RevokedToken
+
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    RevokedToken.objects.create(user_id=user_id, expires_at=_expiry(time.time() + lifetime.total_seconds()))
+    cache = get_user_cache()
+    if cache is not None:
+        cache.set(str(user_id), None)  # reads as a miss, so the next request reloads the user
+    _after_revoke()
+
+
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    """post_save receiver: a deactivated user's outstanding tokens stop working"""
+    if not instance.is_active and (update_fields is None or "is_active" in update_fields):
+        revoke_user(instance.pk)
+
+
+def _after_revoke():
+    from .models import RevokedToken
+
+    RevokedToken.objects.filter(expires_at__lte=datetime.now(timezone.utc)).delete()
+    get_denylist().sync(force=True)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    ``JWTStatelessUserAuthentication`` plus the denylist check. With the user
+    cache enabled, ``request.user`` is the cached ``CustomUser`` instead.
+    """
+
+    def get_validated_token(self, raw_token, refresh=True):
+        token = super().get_validated_token(raw_token)
+        if get_denylist().is_revoked(token, refresh=refresh):
+            raise InvalidToken("Token has been revoked")
+        return token
+
+    def get_user(self, validated_token):
+        cache = get_user_cache()
+        if cache is None:
+            return super().get_user(validated_token)
+        user_id = str(validated_token.get(api_settings.USER_ID_CLAIM))
+        user = cache.get(user_id)
+        if user is None:
+            user = self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None or not user.is_active:
+                raise AuthenticationFailed("User not found or inactive", code="user_not_found")
+            cache.set(user_id, user)
+        return user
+
+
+async def aauthenticate(request):
+    """
+    ``ClaimsJWTAuthentication`` for plain async views: ``(user, token)``,
+    ``None`` without a bearer token, or ``AuthenticationFailed``. The token
+    is checked on the loop; only a due denylist refresh or a user cache
+    miss goes to a thread, since those query.
+    """
+    from asgiref.sync import sync_to_async
+
+    authenticator = ClaimsJWTAuthentication()
+    header = authenticator.get_header(request)
+    if header is None:
+        return None
+    raw_token = authenticator.get_raw_token(header)
+    if raw_token is None:
+        return None
+
+    denylist = get_denylist()
+    if denylist.due():
+        await sync_to_async(denylist.sync)()
+    token = authenticator.get_validated_token(raw_token, refresh=False)
+    cache = get_user_cache()
+    if cache is not None and cache.get(str(token.get(api_settings.USER_ID_CLAIM))) is None:
+        return await sync_to_async(authenticator.get_user)(token), token
+    return authenticator.get_user(token), token
+
+
+_denylist = None
+_user_cache = None
+_state_lock = threading.Lock()
+
+
+def get_denylist():
+    """Return the process-wide denylist, configured from settings"""
+    global _denylist
+    if _denylist is None:
+        from django.conf import settings
+
+        with _state_lock:
+            if _denylist is None:
+                _denylist = Denylist(refresh_interval=settings.AUTH_DENYLIST_REFRESH)
+    return _denylist
+
+
+def get_user_cache():
+    """Return the process-wide user cache, or ``None`` when ``AUTH_USER_CACHE_SIZE`` is 0"""
+    global _user_cache
+    from django.conf import settings
+
+    if settings.AUTH_USER_CACHE_SIZE <= 0:
+        return None
+    if _user_cache is None:
+        with _state_lock:
+            if _user_cache is None:
+                _user_cache = LRUCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+    return _user_cache
@@ -0,0 +1,235 @@
+import threading
+import time
+from functools import partial
+from array import array
+from datetime import datetime, timezone
+
+from .instrumentation import timed_call
+
+
+class BandwidthRingBuffer:
+    """Fixed-size ring buffer of bandwidth samples backed by typed arrays"""
+
+    FIELDS = ("timestamp", "bytes_sent", "bytes_recv", "upload_mbps", "download_mbps")
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError("Ring buffer size must be at least 1")
+        self.size = size
+        self._columns = {name: array("d", bytes(8 * size)) for name in self.FIELDS}
+        self._head = 0  # index the next sample is written to
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, bytes_sent, bytes_recv, upload_mbps, download_mbps):
+        with self._lock:
+            i = self._head
+            self._columns["timestamp"][i] = timestamp
+            self._columns["bytes_sent"][i] = bytes_sent
+            self._columns["bytes_recv"][i] = bytes_recv
+            self._columns["upload_mbps"][i] = upload_mbps
+            self._columns["download_mbps"][i] = download_mbps
+            self._head = (i + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+
+    def latest(self):
+        window = self.window(1)
+        return window[0] if window else None
+
+    def window(self, n=None):
+        """Return up to the last ``n`` samples, oldest first"""
+        with self._lock:
+            count = self._count if n is None else max(0, min(n, self._count))
+            start = (self._head - count) % self.size
+            indices = [(start + k) % self.size for k in range(count)]
+            columns = self._columns
+            return [
+                {name: columns[name][i] for name in self.FIELDS}
+                for i in indices
+            ]
+
+
+class BandwidthSampler:
+    """
+    Samples per-NIC counters on a background thread at a fixed interval and
+    stores true transfer rates in a ring buffer. Readers never touch psutil.
+    """
+
+    def __init__(self, interval=1.0, buffer_size=3600, interfaces=None,
+                 persist_interval=0, service_name="local"):
+        self.interval = interval
+        self.interfaces = set(interfaces) if interfaces else None
+        self.buffer = BandwidthRingBuffer(buffer_size)
+        self.per_nic = {}
+        self.persist_interval = persist_interval
+        self.service_name = service_name
+        self._unpersisted = []
+        self._last_persist = time.monotonic()
+        self._listeners = []
+        self._previous = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="bandwidth-sampler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def _read_counters(self):
+        import psutil
+
+        with timed_call("psutil"):
+            counters = psutil.net_io_counters(pernic=True)
+        if self.interfaces is not None:
+            counters = {nic: c for nic, c in counters.items() if nic in self.interfaces}
+        return time.monotonic(), time.time(), counters
+
+    def sample(self):
+        """Take one reading and record the delta against the previous one"""
+        mono, wall, counters = self._read_counters()
+        previous = self._previous
+        self._previous = (mono, counters)
+        if previous is None:
+            return None
+
+        elapsed = mono - previous[0]
+        if elapsed <= 0:
+            return None
+
+        total_sent = total_recv = 0
+        per_nic = {}
+        for nic, current in counters.items():
+            before = previous[1].get(nic)
+            if before is None:
+                continue
+            # Counters can wrap or reset (e.g. interface flap); skip that interval
+            sent = current.bytes_sent - before.bytes_sent
+            recv = current.bytes_recv - before.bytes_recv
+            if sent < 0 or recv < 0:
+                continue
+            total_sent += sent
+            total_recv += recv
+            per_nic[nic] = {
+                "upload_mbps": round(sent * 8 / 1_000_000 / elapsed, 3),
+                "download_mbps": round(recv * 8 / 1_000_000 / elapsed, 3),
+            }
+
+        upload_mbps = total_sent * 8 / 1_000_000 / elapsed
+        download_mbps = total_recv * 8 / 1_000_000 / elapsed
+        self.per_nic = per_nic
+        self.buffer.append(wall, total_sent, total_recv, upload_mbps, download_mbps)
+        if self.persist_interval:
+            self._unpersisted.append((wall, upload_mbps, download_mbps))
+        if self._listeners:
+            current = self.current()
+            for listener in self._listeners:
+                listener(current)
+        return self.buffer.latest()
+
+    def add_listener(self, callback):
+        """Call ``callback(current())`` from the sampler thread after every sample"""
+        self._listeners.append(callback)
+
+    def persist(self):
+        """Queue samples taken since the last call for the time-series tables"""
+        from .metric_writer import submit_samples
+
+        pending, self._unpersisted = self._unpersisted, []
+        self._last_persist = time.monotonic()
+        samples = []
+        for wall, upload_mbps, download_mbps in pending:
+            timestamp = datetime.fromtimestamp(wall, tz=timezone.utc)
+            samples.append((self.service_name, "upload_mbps", timestamp, upload_mbps))
+            samples.append((self.service_name, "download_mbps", timestamp, download_mbps))
+            samples.append((self.service_name, "current_usage", timestamp, upload_mbps + download_mbps))
+        return submit_samples(samples)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+                if self.persist_interval and time.monotonic() - self._last_persist >= self.persist_interval:
+                    self.persist()
+            except Exception as e:
+                print(f"Bandwidth sampler error: {str(e)}")
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Fell behind (suspended process, slow host); don't burst to catch up
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    @staticmethod
+    def format_sample(sample):
+        return {
+            "current_usage": round(sample["upload_mbps"] + sample["download_mbps"], 3),
+            "upload_mbps": round(sample["upload_mbps"], 3),
+            "download_mbps": round(sample["download_mbps"], 3),
+            "bytes_sent": int(sample["bytes_sent"]),
+            "bytes_recv": int(sample["bytes_recv"]),
+            "timestamp": datetime.fromtimestamp(sample["timestamp"], tz=timezone.utc).isoformat(),
+        }
+
+    def current(self):
+        sample = self.buffer.latest()
+        if sample is None:
+            return None
+        data = self.format_sample(sample)
+        data["interfaces"] = self.per_nic
+        return data
+
+    def window(self, n=None):
+        return [self.format_sample(s) for s in self.buffer.window(n)]
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """Return the process-wide sampler, starting it on first use"""
+    global _sampler
+    if _sampler is None:
+        from django.conf import settings
+
+        from .anomaly import observe_bandwidth
+
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = BandwidthSampler(
+                    interval=getattr(settings, "BANDWIDTH_SAMPLE_INTERVAL", 1.0),
+                    buffer_size=getattr(settings, "BANDWIDTH_BUFFER_SIZE", 3600),
+                    interfaces=getattr(settings, "BANDWIDTH_INTERFACES", None),
+                    persist_interval=getattr(settings, "BANDWIDTH_PERSIST_INTERVAL", 0),
+                    service_name=getattr(settings, "BANDWIDTH_SERVICE_NAME", "local"),
+                )
+                _sampler.add_listener(partial(observe_bandwidth, service=_sampler.service_name))
+                interface_uplinks = getattr(settings, "ROUTING_INTERFACE_UPLINKS", None)
+                if interface_uplinks:
+                    from .routing import observe_interfaces
+
+                    _sampler.add_listener(partial(
+                        observe_interfaces, site=settings.ROUTING_LOCAL_SITE, interface_uplinks=interface_uplinks,
+                    ))
+    _sampler.start()
+    return _sampler
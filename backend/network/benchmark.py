@@ -0,0 +1,368 @@
+"""
+Offline endpoint benchmark.
+
+Runs each scenario's requests through the full Django stack (middleware,
+authentication, views, rendering) from a pool of client threads against a
+throwaway test database seeded to the requested volume. Everything that
+would leave the process is stubbed: psutil counters, speedtest, ``ping``
+subprocesses (blocking and asyncio) and the LLM API, each with a fixed,
+configurable latency, so results only move when our code does.
+
+Results are plain dicts (written as JSON by the ``benchmark`` command) and
+``compare()`` checks them against a baseline.
+"""
+import asyncio
+import contextlib
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+BENCH_PASSWORD = "benchmark-password"
+PING_OUTPUT = (
+    "PING {host} ({host}) 56(84) bytes of data.\n"
+    "--- {host} ping statistics ---\n"
+    "{count} packets transmitted, {count} received, 0% packet loss, time 400ms\n"
+    "rtt min/avg/max/mdev = 9.812/10.204/10.931/0.402 ms\n"
+)
+
+
+class Scenario:
+    __slots__ = ("name", "method", "path", "body", "expect")
+
+    def __init__(self, name, method, path, body=None, expect=(200,)):
+        self.name = name
+        self.method = method
+        self.path = path  # str, or callable(i) -> str
+        self.body = body  # dict, or callable(i) -> dict
+        self.expect = expect
+
+    def request(self, i):
+        path = self.path(i) if callable(self.path) else self.path
+        body = self.body(i) if callable(self.body) else self.body
+        return path, body
+
+
+def scenarios(services):
+    """Benchmark scenarios by name; ``services`` are the seeded service names"""
+    service = itertools.cycle(services)
+    asked = itertools.count()  # shared across runs so every question misses the LLM cache
+    return {s.name: s for s in [
+        Scenario("network-status-latest", "GET", "/api/network-status/?latest=1"),
+        Scenario("network-status-page", "GET",
+                 lambda i: f"/api/network-status/?service={next(service)}&page_size=100"),
+        Scenario("bandwidth-metrics", "GET", "/api/bandwidth-metrics/"),
+        Scenario("bandwidth-current", "GET", "/api/bandwidth/current/"),
+        Scenario("ask", "POST", "/api/ask/", lambda i: {"question": f"Why is link {next(asked)} slow?"}),
+        Scenario("ask-cached", "POST", "/api/ask/", {"question": "Why is the network slow?"}),
+        Scenario("network-action-ping", "POST", "/api/network-action/",
+                 {"action": "ping", "ip_address": "10.0.0.1"}),
+        Scenario("network-action-sweep", "POST", "/api/network-action/",
+                 {"action": "ping", "targets": "10.0.0.0/28"}),
+        Scenario("network-action-topology", "POST", "/api/network-action/", {"action": "topology"}),
+        Scenario("alerts", "GET", "/api/alerts/"),
+        Scenario("topology", "GET", "/api/topology/"),
+        Scenario("login", "POST", "/api/login/", {"email": "bench@example.com", "password": BENCH_PASSWORD}),
+    ]}
+
+
+# Stubs for everything that would leave the process
+
+class _Counters:
+    """Monotonic fake NIC counters: roughly 80 Mbps up, 400 Mbps down"""
+
+    def __init__(self, interfaces=("eth0", "eth1")):
+        self.interfaces = interfaces
+        self.started = time.monotonic()
+
+    def __call__(self, pernic=False):
+        elapsed = time.monotonic() - self.started
+        counters = {
+            nic: SimpleNamespace(bytes_sent=int(elapsed * 10_000_000 / (k + 1)),
+                                 bytes_recv=int(elapsed * 50_000_000 / (k + 1)))
+            for k, nic in enumerate(self.interfaces)
+        }
+        if pernic:
+            return counters
+        return SimpleNamespace(bytes_sent=sum(c.bytes_sent for c in counters.values()),
+                               bytes_recv=sum(c.bytes_recv for c in counters.values()))
+
+
+def _ping_output(command):
+    count = command[command.index("-c") + 1] if "-c" in command else "4"
+    return PING_OUTPUT.format(host=command[-1], count=count).encode()
+
+
+def _popen_stub(latency):
+    class Popen:
+        def __init__(self, command, stdout=None, stderr=None, **kwargs):
+            self.command = command
+            self.returncode = None
+
+        def communicate(self, timeout=None):
+            time.sleep(latency)
+            self.returncode = 0
+            return _ping_output(self.command), b""
+
+    return Popen
+
+
+def _subprocess_exec_stub(latency):
+    class Process:
+        def __init__(self, command):
+            self.command = command
+            self.returncode = None
+
+        async def communicate(self):
+            await asyncio.sleep(latency)
+            self.returncode = 0
+            return _ping_output(self.command), b""
+
+        def kill(self):
+            self.returncode = -9
+
+        async def wait(self):
+            return self.returncode
+
+    async def create_subprocess_exec(*command, **kwargs):
+        return Process(list(command))
+
+    return create_subprocess_exec
+
+
+class _Speedtest:
+    def __init__(self, *args, **kwargs):
+        self.results = SimpleNamespace(ping=12.5)
+
+    def get_best_server(self):
+        return {}
+
+    def download(self, *args, **kwargs):
+        return 95_000_000.0
+
+    def upload(self, *args, **kwargs):
+        return 40_000_000.0
+
+
+def _llm_stub(latency, tokens=20):
+    """AsyncOpenAI-shaped client streaming ``tokens`` chunks over ``latency`` seconds"""
+    async def create(**kwargs):
+        async def events():
+            for k in range(tokens):
+                await asyncio.sleep(latency / tokens)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"token{k} "))])
+        return events()
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+@contextlib.contextmanager
+def offline_stubs(ping_latency=0.02, llm_latency=0.05):
+    """Patch external calls for the duration of the block"""
+    from . import llm, network_monitor
+
+    stub_llm = llm.LLMClient(api_key="benchmark", model="benchmark", client=_llm_stub(llm_latency))
+    stub_subprocess = SimpleNamespace(Popen=_popen_stub(ping_latency), PIPE=-1)
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch("psutil.net_io_counters", _Counters()))
+        stack.enter_context(mock.patch("psutil.boot_time", lambda: time.time() - 3600))
+        stack.enter_context(mock.patch("speedtest.Speedtest", _Speedtest))
+        stack.enter_context(mock.patch.object(network_monitor, "subprocess", stub_subprocess))
+        stack.enter_context(mock.patch("asyncio.create_subprocess_exec", _subprocess_exec_stub(ping_latency)))
+        stack.enter_context(mock.patch.object(llm, "_client", stub_llm))
+        yield
+
+
+def seed(rows, services):
+    """Fill the (test) database with ``rows`` probe results spread over ``services``"""
+    from django.utils import timezone
+
+    from .models import BandwidthMetrics, CustomUser, NetworkStatus
+
+    user = CustomUser.objects.create_user(username="bench", email="bench@example.com", password=BENCH_PASSWORD)
+    now = timezone.now()
+    batch = []
+    for i in range(rows):
+        batch.append(NetworkStatus(
+            service=services[i % len(services)],
+            latency=10 + i % 50,
+            packet_loss=0.0 if i % 97 else 5.0,
+            status="Up" if i % 211 else "Down",
+            timestamp=now - timedelta(seconds=rows - i),
+        ))
+        if len(batch) == 5000:
+            NetworkStatus.objects.bulk_create(batch)
+            batch = []
+    NetworkStatus.objects.bulk_create(batch)
+    BandwidthMetrics.objects.bulk_create([
+        BandwidthMetrics(service=name, current_usage=40.0, total_capacity=100.0, peak_time=now.time())
+        for name in services
+    ])
+    return user
+
+
+def percentile(ordered, q):
+    """Linear-interpolated ``q``-th percentile of an already sorted list"""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else None,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p90_ms": ms(percentile(ordered, 90)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else None,
+    }
+
+
+def run_scenario(scenario, requests, concurrency, token=None, warmup=5):
+    """Issue ``requests`` requests from ``concurrency`` threads; returns ``summarize()`` output"""
+    from django.test import Client
+
+    headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+    counter = itertools.count()
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def one(_):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = Client()
+        i = next(counter)
+        path, body = scenario.request(i)
+        started = time.perf_counter()
+        if scenario.method == "GET":
+            response = client.get(path, **headers)
+        else:
+            response = client.post(path, body, content_type="application/json", **headers)
+        if getattr(response, "streaming", False):
+            b"".join(response.streaming_content)
+        took = time.perf_counter() - started
+        with lock:
+            latencies.append(took)
+            if response.status_code not in scenario.expect:
+                errors.append(response.status_code)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        list(pool.map(one, range(warmup)))
+        latencies.clear()
+        errors.clear()
+        started = time.perf_counter()
+        list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - started
+    result = summarize(latencies, len(errors), elapsed)
+    if errors:
+        result["error_statuses"] = sorted(set(errors))
+    return result
+
+
+def run(names=None, requests=200, concurrency=(8,), rows=10_000, services=20, warmup=5,
+        ping_latency=0.02, llm_latency=0.05, response_cache=True, quiet=True):
+    """
+    Run the benchmark in a fresh test database and return
+    ``{"config": {...}, "results": {"<scenario>@c<n>": summary}}``.
+    """
+    import django
+    from django.test.utils import (
+        override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+    )
+
+    from .authentication import tokens_for
+
+    if requests < 1:
+        raise ValueError("requests must be at least 1")
+    if warmup < 0:
+        raise ValueError("warmup must not be negative")
+    if any(level < 1 for level in concurrency):
+        raise ValueError("concurrency levels must be at least 1")
+
+    service_names = [f"service-{k:03d}" for k in range(services)]
+    table = scenarios(service_names)
+    names = list(names or table)
+    unknown = [name for name in names if name not in table]
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(unknown)}")
+
+    backend = ("django.core.cache.backends.locmem.LocMemCache" if response_cache
+               else "django.core.cache.backends.dummy.DummyCache")
+    config = {
+        "scenarios": names, "requests": requests, "concurrency": list(concurrency), "rows": rows,
+        "services": services, "warmup": warmup, "ping_latency_s": ping_latency,
+        "llm_latency_s": llm_latency, "response_cache": response_cache,
+        "django": django.get_version(), "timestamp": time.time(),
+    }
+    results = {}
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with contextlib.ExitStack() as stack:
+            if quiet:
+                # Keep the views' debugging prints out of the report
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            stack.enter_context(override_settings(CACHES={"default": {"BACKEND": backend}}))
+            stack.enter_context(offline_stubs(ping_latency, llm_latency))
+            from .bandwidth_sampler import get_sampler
+
+            user = seed(rows, service_names)
+            token = str(tokens_for(user).access_token)
+            sampler = get_sampler()
+            sampler.sample()  # two readings so current() has a rate to report
+            time.sleep(0.01)
+            sampler.sample()
+            for name in names:
+                for workers in concurrency:
+                    results[f"{name}@c{workers}"] = run_scenario(
+                        table[name], requests, workers, token=token, warmup=warmup,
+                    )
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+    return {"config": config, "results": results}
+
+
+def compare(baseline, current, max_p95_regression=0.2, max_throughput_regression=0.2):
+    """
+    Compare two ``run()`` outputs. Returns ``(rows, regressions)``; each row
+    is ``(key, base p95, p95, p95 change, base rps, rps, rps change, regressed)``.
+    """
+    rows = []
+    regressions = []
+    for key, result in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+
+        def change(old, new):
+            return (new - old) / old if old and new is not None else None
+
+        p95_change = change(base["p95_ms"], result["p95_ms"])
+        rps_change = change(base["throughput_rps"], result["throughput_rps"])
+        regressed = (
+            (p95_change is not None and p95_change > max_p95_regression)
+            or (rps_change is not None and -rps_change > max_throughput_regression)
+            or (result["errors"] > base["errors"])
+        )
+        rows.append((key, base["p95_ms"], result["p95_ms"], p95_change,
+                     base["throughput_rps"], result["throughput_rps"], rps_change, regressed))
+        if regressed:
+            regressions.append(key)
+    return rows, regressions
@@ -0,0 +1,285 @@
+"""
+Columnar analytics over packet captures.
+
+A capture is loaded once into typed NumPy arrays (string columns are
+dictionary-encoded to integer codes) and kept in a small LRU keyed by the
+capture and how much of it has been ingested. Every analysis is then a
+handful of vectorized ``bincount``/``argpartition`` calls, and results are
+memoized per capture and (normalised) parameters in a small LRU. Time
+buckets are at least ``MIN_INTERVAL`` seconds and at most ``MAX_BUCKETS``
+per capture, so no parameter can make an analysis allocate without bound.
+"""
+import math
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from .capture_ingest import reader_for
+
+_ARP_REQUEST_RE = re.compile(r"Who has ([0-9A-Fa-f:.]+)\?")
+BROADCAST = "Broadcast"
+MIN_INTERVAL = 0.001
+MAX_BUCKETS = 100_000
+RESULT_CACHE_SIZE = 32
+
+
+class _Encoder:
+    """Maps strings to dense integer codes"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def __call__(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class CaptureColumns:
+    """Typed column arrays for one capture plus memoized analysis results"""
+
+    def __init__(self, time, length, source, destination, protocol, arp_target,
+                 hosts, protocols, arp_targets):
+        self.time = time
+        self.length = length
+        self.source = source
+        self.destination = destination
+        self.protocol = protocol
+        self.arp_target = arp_target  # code into arp_targets, -1 if not an ARP request
+        self.hosts = hosts
+        self.protocols = protocols
+        self.arp_targets = arp_targets
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def from_batches(cls, batches):
+        hosts, protocols, arp_targets = _Encoder(), _Encoder(), _Encoder()
+        time, length = array("d"), array("i")
+        source, destination, protocol, arp_target = array("i"), array("i"), array("i"), array("i")
+
+        for records, _ in batches:
+            for _, ts, src, dst, proto, size, info in records:
+                time.append(ts)
+                length.append(size)
+                source.append(hosts(src))
+                destination.append(hosts(dst))
+                protocol.append(protocols(proto))
+                target = -1
+                if proto == "ARP":
+                    match = _ARP_REQUEST_RE.match(info)
+                    if match:
+                        target = arp_targets(match.group(1))
+                arp_target.append(target)
+
+        # np.frombuffer wraps the array buffers without copying
+        return cls(
+            time=np.frombuffer(time, dtype=np.float64),
+            length=np.frombuffer(length, dtype=np.int32),
+            source=np.frombuffer(source, dtype=np.int32),
+            destination=np.frombuffer(destination, dtype=np.int32),
+            protocol=np.frombuffer(protocol, dtype=np.int32),
+            arp_target=np.frombuffer(arp_target, dtype=np.int32),
+            hosts=hosts.values,
+            protocols=protocols.values,
+            arp_targets=arp_targets.values,
+        )
+
+    def memoized(self, key, compute):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    def _buckets(self, time, width, name):
+        """Validate a bucket width in seconds for ``time``; returns it rounded to ``MIN_INTERVAL``"""
+        width = float(width)
+        if not math.isfinite(width) or width < MIN_INTERVAL:
+            raise ValueError(f"{name} must be a finite number of seconds, at least {MIN_INTERVAL}")
+        width = round(width, 3)
+        if len(time) and (float(time.max()) - float(time.min())) / width >= MAX_BUCKETS:
+            raise ValueError(f"{name} is too small for this capture (at most {MAX_BUCKETS} buckets)")
+        return width
+
+    def top_talkers(self, n=10):
+        # Clamped so every out-of-range n shares one memo entry
+        n = max(1, min(int(n), len(self.hosts)))
+
+        def compute():
+            size = len(self.hosts)
+            weights = self.length.astype(np.float64)
+            sent = np.bincount(self.source, weights=weights, minlength=size)
+            received = np.bincount(self.destination, weights=weights, minlength=size)
+            packets_sent = np.bincount(self.source, minlength=size)
+            packets_received = np.bincount(self.destination, minlength=size)
+            total = sent + received
+            count = min(n, size)
+            if count == 0:
+                return []
+            top = np.argpartition(-total, count - 1)[:count]
+            top = top[np.argsort(-total[top], kind="stable")]
+            return [
+                {
+                    "host": self.hosts[i],
+                    "bytes": int(total[i]),
+                    "bytes_sent": int(sent[i]),
+                    "bytes_received": int(received[i]),
+                    "packets_sent": int(packets_sent[i]),
+                    "packets_received": int(packets_received[i]),
+                }
+                for i in top
+            ]
+        return self.memoized(("talkers", n), compute)
+
+    def protocol_mix(self):
+        def compute():
+            size = len(self.protocols)
+            packets = np.bincount(self.protocol, minlength=size)
+            size_bytes = np.bincount(self.protocol, weights=self.length.astype(np.float64), minlength=size)
+            total_packets = max(int(packets.sum()), 1)
+            order = np.argsort(-packets, kind="stable")
+            return [
+                {
+                    "protocol": self.protocols[i],
+                    "packets": int(packets[i]),
+                    "bytes": int(size_bytes[i]),
+                    "share": round(float(packets[i]) / total_packets, 4),
+                }
+                for i in order
+            ]
+        return self.memoized(("protocols",), compute)
+
+    def throughput(self, interval=1.0):
+        """Bytes, bits/s and packets per ``interval``-second bucket of capture time"""
+        interval = self._buckets(self.time, interval, "interval")
+
+        def compute():
+            if not len(self):
+                return []
+            bucket = np.floor(self.time / interval).astype(np.int64)
+            first = int(bucket.min())
+            bucket -= first
+            size_bytes = np.bincount(bucket, weights=self.length.astype(np.float64))
+            packets = np.bincount(bucket, minlength=len(size_bytes))
+            return [
+                {
+                    "time": round((first + i) * interval, 6),
+                    "bytes": int(size_bytes[i]),
+                    "bps": round(float(size_bytes[i]) * 8 / interval, 2),
+                    "packets": int(packets[i]),
+                }
+                for i in range(len(size_bytes))
+            ]
+        return self.memoized(("throughput", interval), compute)
+
+    def arp_storms(self, window=10.0, threshold=1.0):
+        """
+        Find (requester, target) pairs whose ARP "Who has" requests exceed
+        ``threshold`` per second within any ``window``-second bucket.
+        """
+        window = self._buckets(self.time[self.arp_target >= 0], window, "window")
+        threshold = float(threshold)
+        if not math.isfinite(threshold):
+            raise ValueError("threshold must be a finite number")
+        threshold = round(threshold, 3)
+
+        def compute():
+            mask = self.arp_target >= 0
+            if not mask.any():
+                return []
+            time = self.time[mask]
+            source = self.source[mask].astype(np.int64)
+            target = self.arp_target[mask].astype(np.int64)
+            broadcast = self.hosts.index(BROADCAST) if BROADCAST in self.hosts else -1
+            to_broadcast = self.destination[mask] == broadcast
+
+            bucket = np.floor(time / window).astype(np.int64)
+            first = int(bucket.min())
+            bucket -= first
+            buckets = int(bucket.max()) + 1
+            n_targets = len(self.arp_targets)
+            key = (source * n_targets + target) * buckets + bucket
+            unique, counts = np.unique(key, return_counts=True)
+            storming = counts / window > threshold
+            if not storming.any():
+                return []
+
+            # Sparse per-pair totals; a dense hosts x targets bincount could be huge
+            pairs, inverse = np.unique(source * n_targets + target, return_inverse=True)
+            pair_totals = np.bincount(inverse)
+            broadcast_totals = np.bincount(inverse, weights=to_broadcast.astype(np.float64))
+            storms = {}
+            for k, count in zip(unique[storming], counts[storming]):
+                pair, window_index = divmod(int(k), buckets)
+                src, tgt = divmod(pair, n_targets)
+                storm = storms.get(pair)
+                if storm is None:
+                    storm = storms[pair] = {
+                        "source": self.hosts[src],
+                        "target": self.arp_targets[tgt],
+                        "requests": int(pair_totals[np.searchsorted(pairs, pair)]),
+                        "broadcast_requests": int(broadcast_totals[np.searchsorted(pairs, pair)]),
+                        "peak_rate": 0.0,
+                        "windows": [],
+                    }
+                rate = round(float(count) / window, 3)
+                storm["peak_rate"] = max(storm["peak_rate"], rate)
+                storm["windows"].append({
+                    "start": round((first + window_index) * window, 6),
+                    "requests": int(count),
+                    "rate": rate,
+                })
+            return sorted(storms.values(), key=lambda s: -s["peak_rate"])
+        return self.memoized(("arp_storms", window, threshold), compute)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_load_locks = {}
+
+
+def load_columns(capture, batches=None, cache_size=4):
+    """
+    Return ``CaptureColumns`` for a ``Capture``, loading its file on first use.
+    Entries are keyed on the ingested size so a grown capture is reloaded.
+    """
+    key = (capture.pk, capture.bytes_processed)
+    with _cache_lock:
+        columns = _cache.get(key)
+        if columns is not None:
+            _cache.move_to_end(key)
+            return columns
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    # Concurrent requests for the same capture wait for one load
+    with load_lock:
+        try:
+            with _cache_lock:
+                columns = _cache.get(key)
+            if columns is None:
+                reader = batches or reader_for(capture.path)
+                columns = CaptureColumns.from_batches(reader(capture.path))
+                with _cache_lock:
+                    _cache[key] = columns
+                    while len(_cache) > cache_size:
+                        _cache.popitem(last=False)
+        finally:
+            # Also after a failed load, or every failing capture would leave a lock behind
+            with _cache_lock:
+                _load_locks.pop(key, None)
+    return columns
@@ -0,0 +1,222 @@
+"""
+Streaming ingestion of packet captures into ``Flow`` rows.
+
+Wireshark CSV exports ("No.", "Time", "Source", "Destination", "Protocol",
+"Length", "Info") are read in fixed-size chunks of complete lines, aggregated
+per (source, destination, protocol) and merged into the database one chunk
+at a time, so memory stays flat regardless of file size. The byte offset and
+last frame number are committed with each chunk; re-running on the same file
+is a no-op and a file that has grown is resumed where it left off.
+Raw pcap/pcapng files go through ``pcap_reader`` and produce the same records.
+"""
+import csv
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from .http_cache import invalidate
+from .models import Capture, Flow, HostAddress
+from .pcap_reader import is_pcap, iter_pcap_batches
+
+# Field order of every packet record produced by a reader
+RECORD_FIELDS = ("frame", "time", "source", "destination", "protocol", "length", "info")
+CSV_COLUMNS = ("No.", "Time", "Source", "Destination", "Protocol", "Length", "Info")
+
+# File names accepted for uploaded captures
+CAPTURE_EXTENSIONS = (".csv", ".pcap", ".pcapng")
+
+CHUNK_BYTES = 2 * 1024 * 1024
+FINGERPRINT_BYTES = 64 * 1024
+_LOOKUP_CHUNK = 200
+
+_ARP_REQUEST_RE = re.compile(r"Who has \S+\? Tell ([0-9A-Fa-f:.]+)")
+_ARP_REPLY_RE = re.compile(r"([0-9A-Fa-f:.]+) is at ")
+
+
+def fingerprint(path, size=FINGERPRINT_BYTES):
+    """Hash of the first ``size`` bytes, used to tell a grown file from a different one"""
+    with open(path, "rb") as f:
+        head = f.read(size)
+    return hashlib.sha256(head).hexdigest(), len(head)
+
+
+def _column_indexes(header_line):
+    header = next(csv.reader([header_line.decode("utf-8-sig")]))
+    try:
+        return [header.index(column) for column in CSV_COLUMNS]
+    except ValueError:
+        raise ValueError(f"Not a Wireshark CSV export; expected columns {', '.join(CSV_COLUMNS)}")
+
+
+def iter_csv_batches(path, offset=0, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield ``(records, end_offset)`` for each chunk of complete lines after
+    ``offset``. A trailing partial line (file still being written) is left
+    for the next run.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        indexes = _column_indexes(header)
+        f.seek(max(offset, len(header)))
+        position = f.tell()
+
+        while True:
+            lines = f.readlines(chunk_bytes)
+            if not lines:
+                return
+            if not lines[-1].endswith(b"\n"):
+                lines.pop()
+                if not lines:
+                    return
+            data = b"".join(lines)
+            position += len(data)
+
+            records = []
+            for row in csv.reader(io.StringIO(data.decode("utf-8", errors="replace"))):
+                if not row:
+                    continue
+                try:
+                    frame, time, source, destination, protocol, length, info = (row[i] for i in indexes)
+                    records.append((int(frame), float(time), source, destination, protocol, int(length), info))
+                except (IndexError, ValueError):
+                    continue  # malformed line; skip it rather than abort a multi-GB ingest
+            yield records, position
+
+
+def reader_for(path):
+    """Pick the batch reader for a capture file: raw pcap/pcapng or a CSV export"""
+    return iter_pcap_batches if is_pcap(path) else iter_csv_batches
+
+
+def aggregate_flows(records, after_frame=0):
+    """Fold records into ``{(src, dst, proto): [packets, bytes, first, last]}``"""
+    flows = {}
+    last_frame = after_frame
+    for frame, time, source, destination, protocol, length, _ in records:
+        if frame <= after_frame:
+            continue
+        last_frame = max(last_frame, frame)
+        flow = flows.get((source, destination, protocol))
+        if flow is None:
+            flows[(source, destination, protocol)] = [1, length, time, time]
+        else:
+            flow[0] += 1
+            flow[1] += length
+            if time < flow[2]:
+                flow[2] = time
+            if time > flow[3]:
+                flow[3] = time
+    return flows, last_frame
+
+
+def arp_bindings(records):
+    """``{(ip, mac)}`` pairs announced by ARP senders; the frame source is the sender's MAC"""
+    bindings = set()
+    for _, _, source, _, protocol, _, info in records:
+        if protocol != "ARP" or not source:
+            continue
+        match = _ARP_REQUEST_RE.match(info) or _ARP_REPLY_RE.match(info)
+        if match:
+            bindings.add((match.group(1), source))
+    return bindings
+
+
+def _merge_flows(capture, flows):
+    sources = sorted({key[0] for key in flows})
+    existing = {}
+    for i in range(0, len(sources), _LOOKUP_CHUNK):
+        query = Flow.objects.filter(capture=capture, source__in=sources[i:i + _LOOKUP_CHUNK])
+        for row in query.values_list("id", "source", "destination", "protocol", "packets", "bytes",
+                                     "first_seen", "last_seen"):
+            key = row[1:4]
+            if key in flows:
+                existing[key] = row
+
+    to_create, to_update = [], []
+    for key, (packets, size, first, last) in flows.items():
+        row = existing.get(key)
+        if row is None:
+            to_create.append(Flow(
+                capture=capture, source=key[0], destination=key[1], protocol=key[2],
+                packets=packets, bytes=size, first_seen=first, last_seen=last,
+            ))
+        else:
+            pk, _, _, _, old_packets, old_bytes, old_first, old_last = row
+            to_update.append((
+                old_packets + packets, old_bytes + size, min(old_first, first), max(old_last, last), pk,
+            ))
+
+    Flow.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        table = connection.ops.quote_name(Flow._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {table} SET packets = %s, bytes = %s, first_seen = %s, last_seen = %s WHERE id = %s",
+                to_update,
+            )
+
+
+def _reset(capture, path):
+    capture.flows.all().delete()
+    capture.addresses.all().delete()
+    capture.path = str(path)
+    capture.bytes_processed = 0
+    capture.last_frame = 0
+    capture.packet_count = 0
+    capture.fingerprint, capture.fingerprint_size = fingerprint(path)
+    capture.save()
+
+
+def ingest_capture(path, name=None, batches=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Ingest new packets from ``path`` into the capture called ``name``
+    (the file name by default). Returns ``(capture, packets_ingested)``.
+    """
+    path = Path(path)
+    name = name or path.name
+    size = os.path.getsize(path)
+
+    capture, created = Capture.objects.get_or_create(name=name, defaults={"path": str(path)})
+    if created:
+        _reset(capture, path)
+    else:
+        current, _ = fingerprint(path, capture.fingerprint_size)
+        if current != capture.fingerprint or size < capture.bytes_processed:
+            # Different file under the same name: start over
+            _reset(capture, path)
+
+    if size == capture.bytes_processed:
+        return capture, 0
+
+    batches = batches or reader_for(path)
+    ingested = 0
+    for records, offset in batches(path, capture.bytes_processed, chunk_bytes=chunk_bytes):
+        flows, last_frame = aggregate_flows(records, capture.last_frame)
+        packets = sum(flow[0] for flow in flows.values())
+        bindings = arp_bindings(records)
+        with transaction.atomic():
+            if flows:
+                _merge_flows(capture, flows)
+            if bindings:
+                HostAddress.objects.bulk_create(
+                    [HostAddress(capture=capture, ip=ip, mac=mac) for ip, mac in bindings],
+                    ignore_conflicts=True,
+                )
+            capture.bytes_processed = offset
+            capture.last_frame = last_frame
+            capture.packet_count += packets
+            capture.save(update_fields=["bytes_processed", "last_frame", "packet_count", "updated_at"])
+        if flows or bindings:
+            invalidate("topology")
+        ingested += packets
+
+    if capture.fingerprint_size < FINGERPRINT_BYTES and capture.bytes_processed > capture.fingerprint_size:
+        capture.fingerprint, capture.fingerprint_size = fingerprint(
+            path, min(capture.bytes_processed, FINGERPRINT_BYTES)
+        )
+        capture.save(update_fields=["fingerprint", "fingerprint_size", "updated_at"])
+    return capture, ingested
@@ -0,0 +1,202 @@
+"""
+Everything the dashboard shows on load, in one response.
+
+Each section is an independent function of the request's options.
+``snapshot()`` runs the requested sections concurrently on a shared thread
+pool and waits at most ``timeout`` seconds for each (``asnapshot()`` waits
+on the event loop instead of a thread); a section that isn't
+ready in time is reported under ``errors`` and left out, so a slow source
+costs the client one panel rather than the whole page. A section still
+running for an earlier request with the same options is joined instead of
+started again, so a hung source holds one worker, not one per request.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_WINDOW = 60
+DEFAULT_ALERT_LIMIT = 20
+DEFAULT_TOPOLOGY_LIMIT = 50
+
+
+def _status(options):
+    from .models import NetworkStatus
+    from .views import STATUS_FIELDS, latest_status_ids
+
+    rows = NetworkStatus.objects.filter(id__in=latest_status_ids()).values(*STATUS_FIELDS)
+    return list(rows.order_by("service"))
+
+
+def _bandwidth(options):
+    from .bandwidth_sampler import get_sampler
+
+    sampler = get_sampler()
+    return {"current": sampler.current(), "window": sampler.window(options["window"])}
+
+
+def _bandwidth_metrics(options):
+    from .views import bandwidth_metric_rows
+
+    return bandwidth_metric_rows()
+
+
+def _alerts(options):
+    from .anomaly import as_dict, open_alerts
+
+    return [as_dict(alert) for alert in open_alerts()[:options["alert_limit"]]]
+
+
+def _topology(options):
+    from .topology import get_topology
+
+    graph = get_topology()
+    snapshot = graph.snapshot(limit=options["topology_limit"])
+    types = {}
+    for node in snapshot["nodes"]:
+        types[node["type"]] = types.get(node["type"], 0) + 1
+    return {"nodes": len(graph.nodes), "links": len(graph.links), "shown_by_type": types, **snapshot}
+
+
+def _routing(options):
+    from . import routing
+
+    return routing.current_recommendations()
+
+
+def _sync(options):
+    from .agent import agent_states
+
+    return agent_states()
+
+
+# Section name -> (function, options it depends on)
+SECTIONS = {
+    "status": (_status, ()),
+    "bandwidth": (_bandwidth, ("window",)),
+    "bandwidth_metrics": (_bandwidth_metrics, ()),
+    "alerts": (_alerts, ("alert_limit",)),
+    "topology": (_topology, ("topology_limit",)),
+    "routing": (_routing, ()),
+    "sync": (_sync, ()),
+}
+
+
+def _run(function, options):
+    from django.db import close_old_connections
+
+    try:
+        return function(options)
+    finally:
+        # Pool threads outlive the request; don't leave their connections open
+        close_old_connections()
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _waiter(future, loop):
+    """An asyncio future on ``loop`` that completes with ``future``; never cancels the shared section"""
+    waiter = loop.create_future()
+
+    def done(_):
+        try:
+            loop.call_soon_threadsafe(_wake, waiter)
+        except RuntimeError:
+            pass  # the loop is gone; its request stopped waiting
+
+    future.add_done_callback(done)
+    return waiter
+
+
+class SnapshotPool:
+    def __init__(self, workers=8):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dashboard")
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, options):
+        function, depends_on = SECTIONS[name]
+        key = (name,) + tuple(options[option] for option in depends_on)
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None:
+                return future
+            future = self._running[key] = self.executor.submit(_run, function, options)
+        # Outside the lock: the callback runs immediately if the section already finished
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._running.get(key) is future:
+                del self._running[key]
+
+    def _start(self, names, options):
+        started = time.perf_counter()
+        finished = {}
+        futures = {}
+        for name in names:
+            futures[name] = future = self.submit(name, options)
+            future.add_done_callback(lambda done, name=name: finished.setdefault(name, time.perf_counter()))
+        return started, finished, futures
+
+    @staticmethod
+    def _report(names, futures, limits, started, finished):
+        sections, errors = {}, {}
+        for name in names:
+            future = futures[name]
+            if not future.done():
+                errors[name] = f"timed out after {limits[name]:g}s"
+                continue
+            try:
+                sections[name] = future.result()
+            except Exception as e:
+                print(f"Dashboard section {name} error: {str(e)}")
+                errors[name] = str(e) or e.__class__.__name__
+        timings = {
+            name: round((finished.get(name, time.perf_counter()) - started) * 1000, 1) for name in names
+        }
+        return {"sections": sections, "errors": errors, "timings_ms": timings}
+
+    def snapshot(self, names, options, timeout, timeouts=None):
+        """
+        ``{"sections": {...}, "errors": {...}, "timings_ms": {...}}`` for the
+        requested section names. Each section gets ``timeouts[name]`` (or
+        ``timeout``) seconds counted from the start of the call, so the
+        whole snapshot takes no longer than the largest of them.
+        """
+        limits = {name: (timeouts or {}).get(name, timeout) for name in names}
+        started, finished, futures = self._start(names, options)
+        for name in sorted(names, key=limits.get):
+            wait([futures[name]], timeout=max(limits[name] - (time.perf_counter() - started), 0))
+        return self._report(names, futures, limits, started, finished)
+
+    async def asnapshot(self, names, options, timeout, timeouts=None):
+        """``snapshot()`` for async views: waits on the event loop, so it holds no thread"""
+        loop = asyncio.get_running_loop()
+        limits = {name: (timeouts or {}).get(name, timeout) for name in names}
+        started, finished, futures = self._start(names, options)
+        for name in sorted(names, key=limits.get):
+            remaining = limits[name] - (time.perf_counter() - started)
+            if not futures[name].done() and remaining > 0:
+                await asyncio.wait([_waiter(futures[name], loop)], timeout=remaining)
+        return self._report(names, futures, limits, started, finished)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide section pool, sized from settings"""
+    global _pool
+    if _pool is None:
+        from django.conf import settings
+
+        with _pool_lock:
+            if _pool is None:
+                _pool = SnapshotPool(workers=settings.DASHBOARD_WORKERS)
+    return _pool
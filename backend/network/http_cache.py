@@ -0,0 +1,196 @@
+"""
+Conditional GET and shared response caching for read-only endpoints.
+
+Every cached view declares the data "scopes" it reads (``network_status``,
+``network_status:<service>``, ``topology``, ...). Each scope has a version
+in the shared cache: the time of the last write that touched it. A
+response's ETag is derived from the request and those versions alone, so
+answering ``If-None-Match`` with 304, or serving the stored body, takes a
+couple of cache reads and no database or serializer work. Writers call
+``invalidate()`` for the scopes they changed; entries for old versions are
+never read again and simply expire.
+
+Writers run in other processes (``run_probes``, the metric writer, capture
+ingest), so the cache must be shared: a per-process backend would never see
+their invalidations, and a system check refuses one. Stored bodies are only
+served to requests the view's DRF authentication and permissions accept.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core import checks
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+VERSION_PREFIX = "scope-version:"
+RESPONSE_PREFIX = "response:"
+
+
+def _alias():
+    from django.conf import settings
+
+    return getattr(settings, "RESPONSE_CACHE_ALIAS", "default")
+
+
+def _cache():
+    return caches[_alias()]
+
+
+def _timeout():
+    from django.conf import settings
+
+    return getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+
+
+def invalidate(*scopes):
+    """Record a write to ``scopes``; later requests get new ETags and fresh bodies"""
+    if not scopes:
+        return
+    now = time.time()
+    try:
+        # Versions must outlive any response cached under them
+        _cache().set_many({VERSION_PREFIX + scope: now for scope in scopes}, timeout=None)
+    except Exception as e:
+        print(f"Cache invalidation error: {str(e)}")
+
+
+def status_scopes(services):
+    """Scopes touched by new ``NetworkStatus`` rows for ``services``"""
+    return ["network_status", *(f"network_status:{service}" for service in set(services))]
+
+
+def scope_versions(scopes):
+    cache = _cache()
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Unknown scope (cold cache): treat "now" as its last write
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        versions.update(cache.get_many(missing))
+    # None where the cache kept nothing (e.g. DummyCache): no stable ETag then
+    return [versions.get(key) for key in keys]
+
+
+def _etag(request, scopes, versions):
+    digest = hashlib.sha256()
+    digest.update(request.path.encode())
+    digest.update(b"?")
+    digest.update("&".join(sorted(f"{k}={v}" for k, v in request.GET.lists())).encode())
+    digest.update(request.META.get("HTTP_ACCEPT", "").encode())
+    for scope, version in zip(scopes, versions):
+        digest.update(f"|{scope}={version!r}".encode())
+    return quote_etag(digest.hexdigest()[:40])
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        return etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*"
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(last_modified) <= since
+
+
+def _allowed(view, request, args, kwargs):
+    """Whether DRF would let ``request`` reach ``view``: authenticated as it requires and permitted"""
+    cls = getattr(view, "cls", None)
+    if cls is None:
+        return True
+    instance = cls(**getattr(view, "initkwargs", {}))
+    instance.args, instance.kwargs = args, kwargs
+    instance.format_kwarg = None
+    instance.request = instance.initialize_request(request, *args, **kwargs)
+    try:
+        instance.perform_authentication(instance.request)
+        instance.check_permissions(instance.request)
+    except APIException:
+        return False
+    return True
+
+
+def _with_validators(response, etag, last_modified, hit):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # Clients may keep the body but must revalidate; revalidation is cheap here
+    response["Cache-Control"] = "no-cache"
+    response["X-Cache"] = "HIT" if hit else "MISS"
+    return response
+
+
+def cache_response(scopes):
+    """
+    Decorate a DRF view (``@api_view`` function or ``as_view()``) whose
+    output depends only on the request URL and the data in ``scopes``: a
+    list, or a callable taking the request and returning one. Requests the
+    view would refuse go straight to it, so they get its 401/403.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not _allowed(view, request, args, kwargs):
+                return view(request, *args, **kwargs)
+
+            names = scopes(request) if callable(scopes) else list(scopes)
+            try:
+                versions = scope_versions(names)
+            except Exception as e:
+                print(f"Response cache error: {str(e)}")
+                return view(request, *args, **kwargs)
+            if None in versions:
+                return view(request, *args, **kwargs)
+            etag = _etag(request, names, versions)
+            last_modified = max(versions, default=time.time())
+
+            if _not_modified(request, etag, last_modified):
+                return _with_validators(HttpResponse(status=304), etag, last_modified, True)
+
+            cache = _cache()
+            stored = cache.get(RESPONSE_PREFIX + etag)
+            if stored is not None:
+                status, content_type, content = stored
+                response = HttpResponse(content, status=status, content_type=content_type)
+                return _with_validators(response, etag, last_modified, True)
+
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render") and not getattr(response, "is_rendered", True):
+                response.render()
+            if response.status_code == 200 and not response.streaming:
+                cache.set(
+                    RESPONSE_PREFIX + etag,
+                    (response.status_code, response.get("Content-Type"), response.content),
+                    timeout=_timeout(),
+                )
+                _with_validators(response, etag, last_modified, False)
+            return response
+        return wrapped
+    return decorator
+
+
+def network_status_changed(sender, instance, **kwargs):
+    """post_save/post_delete receiver for rows written one at a time (admin, shell)"""
+    # Service nodes in the topology are built from status rows too
+    invalidate("topology", *status_scopes([instance.service]))
+
+
+def bandwidth_metrics_changed(sender, instance, **kwargs):
+    invalidate("bandwidth_metrics")
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """System check: the response cache must be visible to every process that writes"""
+    from django.conf import settings
+
+    backend = settings.CACHES.get(_alias(), {}).get("BACKEND", "")
+    if backend.endswith("LocMemCache"):
+        return [checks.Error(
+            f"The response cache ({_alias()!r}) uses LocMemCache, which is private to each process",
+            hint="Invalidations from run_probes and other workers would never arrive. "
+                 "Set RESPONSE_CACHE_BACKEND to 'file' (one host) or a shared backend such as Redis.",
+            id="network.E001",
+        )]
+    return []
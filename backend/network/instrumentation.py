@@ -0,0 +1,337 @@
+"""
+Request and dependency instrumentation exposed in Prometheus text format.
+
+Metrics are cheap enough to leave on: every thread writes to its own
+shard (a plain dict reached through ``threading.local``), so recording a
+value takes no lock, and histograms use fixed buckets, so an observation
+is one ``bisect`` and two increments. Shards are only summed when
+``/metrics`` is scraped; shards of threads that have exited are folded into
+a retired total then, so thread churn doesn't grow memory.
+
+``MetricsMiddleware`` times every request per URL name and counts its
+database queries; ``timed()`` wraps calls to things outside the process
+(ping, speedtest, psutil, the LLM API). ``/metrics`` answers only scrapes
+that present ``METRICS_TOKEN``.
+"""
+import hmac
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "".join(metric.render() for metric in list(self.metrics))
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (thread, data) for every thread that has recorded a value
+        self._retired = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _data(self):
+        try:
+            return self._local.data
+        except AttributeError:
+            data = self._local.data = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), data))
+            return data
+
+    def _merge(self, into, data):
+        raise NotImplementedError
+
+    def collect(self):
+        """Sum of all shards: ``{label values: value}``"""
+        with self._lock:
+            alive = []
+            for thread, data in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, data))
+                else:
+                    self._merge(self._retired, data)
+            self._shards = alive
+            total = {}
+            self._merge(total, self._retired)
+            for _, data in alive:
+                self._merge(total, dict(data))  # dict() is a single C-level copy
+        return total
+
+    def _header(self):
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.type}\n"
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, labels=()):
+        data = self._data()
+        data[labels] = data.get(labels, 0) + amount
+
+    def _merge(self, into, data):
+        for labels, value in data.items():
+            into[labels] = into.get(labels, 0) + value
+
+    def render(self):
+        lines = [self._header()]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}\n")
+        return "".join(lines)
+
+
+class Gauge(Counter):
+    """Up/down counter; each thread's increments and decrements net out on collection"""
+    type = "gauge"
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value, labels=()):
+        data = self._data()
+        cell = data.get(labels)
+        if cell is None:
+            # One count per bucket, one for +Inf, then the sum
+            cell = data[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def _merge(self, into, data):
+        for labels, cell in data.items():
+            total = into.get(labels)
+            if total is None:
+                into[labels] = list(cell)
+            else:
+                for i, value in enumerate(cell):
+                    total[i] += value
+
+    def render(self):
+        lines = [self._header()]
+        for labels, cell in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), cell):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}\n")
+            label_text = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(cell[-1])}\n")
+            lines.append(f"{self.name}_count{label_text} {cumulative}\n")
+        return "".join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    "govlink_http_request_duration_seconds", "Time to produce a response, by URL name", ("view", "method"),
+)
+REQUESTS = Counter("govlink_http_requests_total", "Responses by URL name and status", ("view", "method", "status"))
+REQUESTS_IN_FLIGHT = Gauge("govlink_http_requests_in_flight", "Requests being handled")
+DB_QUERIES = Histogram(
+    "govlink_db_queries_per_request", "Database queries run by one request", ("view",), buckets=QUERY_BUCKETS,
+)
+DB_TIME = Histogram("govlink_db_query_seconds_per_request", "Time one request spent in database queries", ("view",))
+EXTERNAL_DURATION = Histogram(
+    "govlink_external_call_duration_seconds", "Calls to ping, speedtest, psutil and the LLM API", ("call",),
+)
+EXTERNAL_ERRORS = Counter("govlink_external_call_errors_total", "External calls that raised", ("call",))
+EXTERNAL_IN_FLIGHT = Gauge("govlink_external_calls_in_flight", "External calls in progress", ("call",))
+
+
+@contextmanager
+def timed_call(call):
+    """Time the block as external call ``call``; exceptions are counted and re-raised"""
+    labels = (call,)
+    EXTERNAL_IN_FLIGHT.inc(1, labels)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        EXTERNAL_ERRORS.inc(1, labels)
+        raise
+    finally:
+        EXTERNAL_DURATION.observe(time.perf_counter() - started, labels)
+        EXTERNAL_IN_FLIGHT.dec(1, labels)
+
+
+def timed(call):
+    """Decorator form of ``timed_call`` for plain and ``async`` functions"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed_call(call):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed_call(call):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# Query stats of the request being handled. Context variables follow a
+# request into sync_to_async threads, so queries are charged to the right
+# request whichever thread and connection run them.
+_request_queries = ContextVar("request_queries", default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+def install_query_counter(sender=None, connection=None, **kwargs):
+    """``connection_created`` receiver: route the connection's queries through ``_count_query``"""
+    if connection is not None and _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.url_name or match.view_name or "unnamed"
+
+
+class MetricsMiddleware:
+    """Per-view latency, status and database usage; put it first in ``MIDDLEWARE``"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_counter, dispatch_uid="metrics_query_counter")
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection=connection)
+
+    def _record(self, request, response, started, queries):
+        view = _view_name(request)
+        method = request.method
+        status = response.status_code if response is not None else 500
+        REQUEST_DURATION.observe(time.perf_counter() - started, (view, method))
+        REQUESTS.inc(1, (view, method, str(status)))
+        DB_QUERIES.observe(queries.count, (view,))
+        DB_TIME.observe(queries.seconds, (view,))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = _QueryStats()
+        token = _request_queries.set(queries)
+        response = None
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+            self._record(request, response, started, queries)
+
+    async def __acall__(self, request):
+        queries = _QueryStats()
+        token = _request_queries.set(queries)
+        response = None
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+            self._record(request, response, started, queries)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    from django.conf import settings
+    from django.http import HttpResponse, HttpResponseForbidden
+
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponseForbidden("Metrics scraping is disabled; set METRICS_TOKEN")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden("Invalid metrics token")
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,87 @@
+"""
+Per-dependency concurrency limits for the async views.
+
+Each external dependency named in ``ASYNC_LIMITS`` (ping subprocesses, ping
+sweeps, topology builds) gets a semaphore. A request over the limit waits
+as a coroutine for up to ``ASYNC_QUEUE_TIMEOUT`` seconds and is then turned
+away with 503, so a burst queues cheaply instead of spawning thousands of
+subprocesses. The LLM API is limited inside ``llm.LLMClient`` and speed
+tests by ``speedtest_jobs``, which already run one at a time.
+
+asyncio semaphores belong to one event loop, so limits apply per loop: per
+worker process under ASGI, per request when a sync server runs async views.
+"""
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+from .instrumentation import Counter, Gauge
+
+WAITING = Gauge("govlink_dependency_waiting", "Requests queued for a dependency slot", ("dependency",))
+ACTIVE = Gauge("govlink_dependency_active", "Requests holding a dependency slot", ("dependency",))
+REJECTED = Counter(
+    "govlink_dependency_rejected_total", "Requests turned away after waiting too long for a slot", ("dependency",),
+)
+
+
+class Busy(Exception):
+    """No slot for ``dependency`` freed up within the queue timeout"""
+
+    def __init__(self, dependency, retry_after):
+        super().__init__(f"Too many concurrent {dependency} requests; try again shortly")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class Limiter:
+    def __init__(self, limits, queue_timeout=30.0):
+        self.limits = dict(limits)
+        self.queue_timeout = queue_timeout
+        self._semaphores = weakref.WeakKeyDictionary()  # loop -> {dependency: Semaphore}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, dependency):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            semaphore = semaphores.get(dependency)
+            if semaphore is None:
+                semaphore = semaphores[dependency] = asyncio.Semaphore(self.limits[dependency])
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self, dependency):
+        """Hold one of ``dependency``'s slots for the block; raises ``Busy`` if none frees up in time"""
+        semaphore = self._semaphore(dependency)
+        labels = (dependency,)
+        WAITING.inc(1, labels)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            REJECTED.inc(1, labels)
+            raise Busy(dependency, retry_after=max(1, round(self.queue_timeout / 2)))
+        finally:
+            WAITING.dec(1, labels)
+        ACTIVE.inc(1, labels)
+        try:
+            yield
+        finally:
+            ACTIVE.dec(1, labels)
+            semaphore.release()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Return the process-wide limiter, configured from settings"""
+    global _limiter
+    if _limiter is None:
+        from django.conf import settings
+
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = Limiter(settings.ASYNC_LIMITS, queue_timeout=settings.ASYNC_QUEUE_TIMEOUT)
+    return _limiter
@@ -0,0 +1,241 @@
+"""
+Live push of bandwidth samples, service status changes and alerts.
+
+A single ``Broadcaster`` fans events out to every connected client. Each
+subscriber keeps only the newest pending event per key, so a slow consumer
+receives a coalesced backlog instead of stalling the producer or other clients.
+Served over Server-Sent Events (``/api/live/stream/``) and a plain ASGI
+WebSocket (``/api/live/ws/``); both require the ASGI entry point. Under WSGI
+(or ``runserver``) Django would drain the endless stream and pin a worker per
+client, so the stream answers 503 there and the dashboard polls instead.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+TOPICS = ("bandwidth", "status", "alert")
+MAX_PENDING = 256
+HEARTBEAT_SECONDS = 15
+
+
+class Subscription:
+    def __init__(self, loop, topics=None):
+        self.loop = loop
+        self.topics = set(topics or TOPICS)
+        self.dropped = 0
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+
+    def offer(self, topic, key, data):
+        if topic not in self.topics:
+            return
+        with self._lock:
+            slot = (topic, key)
+            if slot in self._pending:
+                # Coalesce: the newer value replaces the one the client hasn't read yet
+                self._pending.move_to_end(slot)
+            elif len(self._pending) >= MAX_PENDING:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[slot] = data
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # event loop already closed; the broadcaster drops us on unsubscribe
+
+    async def next_batch(self, timeout=None):
+        """Wait for pending events and return them as ``[(topic, data), ...]``"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        with self._lock:
+            self._ready.clear()
+            batch = [(topic, data) for (topic, _), data in self._pending.items()]
+            self._pending.clear()
+        return batch
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last = {}
+
+    def subscribe(self, topics=None):
+        subscription = Subscription(asyncio.get_running_loop(), topics)
+        with self._lock:
+            self._subscribers.add(subscription)
+            # New clients start from the latest known state instead of a blank panel
+            for (topic, key), data in self._last.items():
+                subscription.offer(topic, key, data)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, topic, key, data):
+        with self._lock:
+            if topic != "alert":
+                self._last[(topic, key)] = data
+            subscribers = tuple(self._subscribers)
+        for subscription in subscribers:
+            subscription.offer(topic, key, data)
+
+
+broadcaster = Broadcaster()
+_status_cache = {}
+_status_lock = threading.Lock()
+_producer_lock = threading.Lock()
+_producer_started = False
+
+
+def publish_bandwidth(sample):
+    broadcaster.publish("bandwidth", "current", sample)
+
+
+def publish_status(rows):
+    """Publish status rows whose up/down state changed since the last publish"""
+    changed = []
+    with _status_lock:
+        for row in rows:
+            service = row["service"]
+            if _status_cache.get(service) != row["status"]:
+                _status_cache[service] = row["status"]
+                changed.append(row)
+    for row in changed:
+        broadcaster.publish("status", row["service"], row)
+
+
+def publish_alert(alert):
+    broadcaster.publish("alert", alert.get("id") or id(alert), alert)
+
+
+def network_status_saved(sender, instance, **kwargs):
+    publish_status([{
+        "service": instance.service,
+        "latency": instance.latency,
+        "packet_loss": instance.packet_loss,
+        "status": instance.status,
+        "timestamp": instance.timestamp.isoformat(),
+    }])
+
+
+def ensure_producer():
+    """Attach the broadcaster to the process-wide bandwidth sampler once"""
+    global _producer_started
+    if _producer_started:
+        return
+    with _producer_lock:
+        if _producer_started:
+            return
+        from .bandwidth_sampler import get_sampler
+
+        get_sampler().add_listener(publish_bandwidth)
+        _producer_started = True
+
+
+def _parse_topics(value):
+    if not value:
+        return None
+    topics = {topic.strip() for topic in value.split(",")} & set(TOPICS)
+    return topics or None
+
+
+async def _token_is_valid(token):
+    if not token:
+        # Same as the REST endpoints: anonymous access unless a token is presented
+        return True
+    from asgiref.sync import sync_to_async
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from .authentication import get_denylist
+
+    try:
+        access = AccessToken(token)
+    except TokenError:
+        return False
+    return not await sync_to_async(get_denylist().is_revoked)(access)
+
+
+def _sse_event(topic, data):
+    return f"event: {topic}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def live_stream(request):
+    """Server-Sent Events stream of live dashboard updates"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Live updates need the ASGI server; poll the REST endpoints"}, status=503)
+    if not await _token_is_valid(request.GET.get("token")):
+        return JsonResponse({"error": "Invalid token"}, status=401)
+
+    ensure_producer()
+    subscription = broadcaster.subscribe(_parse_topics(request.GET.get("topics")))
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                batch = await subscription.next_batch(timeout=HEARTBEAT_SECONDS)
+                if not batch:
+                    yield f": keepalive {int(time.time())}\n\n"
+                    continue
+                yield "".join(_sse_event(topic, data) for topic, data in batch)
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def live_websocket(scope, receive, send):
+    """Plain ASGI WebSocket handler; each frame is a JSON array of events"""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    token = query.get("token", [None])[0]
+    if not await _token_is_valid(token):
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    await send({"type": "websocket.accept"})
+    ensure_producer()
+    subscription = broadcaster.subscribe(_parse_topics(query.get("topics", [None])[0]))
+
+    async def wait_for_disconnect():
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    disconnect = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        while not disconnect.done():
+            next_batch = asyncio.ensure_future(subscription.next_batch(timeout=HEARTBEAT_SECONDS))
+            await asyncio.wait({next_batch, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect.done():
+                next_batch.cancel()
+                break
+            batch = next_batch.result()
+            events = [{"topic": topic, "data": data} for topic, data in batch]
+            await send({"type": "websocket.send", "text": json.dumps(events, default=str)})
+    finally:
+        disconnect.cancel()
+        broadcaster.unsubscribe(subscription)
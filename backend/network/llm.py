@@ -0,0 +1,262 @@
+"""
+Shared LLM client for the assistant endpoints.
+
+Upstream calls are coroutines on the client's own event loop thread, using
+one ``AsyncOpenAI`` client whose HTTP connections stay alive between
+requests; a semaphore caps how many run at once. Waiting on the API
+therefore costs a coroutine, not a thread, whether the caller is a sync view
+(``stream``) or an async one (``astream``). Answers are cached (LRU with a
+TTL) on the model and normalized question, and identical questions asked
+while one is already upstream join that call instead of starting another.
+Every upstream call streams, so callers can either forward tokens as they
+arrive or wait for the full text.
+"""
+import asyncio
+import threading
+import time
+
+from .instrumentation import timed_call
+from .lru import LRUCache
+
+SYSTEM_PROMPT = "You are a network diagnostic assistant. Be descriptive and helpful with network-related questions."
+
+
+def normalize(question):
+    """Collapse whitespace and case so trivially different phrasings share a cache entry"""
+    if not isinstance(question, str):
+        raise ValueError("question must be a string")
+    return " ".join(question.split()).casefold()
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _Flight:
+    """One upstream completion; any number of readers, sync or async, can follow its tokens"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+        self._waiters = []  # (loop, future) of async readers waiting for the next chunk
+
+    def _notify(self):
+        self._cond.notify_all()
+        for loop, waiter in self._waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # the reader's loop has closed
+        self._waiters = []
+
+    def put(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    def follow(self, timeout):
+        """Yield chunks from the start as they arrive; raise if the call failed"""
+        index = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("LLM response timed out")
+                    self._cond.wait(remaining)
+                pending = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(pending)
+            yield from pending
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def afollow(self, timeout):
+        """``follow()`` for async readers; waiting doesn't block the reader's event loop"""
+        loop = asyncio.get_running_loop()
+        index = 0
+        deadline = loop.time() + timeout
+        while True:
+            waiter = None
+            with self._cond:
+                if index >= len(self.chunks) and not self.done:
+                    waiter = loop.create_future()
+                    self._waiters.append((loop, waiter))
+                pending = self.chunks[index:]
+                done, error = self.done, self.error
+            if waiter is not None:
+                remaining = deadline - loop.time()
+                try:
+                    await asyncio.wait_for(waiter, max(remaining, 0))
+                except asyncio.TimeoutError:
+                    raise TimeoutError("LLM response timed out")
+                continue
+            index += len(pending)
+            for chunk in pending:
+                yield chunk
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMClient:
+    def __init__(self, api_key, base_url=None, model=None, temperature=0.7, max_tokens=256,
+                 timeout=60.0, max_concurrency=8, cache_size=256, cache_ttl=3600, client=None):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self._api_key = api_key
+        self._base_url = base_url
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._slots = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import AsyncOpenAI
+
+                    self._client = AsyncOpenAI(
+                        api_key=self._api_key, base_url=self._base_url, timeout=self.timeout, max_retries=1,
+                    )
+        return self._client
+
+    def _start_loop(self):
+        if self._loop is not None:
+            return self._loop
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def _complete(self, key, question, model, flight):
+        if self._slots is None:
+            # Bounds concurrent upstream calls; extra questions queue here instead of piling on the API
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        parts = []
+        try:
+            async with self._slots:
+                with timed_call("llm"):
+                    await self._stream_upstream(question, model, flight, parts)
+        except Exception as e:
+            flight.finish(e)
+        else:
+            self.cache.set(key, "".join(parts))
+            flight.finish()
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+
+    async def _stream_upstream(self, question, model, flight, parts):
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": question},
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True,
+        )
+        async for event in stream:
+            if not event.choices:
+                continue
+            text = event.choices[0].delta.content
+            if text:
+                parts.append(text)
+                flight.put(text)
+
+    def _join(self, question, model):
+        """``(cached answer, None)``, or ``(None, flight)`` for the upstream call answering it"""
+        key = (model, normalize(question))
+        answer = self.cache.get(key)
+        if answer is not None:
+            return answer, None
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                # Re-check under the lock: a call may have finished since the lookup above
+                answer = self.cache.get(key)
+                if answer is not None:
+                    return answer, None
+                flight = self._flights[key] = _Flight()
+                asyncio.run_coroutine_threadsafe(self._complete(key, question, model, flight), self._start_loop())
+        return None, flight
+
+    def stream(self, question, model=None):
+        """
+        Return ``(chunks, cached)``. ``chunks`` yields the answer's text as
+        the upstream produces it, or the whole cached answer at once.
+        """
+        answer, flight = self._join(question, model or self.model)
+        if flight is None:
+            return iter([answer]), True
+        return flight.follow(self.timeout * 2), False
+
+    def astream(self, question, model=None):
+        """``stream()`` for async callers: ``chunks`` is an async iterator"""
+        answer, flight = self._join(question, model or self.model)
+        if flight is None:
+            async def cached():
+                yield answer
+            return cached(), True
+        return flight.afollow(self.timeout * 2), False
+
+    def ask(self, question, model=None):
+        """Return ``(answer, cached)`` once the full answer is available"""
+        chunks, cached = self.stream(question, model)
+        return "".join(chunks), cached
+
+    async def aask(self, question, model=None):
+        chunks, cached = self.astream(question, model)
+        return "".join([chunk async for chunk in chunks]), cached
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm():
+    """Return the process-wide LLM client, configured from settings"""
+    global _client
+    if _client is None:
+        from django.conf import settings
+
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    api_key=settings.AI_ML_API_KEY,
+                    base_url=settings.LLM_BASE_URL,
+                    model=settings.LLM_MODEL,
+                    max_tokens=settings.LLM_MAX_TOKENS,
+                    timeout=settings.LLM_TIMEOUT,
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    cache_size=settings.LLM_CACHE_SIZE,
+                    cache_ttl=settings.LLM_CACHE_TTL,
+                )
+    return _client
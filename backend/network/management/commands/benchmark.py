@@ -0,0 +1,104 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network import benchmark
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the API endpoints offline and optionally compare against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", type=_csv, default=None,
+                            help="Comma-separated scenarios (default: all); see --list")
+        parser.add_argument("--list", action="store_true", help="List scenarios and exit")
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+        parser.add_argument("--concurrency", type=_csv, default=["8"],
+                            help="Client threads; a comma-separated list runs each level")
+        parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each run")
+        parser.add_argument("--rows", type=int, default=10_000, help="NetworkStatus rows to seed")
+        parser.add_argument("--services", type=int, default=20, help="Distinct services in the seeded rows")
+        parser.add_argument("--ping-latency", type=float, default=20.0, help="Stubbed ping time (ms)")
+        parser.add_argument("--llm-latency", type=float, default=50.0, help="Stubbed LLM completion time (ms)")
+        parser.add_argument("--no-response-cache", action="store_true",
+                            help="Disable the shared response cache to measure the views themselves")
+        parser.add_argument("--output", help="Write results as JSON to this file")
+        parser.add_argument("--input", help="Compare an existing results file instead of running")
+        parser.add_argument("--compare", metavar="BASELINE", help="Fail if results regress against BASELINE")
+        parser.add_argument("--max-p95-regression", type=float, default=0.2,
+                            help="Allowed p95 latency increase, as a fraction (default 0.2)")
+        parser.add_argument("--max-throughput-regression", type=float, default=0.2,
+                            help="Allowed throughput decrease, as a fraction (default 0.2)")
+        parser.add_argument("--verbose-views", action="store_true", help="Let the views' prints through")
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for name in benchmark.scenarios(["service"]):
+                self.stdout.write(name)
+            return
+
+        if options["input"]:
+            current = self._load(options["input"])
+        else:
+            try:
+                concurrency = [int(level) for level in options["concurrency"]]
+                current = benchmark.run(
+                    names=options["scenarios"],
+                    requests=options["requests"],
+                    concurrency=concurrency,
+                    rows=options["rows"],
+                    services=options["services"],
+                    warmup=options["warmup"],
+                    ping_latency=options["ping_latency"] / 1000,
+                    llm_latency=options["llm_latency"] / 1000,
+                    response_cache=not options["no_response_cache"],
+                    quiet=not options["verbose_views"],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self._report(current)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(current, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if options["compare"]:
+            rows, regressions = benchmark.compare(
+                self._load(options["compare"]), current,
+                max_p95_regression=options["max_p95_regression"],
+                max_throughput_regression=options["max_throughput_regression"],
+            )
+            self._report_comparison(rows)
+            if regressions:
+                raise CommandError(f"Regressed: {', '.join(regressions)}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions in {len(rows)} compared runs"))
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+    def _report(self, current):
+        self.stdout.write(f"{'scenario':<34}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'errors':>8}")
+        for key, result in current["results"].items():
+            self.stdout.write(
+                f"{key:<34}{result['throughput_rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                f"{result['p99_ms']:>10}{result['max_ms']:>10}{result['errors']:>8}"
+            )
+
+    def _report_comparison(self, rows):
+        def percent(change):
+            return f"{change:+.1%}" if change is not None else "n/a"
+
+        self.stdout.write(f"{'scenario':<34}{'p95 base':>10}{'p95':>10}{'change':>9}{'rps base':>10}{'rps':>10}{'change':>9}")
+        for key, base_p95, p95, p95_change, base_rps, rps, rps_change, regressed in rows:
+            line = (f"{key:<34}{base_p95:>10}{p95:>10}{percent(p95_change):>9}"
+                    f"{base_rps:>10}{rps:>10}{percent(rps_change):>9}")
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network.capture_ingest import ingest_capture
+
+
+class Command(BaseCommand):
+    help = "Stream a pcap/pcapng file or Wireshark CSV export into aggregated flow records (resumes if the file grew)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the capture file")
+        parser.add_argument("--name", help="Capture name (defaults to the file name)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            capture, ingested = ingest_capture(options["path"], name=options["name"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{capture.name}: ingested {ingested} packets in {elapsed:.2f}s "
+            f"(total {capture.packet_count}, last frame {capture.last_frame})"
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from network import timeseries
+
+
+class Command(BaseCommand):
+    help = "Delete time-series samples and rollups older than each tier's retention, then compact"
+
+    def handle(self, *args, **options):
+        deleted = timeseries.prune()
+        for tier, count in deleted.items():
+            self.stdout.write(f"{tier}: deleted {count} rows")
+        timeseries.compact()
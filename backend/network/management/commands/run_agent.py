@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from network.agent import get_agent
+
+
+class Command(BaseCommand):
+    help = "Run the store-and-forward collector: spool samples locally and upload them to the central server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", help="Ingest URL (default: AGENT_SERVER_URL)")
+        parser.add_argument("--agent-id", help="Agent identifier (default: AGENT_ID)")
+        parser.add_argument("--site", help="Office name reported with each batch (default: AGENT_SITE)")
+        parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+        parser.add_argument("--once", action="store_true", help="Collect one round, upload what's spooled and exit")
+        parser.add_argument("--upload-only", action="store_true", help="Upload what's spooled without collecting")
+
+    def handle(self, *args, **options):
+        agent_id = options["agent_id"] or settings.AGENT_ID
+        if not agent_id:
+            raise CommandError("Set AGENT_ID or pass --agent-id")
+        agent = get_agent(server_url=options["server"], agent_id=agent_id, site=options["site"])
+
+        try:
+            if options["once"] or options["upload_only"]:
+                if not options["upload_only"]:
+                    self.stdout.write(f"Collected {agent.collect()} samples")
+                uploaded = agent.upload()
+                self.stdout.write(
+                    f"Uploaded {uploaded} batches ({agent.bytes_uploaded} bytes), {agent.spool.pending} still queued"
+                )
+                return
+
+            self.stdout.write(f"Agent {agent.agent_id} ({agent.site}) reporting to {agent.server_url}")
+            try:
+                agent.run(options["duration"])
+            except KeyboardInterrupt:
+                pass
+            self.stdout.write(
+                f"Collected {agent.samples_collected} samples, uploaded {agent.batches_uploaded} batches "
+                f"({agent.bytes_uploaded} bytes), {agent.spool.pending} still queued"
+            )
+        finally:
+            agent.spool.close()
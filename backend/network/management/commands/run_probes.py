@@ -0,0 +1,47 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from network.metric_writer import enable_maintenance
+from network.probes import ProbeScheduler, load_inventory, probe_all, save_results
+
+
+class Command(BaseCommand):
+    help = "Run the service probe scheduler against the configured inventory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Probe every target once and exit")
+        parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+
+    def handle(self, *args, **options):
+        try:
+            targets = load_inventory()
+        except (OSError, ValueError, TypeError) as e:
+            raise CommandError(f"Invalid probe inventory: {str(e)}")
+        if not targets:
+            raise CommandError(
+                f"No probe targets; add them to {settings.PROBE_INVENTORY_FILE} or PROBE_TARGETS"
+            )
+
+        if options["once"]:
+            results = asyncio.run(probe_all(targets, concurrency=settings.PROBE_CONCURRENCY))
+            save_results(results)
+            up = sum(1 for r in results if r["status"] == "Up")
+            self.stdout.write(f"Probed {len(results)} targets, {up} up")
+            return
+
+        scheduler = ProbeScheduler(
+            targets,
+            concurrency=settings.PROBE_CONCURRENCY,
+            batch_size=settings.PROBE_BATCH_SIZE,
+            flush_interval=settings.PROBE_FLUSH_INTERVAL,
+        )
+        # The long-running prober is the one process that prunes and compacts the metric tables
+        enable_maintenance()
+        self.stdout.write(f"Probing {len(targets)} targets")
+        try:
+            asyncio.run(scheduler.run(options["duration"]))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Ran {scheduler.probes_run} probes")
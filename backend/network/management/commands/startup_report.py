@@ -0,0 +1,113 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: boots the project the way a worker does, with
+# the network disabled, and reports how long that took
+BOOT_SCRIPT = """
+import importlib, json, os, socket, sys, time
+
+attempts = []
+
+def blocked(*args, **kwargs):
+    attempts.append(repr(args[:2])[:200])
+    raise OSError("network access blocked during startup check")
+
+socket.getaddrinfo = blocked
+socket.socket.connect = blocked
+started = time.perf_counter()
+os.environ["DJANGO_SETTINGS_MODULE"] = sys.argv[1]
+importlib.import_module(sys.argv[2])
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+print(json.dumps({"seconds": time.perf_counter() - started, "network": attempts}))
+"""
+
+
+def parse_importtime(output):
+    """``-X importtime`` lines as ``[(module, self_us, cumulative_us, depth)]`` in import order"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Boot the project in a fresh interpreter and report startup time and import cost per module"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=15, help="How many modules/packages to list")
+        parser.add_argument("--budget-ms", type=float, default=settings.STARTUP_BUDGET_MS,
+                            help="Fail if startup takes longer than this")
+        parser.add_argument("--forbid", default=",".join(settings.STARTUP_FORBIDDEN_IMPORTS),
+                            help="Comma-separated modules that must not be imported at startup")
+        parser.add_argument("--entry", default="govlink_backend.asgi", help="Module a worker imports first")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT, settings.SETTINGS_MODULE, options["entry"]],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(), timeout=120,
+        )
+        if process.returncode != 0:
+            tail = "\n".join(line for line in process.stderr.splitlines() if not line.startswith("import time:"))
+            raise CommandError(f"Startup failed:\n{tail[-2000:]}")
+        boot = json.loads(process.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(process.stderr)
+
+        packages = {}
+        for name, self_us, _, _ in modules:
+            root = name.split(".")[0]
+            packages[root] = packages.get(root, 0) + self_us
+        forbidden = {m.strip() for m in options["forbid"].split(",") if m.strip()}
+        loaded = {name for name, _, _, _ in modules}
+        found = sorted(forbidden & loaded)
+        report = {
+            "startup_ms": round(boot["seconds"] * 1000, 1),
+            "imports_ms": round(sum(self_us for _, self_us, _, _ in modules) / 1000, 1),
+            "modules_imported": len(modules),
+            "budget_ms": options["budget_ms"],
+            "network_attempts": boot["network"],
+            "forbidden_imports": found,
+            "top_modules": [
+                {"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cum_us / 1000, 1)}
+                for name, self_us, cum_us, _ in sorted(modules, key=lambda m: -m[2])[:options["top"]]
+            ],
+            "top_packages": [
+                {"package": name, "self_ms": round(us / 1000, 1)}
+                for name, us in sorted(packages.items(), key=lambda p: -p[1])[:options["top"]]
+            ],
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"Startup: {report['startup_ms']} ms, {report['imports_ms']} ms in "
+                              f"{report['modules_imported']} imports (budget {options['budget_ms']:g} ms)")
+            self.stdout.write(f"\n{'module (cumulative)':<52}{'self ms':>10}{'total ms':>10}")
+            for row in report["top_modules"]:
+                self.stdout.write(f"{row['module']:<52}{row['self_ms']:>10}{row['cumulative_ms']:>10}")
+            self.stdout.write(f"\n{'package (self time)':<52}{'ms':>10}")
+            for row in report["top_packages"]:
+                self.stdout.write(f"{row['package']:<52}{row['self_ms']:>10}")
+
+        problems = []
+        if report["startup_ms"] > options["budget_ms"]:
+            problems.append(f"startup took {report['startup_ms']} ms, over the {options['budget_ms']:g} ms budget")
+        if found:
+            problems.append(f"imported at startup: {', '.join(found)}")
+        if boot["network"]:
+            problems.append(f"{len(boot['network'])} network call(s) at startup: {boot['network'][0]}")
+        if problems:
+            raise CommandError("; ".join(problems))
@@ -0,0 +1,217 @@
+"""
+Write-behind queue for time-series samples.
+
+Producers (probe batches, the bandwidth sampler, speed tests) hand samples
+to ``submit()`` and return immediately. One background thread per process
+drains the queue and writes each batch with ``timeseries.record_samples``,
+in one transaction, once ``flush_rows`` samples are waiting or
+``flush_interval`` seconds have passed. SQLite then sees one short writer
+per process instead of a commit per producer call. In the one process that
+calls ``enable_maintenance()`` (``run_probes``) the same thread also runs
+retention and compaction every ``retention_interval`` seconds, deleting in
+small chunks so it never holds the write lock for long. Other writes that
+producers shouldn't wait for (alert transitions) are handed over with
+``defer()`` and run on the same thread, in order.
+
+With ``write_behind`` off, ``submit()`` writes synchronously, which is what
+one-shot management commands want.
+"""
+import atexit
+import threading
+import time
+from collections import deque
+
+from .instrumentation import Counter
+
+SAMPLES_WRITTEN = Counter("govlink_metric_samples_written_total", "Samples flushed by the metric writer")
+SAMPLES_DROPPED = Counter("govlink_metric_samples_dropped_total", "Samples dropped because the queue was full")
+FLUSH_ERRORS = Counter("govlink_metric_flush_errors_total", "Metric writer flushes that failed")
+
+
+class MetricWriter:
+    def __init__(self, flush_rows=5000, flush_interval=1.0, max_pending=500_000, retention_interval=3600.0,
+                 write_behind=True, retries=5, writer=None, maintenance=None):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retention_interval = retention_interval
+        self.write_behind = write_behind
+        self.retries = retries
+        self._writer = writer
+        self._maintenance = maintenance
+        self._pending = deque()
+        self._tasks = deque()
+        self._cond = threading.Condition()
+        self._flushing = threading.Lock()
+        self._thread = None
+        self._stop = False
+        self._last_maintenance = time.monotonic()
+        self.written = 0
+        self.dropped = 0
+
+    def _write(self, samples):
+        if self._writer is not None:
+            return self._writer(samples)
+        from .timeseries import record_samples
+
+        return record_samples(samples)
+
+    def _maintain(self):
+        if self._maintenance is not None:
+            return self._maintenance()
+        from . import timeseries
+
+        timeseries.prune()
+        timeseries.compact()
+
+    def submit(self, samples):
+        """Queue ``(service, metric, timestamp, value)`` samples; returns how many were accepted"""
+        samples = list(samples)
+        if not self.write_behind:
+            return self._write(samples)
+        with self._cond:
+            overflow = len(self._pending) + len(samples) - self.max_pending
+            if overflow > 0:
+                # Metrics lose value with age: shed the oldest rather than block producers
+                for _ in range(min(overflow, len(self._pending))):
+                    self._pending.popleft()
+                self.dropped += overflow
+                SAMPLES_DROPPED.inc(overflow)
+            self._pending.extend(samples[-self.max_pending:])
+            if len(self._pending) >= self.flush_rows:
+                self._cond.notify()
+        self._ensure_thread()
+        return len(samples)
+
+    def defer(self, function, *args):
+        """Call ``function(*args)`` on the writer thread; calls run in the order they were deferred"""
+        if not self.write_behind:
+            return function(*args)
+        with self._cond:
+            self._tasks.append((function, args))
+            self._cond.notify()
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="metric-writer", daemon=True)
+            self._thread.start()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _take(self):
+        with self._cond:
+            batch = [self._pending.popleft() for _ in range(min(self.flush_rows, len(self._pending)))]
+        return batch
+
+    def _run_tasks(self):
+        while True:
+            with self._cond:
+                if not self._tasks:
+                    return
+                function, args = self._tasks.popleft()
+            try:
+                function(*args)
+            except Exception as e:
+                print(f"Metric writer task error: {str(e)}")
+
+    def flush(self):
+        """Write everything queued so far and run deferred calls; returns the number of samples written"""
+        written = 0
+        with self._flushing:
+            while True:
+                batch = self._take()
+                if not batch:
+                    self._run_tasks()
+                    return written
+                for attempt in range(self.retries):
+                    try:
+                        self._write(batch)
+                        break
+                    except Exception as e:
+                        FLUSH_ERRORS.inc()
+                        print(f"Metric writer error: {str(e)}")
+                        if attempt == self.retries - 1:
+                            self.dropped += len(batch)
+                            SAMPLES_DROPPED.inc(len(batch))
+                            batch = []
+                        else:
+                            time.sleep(min(0.1 * 2 ** attempt, 2.0))
+                written += len(batch)
+                self.written += len(batch)
+                SAMPLES_WRITTEN.inc(len(batch))
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        while True:
+            with self._cond:
+                if len(self._pending) < self.flush_rows and not self._tasks and not self._stop:
+                    self._cond.wait(self.flush_interval)
+                stop = self._stop
+            try:
+                self.flush()
+                if self.retention_interval and time.monotonic() - self._last_maintenance >= self.retention_interval:
+                    self._last_maintenance = time.monotonic()
+                    self._maintain()
+            except Exception as e:
+                print(f"Metric writer error: {str(e)}")
+            finally:
+                close_old_connections()
+            if stop:
+                return
+
+    def stop(self, timeout=10.0):
+        """Flush what's queued and stop the background thread"""
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide metric writer, configured from settings"""
+    global _writer
+    if _writer is None:
+        from django.conf import settings
+
+        with _writer_lock:
+            if _writer is None:
+                _writer = MetricWriter(
+                    flush_rows=settings.METRIC_WRITER_FLUSH_ROWS,
+                    flush_interval=settings.METRIC_WRITER_FLUSH_INTERVAL,
+                    max_pending=settings.METRIC_WRITER_MAX_PENDING,
+                    retention_interval=0,  # see enable_maintenance()
+                    write_behind=settings.METRIC_WRITE_BEHIND,
+                )
+                # Don't lose the tail of the queue on a clean shutdown
+                atexit.register(_writer.stop)
+    return _writer
+
+
+def enable_maintenance():
+    """
+    Run retention and compaction on this process's writer thread every
+    ``METRIC_RETENTION_INTERVAL`` seconds. Only one process should do this;
+    web workers never do.
+    """
+    from django.conf import settings
+
+    get_writer().retention_interval = settings.METRIC_RETENTION_INTERVAL
+
+
+def submit_samples(samples):
+    return get_writer().submit(samples)
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BandwidthMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=100)),
+                ('current_usage', models.FloatField()),
+                ('total_capacity', models.FloatField()),
+                ('peak_time', models.TimeField()),
+                ('timestamp', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='networkstatus',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=255)),
+                ('metric', models.CharField(max_length=64)),
+                ('resolution', models.PositiveIntegerField(choices=[(60, '1 minute'), (3600, '1 hour'), (86400, '1 day')])),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum', models.FloatField(default=0)),
+                ('min', models.FloatField(null=True)),
+                ('max', models.FloatField(null=True)),
+                ('p95', models.FloatField(null=True)),
+                ('histogram', models.JSONField(default=dict)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='metric_rollup_tier_idx')],
+                'constraints': [models.UniqueConstraint(fields=('service', 'metric', 'resolution', 'bucket'), name='metric_rollup_bucket_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=255)),
+                ('metric', models.CharField(max_length=64)),
+                ('timestamp', models.DateTimeField()),
+                ('value', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['service', 'metric', 'timestamp'], name='metric_sample_series_idx'), models.Index(fields=['timestamp'], name='metric_sample_ts_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0002_timeseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Capture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('path', models.CharField(max_length=1024)),
+                ('fingerprint', models.CharField(blank=True, max_length=64)),
+                ('fingerprint_size', models.IntegerField(default=0)),
+                ('bytes_processed', models.BigIntegerField(default=0)),
+                ('last_frame', models.BigIntegerField(default=0)),
+                ('packet_count', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Flow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('destination', models.CharField(max_length=255)),
+                ('protocol', models.CharField(max_length=64)),
+                ('packets', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('first_seen', models.FloatField()),
+                ('last_seen', models.FloatField()),
+                ('capture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flows', to='network.capture')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('capture', 'source', 'destination', 'protocol'), name='flow_key_unique')],
+            },
+        ),
+    ]
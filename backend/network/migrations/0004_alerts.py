@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0003_captures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(max_length=255)),
+                ('metric', models.CharField(max_length=64)),
+                ('rule', models.CharField(max_length=32)),
+                ('severity', models.CharField(choices=[('Info', 'Info'), ('Warning', 'Warning'), ('Critical', 'Critical')], max_length=10)),
+                ('severity_rank', models.SmallIntegerField(default=0)),
+                ('message', models.CharField(max_length=512)),
+                ('value', models.FloatField()),
+                ('expected', models.FloatField(null=True)),
+                ('score', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=1)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolved_at', '-severity_rank', '-score'], name='alert_open_rank_idx')],
+            },
+        ),
+    ]
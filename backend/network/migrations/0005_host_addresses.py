@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0004_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip', models.CharField(max_length=64)),
+                ('mac', models.CharField(max_length=255)),
+                ('capture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='addresses', to='network.capture')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('capture', 'ip', 'mac'), name='host_address_unique')],
+            },
+        ),
+    ]
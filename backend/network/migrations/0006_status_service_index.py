@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0005_host_addresses'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='networkstatus',
+            index=models.Index(fields=['service', 'id'], name='status_service_id_idx'),
+        ),
+    ]
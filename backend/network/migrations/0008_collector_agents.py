@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0007_revoked_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectorAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agent_id', models.CharField(max_length=64, unique=True)),
+                ('site', models.CharField(blank=True, max_length=255)),
+                ('epoch', models.CharField(max_length=32)),
+                ('last_seq', models.BigIntegerField(default=-1)),
+                ('pending', models.BigIntegerField(default=0)),
+                ('samples_received', models.BigIntegerField(default=0)),
+                ('bytes_received', models.BigIntegerField(default=0)),
+                ('last_sample_at', models.DateTimeField(blank=True, null=True)),
+                ('last_upload_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+def resolve_duplicates(apps, schema_editor):
+    """Keep the newest open alert per series; older duplicates are marked resolved"""
+    Alert = apps.get_model('network', 'Alert')
+    seen = set()
+    for alert in Alert.objects.filter(resolved_at__isnull=True).order_by('-last_seen', '-id'):
+        key = (alert.service, alert.metric, alert.rule)
+        if key in seen:
+            Alert.objects.filter(pk=alert.pk).update(resolved_at=alert.last_seen)
+        seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0008_collector_agents'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='alert',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('resolved_at__isnull', True)), fields=('service', 'metric', 'rule'),
+                name='alert_one_open_per_series',
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0009_alert_one_open_per_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeedTestJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=32, unique=True)),
+                ('status', models.CharField(default='pending', max_length=10)),
+                ('active', models.BooleanField(default=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('submissions', models.IntegerField(default=1)),
+                ('submitted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-finished_at'], name='speedtest_finished_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('active', True)), fields=('active',), name='speedtest_one_active_job')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0010_speedtest_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UplinkMeasurement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('site', models.CharField(max_length=255)),
+                ('uplink', models.CharField(max_length=255)),
+                ('latency', models.FloatField(null=True)),
+                ('packet_loss', models.FloatField(null=True)),
+                ('throughput', models.FloatField(null=True)),
+                ('active', models.BooleanField(default=False)),
+                ('timestamp', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
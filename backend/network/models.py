@@ -1,11 +1,19 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class NetworkStatus(models.Model):
     service = models.CharField(max_length=255)
     latency = models.IntegerField()
     packet_loss = models.FloatField()
     status = models.CharField(max_length=50)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Serves "latest row per service" and per-service history pages
+            models.Index(fields=['service', 'id'], name='status_service_id_idx'),
+        ]
 
     def __str__(self):
         return self.service
@@ -24,4 +32,241 @@ class BandwidthMetrics(models.Model):
     timestamp = models.DateTimeField(auto_now=True)
 
     def usage_display(self):
-        return f"{self.current_usage} Mbps / {self.total_capacity} Mbps"
\ No newline at end of file
+        return f"{self.current_usage} Mbps / {self.total_capacity} Mbps"
+
+class MetricSample(models.Model):
+    """Raw time-series sample for one service metric"""
+    service = models.CharField(max_length=255)
+    metric = models.CharField(max_length=64)
+    timestamp = models.DateTimeField()
+    value = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service', 'metric', 'timestamp'], name='metric_sample_series_idx'),
+            models.Index(fields=['timestamp'], name='metric_sample_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.service} {self.metric}={self.value} @ {self.timestamp}"
+
+class MetricRollup(models.Model):
+    """Pre-aggregated bucket of samples at a fixed resolution"""
+    RESOLUTION_CHOICES = [
+        (60, '1 minute'),
+        (3600, '1 hour'),
+        (86400, '1 day'),
+    ]
+
+    service = models.CharField(max_length=255)
+    metric = models.CharField(max_length=64)
+    resolution = models.PositiveIntegerField(choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    sum = models.FloatField(default=0)
+    min = models.FloatField(null=True)
+    max = models.FloatField(null=True)
+    p95 = models.FloatField(null=True)
+    histogram = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['service', 'metric', 'resolution', 'bucket'], name='metric_rollup_bucket_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket'], name='metric_rollup_tier_idx'),
+        ]
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
+
+    def __str__(self):
+        return f"{self.service} {self.metric} {self.get_resolution_display()} @ {self.bucket}"
+
+class Capture(models.Model):
+    """A packet capture export and how far ingestion has got through it"""
+    name = models.CharField(max_length=255, unique=True)
+    path = models.CharField(max_length=1024)
+    fingerprint = models.CharField(max_length=64, blank=True)
+    fingerprint_size = models.IntegerField(default=0)
+    bytes_processed = models.BigIntegerField(default=0)
+    last_frame = models.BigIntegerField(default=0)
+    packet_count = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+class Flow(models.Model):
+    """Packets aggregated per source, destination and protocol within a capture"""
+    capture = models.ForeignKey(Capture, on_delete=models.CASCADE, related_name='flows')
+    source = models.CharField(max_length=255)
+    destination = models.CharField(max_length=255)
+    protocol = models.CharField(max_length=64)
+    packets = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    first_seen = models.FloatField()
+    last_seen = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['capture', 'source', 'destination', 'protocol'], name='flow_key_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source} -> {self.destination} ({self.protocol})"
+
+class Alert(models.Model):
+    """An anomaly raised by the detector; open until ``resolved_at`` is set"""
+    SEVERITY_CHOICES = [
+        ('Info', 'Info'),
+        ('Warning', 'Warning'),
+        ('Critical', 'Critical'),
+    ]
+
+    service = models.CharField(max_length=255)
+    metric = models.CharField(max_length=64)
+    rule = models.CharField(max_length=32)
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES)
+    severity_rank = models.SmallIntegerField(default=0)
+    message = models.CharField(max_length=512)
+    value = models.FloatField()
+    expected = models.FloatField(null=True)
+    score = models.FloatField(default=0)
+    count = models.IntegerField(default=1)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resolved_at', '-severity_rank', '-score'], name='alert_open_rank_idx'),
+        ]
+        constraints = [
+            # Detectors in several processes can see the same series; they share its open alert
+            models.UniqueConstraint(
+                fields=['service', 'metric', 'rule'], condition=models.Q(resolved_at__isnull=True),
+                name='alert_one_open_per_series',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.severity}: {self.message}"
+
+class HostAddress(models.Model):
+    """An IP to link-layer address binding learned from ARP traffic in a capture"""
+    ip = models.CharField(max_length=64)
+    mac = models.CharField(max_length=255)
+    capture = models.ForeignKey(Capture, on_delete=models.CASCADE, related_name='addresses')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['capture', 'ip', 'mac'], name='host_address_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.ip} is at {self.mac}"
+
+class RevokedToken(models.Model):
+    """
+    A revoked JWT (``jti``) or, with no ``jti``, every token issued to
+    ``user_id`` up to ``revoked_at``. Rows are deleted once ``expires_at``
+    passes, since the tokens they cover have expired by then anyway.
+    """
+    jti = models.CharField(max_length=64, blank=True)
+    user_id = models.BigIntegerField(null=True)
+    revoked_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti or f"user {self.user_id}"
+
+class CollectorAgent(models.Model):
+    """
+    A store-and-forward collector at a remote office. Batches carry
+    ``(epoch, seq)``; ``seq`` only grows within one spool ``epoch``, so a
+    batch at or below ``last_seq`` has already been stored. ``epoch`` is set
+    on first contact; deleting the row lets the agent bind a new one.
+    """
+    agent_id = models.CharField(max_length=64, unique=True)
+    site = models.CharField(max_length=255, blank=True)
+    epoch = models.CharField(max_length=32)
+    last_seq = models.BigIntegerField(default=-1)
+    pending = models.BigIntegerField(default=0)
+    samples_received = models.BigIntegerField(default=0)
+    bytes_received = models.BigIntegerField(default=0)
+    last_sample_at = models.DateTimeField(null=True, blank=True)
+    last_upload_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.agent_id} ({self.site})" if self.site else self.agent_id
+
+
+class SpeedTestJob(models.Model):
+    """
+    A speed test run. Jobs live in the database so any worker can answer a
+    status poll, and at most one is ``active`` (pending or running) across
+    all of them.
+    """
+    job_id = models.CharField(max_length=32, unique=True)
+    status = models.CharField(max_length=10, default='pending')
+    active = models.BooleanField(default=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    submissions = models.IntegerField(default=1)
+    submitted_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-finished_at'], name='speedtest_finished_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['active'], condition=models.Q(active=True), name='speedtest_one_active_job',
+            ),
+        ]
+
+    def as_dict(self):
+        def iso(value):
+            return value.isoformat() if value else None
+
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error or None,
+            'submitted_at': iso(self.submitted_at),
+            'started_at': iso(self.started_at),
+            'finished_at': iso(self.finished_at),
+            'submissions': self.submissions,
+        }
+
+    def __str__(self):
+        return f"{self.job_id} ({self.status})"
+
+
+class UplinkMeasurement(models.Model):
+    """
+    One routing measurement for a site's uplink, from a site agent or the
+    local bandwidth sampler. Every worker's routing engine replays these, so
+    they all hold the same statistics; rows older than
+    ``ROUTING_STALE_AFTER`` no longer affect a decision and are pruned.
+    """
+    site = models.CharField(max_length=255)
+    uplink = models.CharField(max_length=255)
+    latency = models.FloatField(null=True)
+    packet_loss = models.FloatField(null=True)
+    throughput = models.FloatField(null=True)
+    active = models.BooleanField(default=False)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.site}/{self.uplink}"
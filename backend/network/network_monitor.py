@@ -1,68 +1,69 @@
-import random
+import asyncio
 import time
 from datetime import datetime
-import psutil
-import speedtest
 import subprocess
 import platform
 import ipaddress
+from .instrumentation import timed
+from .ping_sweep import parse_ping_output
+from .probes import load_inventory, probe_all
 
 class NetworkMonitor:
-    def __init__(self):
-        self.services = [
-            "Main Router",
-            "DNS Server",
-            "Web Server",
-            "Database Server",
-            "Email Server"
-        ]
+    def __init__(self, targets=None):
+        self.targets = load_inventory() if targets is None else list(targets)
+
+    @property
+    def services(self):
+        return [target.name for target in self.targets]
     
     def get_network_status(self):
-        """Simulate network monitoring data"""
-        status_data = []
-        for service in self.services:
-            # Simulate realistic network metrics
-            latency = random.uniform(5, 100)  # ms
-            packet_loss = random.uniform(0, 5)  # percentage
-            status = "Up" if random.random() > 0.1 else "Down"  # 10% chance of being down
-            
-            status_data.append({
-                "service": service,
-                "latency": round(latency, 2),
-                "packet_loss": round(packet_loss, 2),
-                "status": status,
-                "timestamp": datetime.now().isoformat()
-            })
-        
-        return status_data 
+        """Probe every inventory target once, concurrently"""
+        if not self.targets:
+            return []
+        return asyncio.run(probe_all(self.targets))
 
 class RealTimeBandwidth:
     def __init__(self):
+        # speedtest.Speedtest() fetches its server list over the network, so
+        # it's only created when a speed test actually runs
         self.speed_test = None
-        try:
-            self.speed_test = speedtest.Speedtest()
-        except Exception as e:
-            print(f"Speed test initialization error: {str(e)}")
+        self._last_io = None
     
+    @timed("psutil")
     def get_network_usage(self):
-        # Get network interfaces statistics
+        """Bandwidth rate since the previous call (first call measures since boot)"""
+        import psutil
+
         net_io = psutil.net_io_counters()
-        
-        # Calculate current bandwidth usage
+        now = time.monotonic()
+
         bytes_sent = net_io.bytes_sent
         bytes_recv = net_io.bytes_recv
-        
-        # Convert to Mbps
-        total_usage = (bytes_sent + bytes_recv) * 8 / 1_000_000  # Convert to Mbps
-        
+
+        if self._last_io is None:
+            elapsed = time.time() - psutil.boot_time()
+            sent_delta, recv_delta = bytes_sent, bytes_recv
+        else:
+            last_time, last_sent, last_recv = self._last_io
+            elapsed = now - last_time
+            sent_delta = max(bytes_sent - last_sent, 0)
+            recv_delta = max(bytes_recv - last_recv, 0)
+        self._last_io = (now, bytes_sent, bytes_recv)
+
+        # Convert bytes over the interval to Mbps
+        total_usage = (sent_delta + recv_delta) * 8 / 1_000_000 / max(elapsed, 1e-6)
+
         return {
             'current_usage': round(total_usage, 2),
             'timestamp': datetime.now().isoformat()
         }
     
+    @timed("speedtest")
     def get_speed_test(self):
         if not self.speed_test:
             try:
+                import speedtest
+
                 self.speed_test = speedtest.Speedtest()
             except Exception as e:
                 print(f"Speed test error: {str(e)}")
@@ -86,6 +87,13 @@ class RealTimeBandwidth:
             print(f"Speed test error: {str(e)}")
             return None
 
+def _ping_command(ip_address, count):
+    # Different ping command for Windows vs Unix-based systems
+    if platform.system().lower() == "windows":
+        return ["ping", "-n", str(count), ip_address]
+    return ["ping", "-c", str(count), ip_address]
+
+@timed("ping")
 def execute_ping(ip_address, count=4):
     try:
         # Validate IP address
@@ -95,20 +103,44 @@ def execute_ping(ip_address, count=4):
         except ValueError:
             return {"error": "Invalid IP address format"}
             
-        # Different ping command for Windows vs Unix-based systems
-        if platform.system().lower() == "windows":
-            command = ["ping", "-n", str(count), ip_address]
-        else:
-            command = ["ping", "-c", str(count), ip_address]
-            
         # Execute ping command and capture output
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        process = subprocess.Popen(_ping_command(ip_address, count), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         stdout, stderr = process.communicate()
         
         if stderr:
             return {"error": stderr.decode()}
-            
-        return {"result": stdout.decode()}
+
+        output = stdout.decode()
+        return {"result": output, "stats": parse_ping_output(output)}
         
     except Exception as e:
-        return {"error": str(e)} 
\ No newline at end of file
+        return {"error": str(e)}
+
+@timed("ping")
+async def aexecute_ping(ip_address, count=4, timeout=30.0):
+    """``execute_ping`` on an asyncio subprocess, so waiting for replies doesn't hold a thread"""
+    try:
+        ipaddress.ip_address(ip_address)
+    except ValueError:
+        return {"error": "Invalid IP address format"}
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *_ping_command(ip_address, count), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+    except Exception as e:
+        return {"error": str(e)}
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        return {"error": f"Ping timed out after {timeout:g}s"}
+
+    if stderr:
+        return {"error": stderr.decode()}
+    output = stdout.decode()
+    return {"result": output, "stats": parse_ping_output(output)}
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NetworkStatusPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: each page is an index range scan
+    (``id < cursor ORDER BY id DESC LIMIT n``), so page cost doesn't grow
+    with the table the way OFFSET does.
+    """
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
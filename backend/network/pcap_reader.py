@@ -0,0 +1,274 @@
+"""
+Memory-mapped pcap/pcapng reader.
+
+Packets are decoded straight out of the mapped file with ``struct.unpack_from``
+on a ``memoryview`` (no per-packet byte copies) and emitted as the same
+``(frame, time, source, destination, protocol, length, info)`` records the
+CSV reader produces, one bounded batch at a time, so ingestion and analytics
+work unchanged on raw captures. A malformed or truncated capture raises
+``ValueError``, like a bad CSV does.
+"""
+import mmap
+import socket
+import struct
+
+CHUNK_BYTES = 2 * 1024 * 1024
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_ALT = 12
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL = 113
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+
+_TCP_FLAGS = ((0x01, "FIN"), (0x02, "SYN"), (0x04, "RST"), (0x08, "PSH"), (0x10, "ACK"), (0x20, "URG"))
+_UDP_PORTS = {53: "DNS", 67: "DHCP", 68: "DHCP", 123: "NTP", 137: "NBNS", 443: "QUIC",
+              1900: "SSDP", 5353: "MDNS", 5355: "LLMNR"}
+_TCP_PORTS = {53: "DNS", 80: "HTTP", 8080: "HTTP"}
+_IP_PROTOCOLS = {1: "ICMP", 2: "IGMP", 47: "GRE", 50: "ESP", 58: "ICMPv6"}
+
+_u16be = struct.Struct(">H")
+
+
+def is_pcap(path):
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    return magic in PCAP_MAGIC or magic == PCAPNG_MAGIC
+
+
+# Captures repeat a small set of addresses; memoize their text form
+_address_cache = {}
+_ADDRESS_CACHE_LIMIT = 65536
+
+
+def _address(raw, format):
+    text = _address_cache.get(raw)
+    if text is None:
+        if len(_address_cache) >= _ADDRESS_CACHE_LIMIT:
+            _address_cache.clear()
+        text = _address_cache[raw] = format(raw)
+    return text
+
+
+def _format_mac(raw):
+    return "Broadcast" if raw == b"\xff" * 6 else raw.hex(":")
+
+
+def _mac(view, offset):
+    return _address(bytes(view[offset:offset + 6]), _format_mac)
+
+
+def _ipv4(view, offset):
+    return _address(bytes(view[offset:offset + 4]), lambda raw: socket.inet_ntop(socket.AF_INET, raw))
+
+
+def _ipv6(view, offset):
+    return _address(bytes(view[offset:offset + 16]), lambda raw: socket.inet_ntop(socket.AF_INET6, raw))
+
+
+def _transport(view, offset, end, proto):
+    """Decode TCP/UDP at ``offset``; returns (protocol, info)"""
+    if proto == 6 and end - offset >= 20:
+        sport, dport, seq, ack, data_offset, flags, window = struct.unpack_from(">HHIIBBH", view, offset)
+        header_len = (data_offset >> 4) * 4
+        payload = max(end - offset - header_len, 0)
+        names = ", ".join(name for bit, name in _TCP_FLAGS if flags & bit)
+        info = f"{sport}  >  {dport} [{names}] Seq={seq} Ack={ack} Win={window} Len={payload}"
+        low, high = sorted((sport, dport))
+        protocol = _TCP_PORTS.get(low) or _TCP_PORTS.get(high) or "TCP"
+        if payload >= 5 and 0x14 <= view[offset + header_len] <= 0x17 and view[offset + header_len + 1] == 3:
+            protocol = "TLS"
+            info = "Application Data" if view[offset + header_len] == 0x17 else info
+        return protocol, info
+    if proto == 17 and end - offset >= 8:
+        sport, dport, length = struct.unpack_from(">HHH", view, offset)
+        low, high = sorted((sport, dport))
+        protocol = _UDP_PORTS.get(low) or _UDP_PORTS.get(high) or "UDP"
+        return protocol, f"{sport}  >  {dport} Len={max(length - 8, 0)}"
+    return _IP_PROTOCOLS.get(proto, f"IP/{proto}"), ""
+
+
+def decode_packet(view, offset, caplen, linktype):
+    """Decode one packet into ``(source, destination, protocol, info)``"""
+    end = offset + caplen
+    ethertype = None
+
+    if linktype == LINKTYPE_ETHERNET:
+        if caplen < 14:
+            return "", "", "Ethernet", "Truncated frame"
+        source, destination = _mac(view, offset + 6), _mac(view, offset)
+        ethertype = _u16be.unpack_from(view, offset + 12)[0]
+        offset += 14
+        while ethertype in ETHERTYPE_VLAN and end - offset >= 4:
+            ethertype = _u16be.unpack_from(view, offset + 2)[0]
+            offset += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if caplen < 16:
+            return "", "", "SLL", "Truncated frame"
+        source, destination = "", ""
+        ethertype = _u16be.unpack_from(view, offset + 14)[0]
+        offset += 16
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_RAW_ALT, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        source, destination = "", ""
+        if caplen:
+            ethertype = ETHERTYPE_IPV6 if view[offset] >> 4 == 6 else ETHERTYPE_IPV4
+    else:
+        return "", "", f"LINKTYPE_{linktype}", ""
+
+    if ethertype == ETHERTYPE_ARP and end - offset >= 28:
+        opcode = _u16be.unpack_from(view, offset + 6)[0]
+        sender_ip, target_ip = _ipv4(view, offset + 14), _ipv4(view, offset + 24)
+        if opcode == 1:
+            info = f"Who has {target_ip}? Tell {sender_ip}"
+        else:
+            info = f"{sender_ip} is at {_mac(view, offset + 8)}"
+        return source, destination, "ARP", info
+
+    if ethertype == ETHERTYPE_IPV4 and end - offset >= 20:
+        header_len = (view[offset] & 0x0F) * 4
+        total_len = _u16be.unpack_from(view, offset + 2)[0]
+        proto = view[offset + 9]
+        source, destination = _ipv4(view, offset + 12), _ipv4(view, offset + 16)
+        ip_end = min(end, offset + total_len) if total_len else end
+        protocol, info = _transport(view, offset + header_len, ip_end, proto)
+        return source, destination, protocol, info
+
+    if ethertype == ETHERTYPE_IPV6 and end - offset >= 40:
+        proto = view[offset + 6]
+        source, destination = _ipv6(view, offset + 8), _ipv6(view, offset + 24)
+        protocol, info = _transport(view, offset + 40, end, proto)
+        return source, destination, protocol, info
+
+    if ethertype is not None:
+        return source, destination, f"0x{ethertype:04x}", ""
+    return source, destination, "Unknown", ""
+
+
+def _iter_pcap(view, size):
+    """Yield ``(data_offset, end, timestamp, caplen, origlen, linktype)`` for classic pcap"""
+    endian, resolution = PCAP_MAGIC[bytes(view[:4])]
+    linktype = struct.unpack_from(endian + "I", view, 20)[0] & 0x0FFFFFFF
+    header = struct.Struct(endian + "IIII")
+    offset = 24
+    while offset + 16 <= size:
+        seconds, fraction, caplen, origlen = header.unpack_from(view, offset)
+        end = offset + 16 + caplen
+        if end > size:
+            return  # partial trailing record; picked up once the file grows
+        yield offset + 16, end, seconds + fraction * resolution, caplen, origlen, linktype
+        offset = end
+
+
+def _tsresol(view, offset, end, endian):
+    """Timestamp resolution from an Interface Description Block's options"""
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", view, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = view[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def _iter_pcapng(view, size):
+    """Yield ``(data_offset, end, timestamp, caplen, origlen, linktype)`` for pcapng"""
+    interfaces = []
+    endian = "<"
+    offset = 0
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(endian + "I", view, offset)[0]
+        if block_type == 0x0A0D0D0A:
+            # Section header: byte-order magic decides endianness for the section
+            endian = "<" if bytes(view[offset + 8:offset + 12]) == b"\x4d\x3c\x2b\x1a" else ">"
+            interfaces = []
+        block_length = struct.unpack_from(endian + "I", view, offset + 4)[0]
+        end = offset + block_length
+        if block_length < 12 or end > size:
+            return
+
+        if block_type == 1:
+            if block_length < 20:
+                raise ValueError(f"Truncated interface description block at byte {offset}")
+            linktype = struct.unpack_from(endian + "H", view, offset + 8)[0]
+            interfaces.append((linktype, _tsresol(view, offset + 16, end - 4, endian)))
+        elif block_type == 6 and interfaces:
+            if block_length < 32:
+                raise ValueError(f"Truncated enhanced packet block at byte {offset}")
+            interface, high, low, caplen, origlen = struct.unpack_from(endian + "IIIII", view, offset + 8)
+            if caplen > block_length - 32:
+                raise ValueError(f"Packet at byte {offset} claims {caplen} bytes, more than its block holds")
+            linktype, resolution = interfaces[interface] if interface < len(interfaces) else interfaces[0]
+            yield offset + 28, end, ((high << 32) | low) * resolution, caplen, origlen, linktype
+        elif block_type == 3 and interfaces:
+            if block_length < 16:
+                raise ValueError(f"Truncated simple packet block at byte {offset}")
+            origlen = struct.unpack_from(endian + "I", view, offset + 8)[0]
+            caplen = min(origlen, block_length - 16)
+            linktype, _ = interfaces[0]
+            yield offset + 12, end, 0.0, caplen, origlen, linktype
+        offset = end
+
+
+def iter_pcap_batches(path, offset=0, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield ``(records, end_offset)`` like ``iter_csv_batches``. Frame numbers
+    and relative times are counted from the start of the file, so resuming
+    at ``offset`` numbers packets exactly as a full read would.
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        if size < 24:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                magic = bytes(view[:4])
+                if magic == PCAPNG_MAGIC:
+                    packets = _iter_pcapng(view, size)
+                elif magic in PCAP_MAGIC:
+                    packets = _iter_pcap(view, size)
+                else:
+                    raise ValueError("Not a pcap or pcapng file")
+                yield from _batches(view, packets, offset, chunk_bytes)
+            except (struct.error, IndexError) as e:
+                # Lengths that point past the data they describe
+                raise ValueError(f"Malformed capture: {str(e)}")
+            finally:
+                view.release()
+
+
+def _batches(view, packets, offset, chunk_bytes):
+    records = []
+    batch_start = last_end = offset
+    frame = 0
+    first_time = None
+    for data, end, timestamp, caplen, origlen, linktype in packets:
+        frame += 1
+        if first_time is None:
+            first_time = timestamp
+        if end <= offset:
+            continue  # already ingested; only counted for frame numbering
+        source, destination, protocol, info = decode_packet(view, data, caplen, linktype)
+        records.append((frame, round(timestamp - first_time, 9), source, destination, protocol, origlen, info))
+        last_end = end
+        if end - batch_start >= chunk_bytes:
+            yield records, end
+            records = []
+            batch_start = end
+    if records:
+        yield records, last_end
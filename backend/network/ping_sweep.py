@@ -0,0 +1,178 @@
+"""
+Concurrent ping sweeps over host lists and CIDR ranges.
+
+Each target runs as its own ``ping`` subprocess on an asyncio event loop,
+bounded by a semaphore and an overall deadline, and the output is parsed
+into numeric loss and RTT statistics.
+"""
+import asyncio
+import ipaddress
+import platform
+import re
+import time
+
+from .instrumentation import timed
+
+DEFAULT_COUNT = 3
+DEFAULT_TIMEOUT = 1.0  # seconds to wait for each reply
+DEFAULT_CONCURRENCY = 128
+DEFAULT_DEADLINE = 15.0
+MAX_TARGETS = 4096
+
+_HOSTNAME_RE = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9.-]{0,251}[A-Za-z0-9])?$")
+
+# Linux/BSD/macOS summary lines
+_UNIX_PACKETS_RE = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+_UNIX_RTT_RE = re.compile(r"(?:rtt|round-trip) min/avg/max/(?:mdev|stddev) = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+)")
+# Windows summary lines
+_WIN_PACKETS_RE = re.compile(r"Sent = (\d+), Received = (\d+)")
+_WIN_RTT_RE = re.compile(r"Minimum = (\d+)ms, Maximum = (\d+)ms, Average = (\d+)ms")
+
+
+def expand_targets(targets, max_targets=MAX_TARGETS):
+    """
+    Expand a host, CIDR range or list of either into a de-duplicated host list.
+    Raises ``ValueError`` for invalid entries or sweeps larger than ``max_targets``.
+    """
+    if isinstance(targets, str):
+        targets = [t for t in re.split(r"[\s,]+", targets) if t]
+    elif not isinstance(targets, (list, tuple)):
+        raise ValueError("Targets must be a host, CIDR range or list of either")
+
+    hosts = []
+    seen = set()
+    for target in targets:
+        target = str(target).strip()
+        if "/" in target:
+            network = ipaddress.ip_network(target, strict=False)
+            if network.num_addresses > max_targets + 2:
+                raise ValueError(f"{target} has more than {max_targets} addresses")
+            candidates = [str(ip) for ip in network.hosts()] or [str(network.network_address)]
+        else:
+            try:
+                candidates = [str(ipaddress.ip_address(target))]
+            except ValueError:
+                if not _HOSTNAME_RE.match(target):
+                    raise ValueError(f"Invalid host: {target}")
+                candidates = [target]
+
+        for host in candidates:
+            if host not in seen:
+                seen.add(host)
+                hosts.append(host)
+            if len(hosts) > max_targets:
+                raise ValueError(f"Sweep is limited to {max_targets} targets")
+    return hosts
+
+
+def ping_command(host, count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT):
+    if platform.system().lower() == "windows":
+        return ["ping", "-n", str(count), "-w", str(int(timeout * 1000)), host]
+    # 0.2s is the shortest interval allowed without root on Linux
+    return ["ping", "-c", str(count), "-i", "0.2", "-W", str(max(1, round(timeout))), host]
+
+
+def parse_ping_output(output):
+    """Parse ping output into sent/received/loss and min/avg/max/mdev RTT (ms)"""
+    stats = {
+        "sent": None, "received": None, "loss": None,
+        "min": None, "avg": None, "max": None, "mdev": None,
+    }
+
+    packets = _UNIX_PACKETS_RE.search(output) or _WIN_PACKETS_RE.search(output)
+    if packets:
+        sent, received = int(packets.group(1)), int(packets.group(2))
+        stats["sent"] = sent
+        stats["received"] = received
+        stats["loss"] = round(100.0 * (sent - received) / sent, 2) if sent else None
+
+    rtt = _UNIX_RTT_RE.search(output)
+    if rtt:
+        stats["min"], stats["avg"], stats["max"], stats["mdev"] = (float(v) for v in rtt.groups())
+    else:
+        rtt = _WIN_RTT_RE.search(output)
+        if rtt:
+            low, high, avg = (float(v) for v in rtt.groups())
+            stats.update({"min": low, "avg": avg, "max": high})
+    return stats
+
+
+def _status_for(stats):
+    if stats["received"]:
+        return "up"
+    if stats["sent"] is not None:
+        return "down"
+    return "error"
+
+
+@timed("ping")
+async def ping_host(host, count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT):
+    process = await asyncio.create_subprocess_exec(
+        *ping_command(host, count, timeout),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    stats = parse_ping_output(stdout.decode(errors="replace"))
+    result = {"host": host, "status": _status_for(stats), **stats}
+    if result["status"] == "error":
+        result["error"] = (stderr or stdout).decode(errors="replace").strip()
+    return result
+
+
+async def ping_sweep(targets, count=DEFAULT_COUNT, timeout=DEFAULT_TIMEOUT,
+                     concurrency=DEFAULT_CONCURRENCY, deadline=DEFAULT_DEADLINE):
+    """
+    Ping every target concurrently; at most ``concurrency`` pings run at once
+    and anything unfinished after ``deadline`` seconds is reported as timed out.
+    """
+    hosts = expand_targets(targets)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    async def probe(host):
+        async with semaphore:
+            try:
+                return await ping_host(host, count, timeout)
+            except OSError as e:
+                return {"host": host, "status": "error", "error": str(e)}
+
+    tasks = {asyncio.ensure_future(probe(host)): host for host in hosts}
+    done, pending = await asyncio.wait(tasks, timeout=deadline) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = {}
+    for task, host in tasks.items():
+        if task in done and not task.cancelled():
+            results[host] = task.result()
+        else:
+            results[host] = {"host": host, "status": "timeout", "sent": None, "received": None,
+                             "loss": None, "min": None, "avg": None, "max": None, "mdev": None}
+
+    ordered = [results[host] for host in hosts]
+    return {
+        "results": ordered,
+        "summary": {
+            "targets": len(hosts),
+            "up": sum(1 for r in ordered if r["status"] == "up"),
+            "down": sum(1 for r in ordered if r["status"] == "down"),
+            "timeout": sum(1 for r in ordered if r["status"] == "timeout"),
+            "error": sum(1 for r in ordered if r["status"] == "error"),
+            "elapsed": round(time.monotonic() - started, 3),
+        },
+    }
+
+
+def sweep(targets, **kwargs):
+    """Blocking wrapper around ``ping_sweep`` for sync callers"""
+    return asyncio.run(ping_sweep(targets, **kwargs))
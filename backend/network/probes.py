@@ -0,0 +1,306 @@
+"""
+Service probes and the scheduler that runs them.
+
+Targets come from a JSON inventory (``PROBE_INVENTORY_FILE``) or the
+``PROBE_TARGETS`` setting. Each entry looks like::
+
+    {"name": "Ministry Portal", "type": "http", "url": "https://example.gov.zm/",
+     "interval": 30, "timeout": 5}
+    {"name": "Core DNS", "type": "dns", "host": "example.gov.zm"}
+    {"name": "Mail", "type": "tcp", "host": "10.0.0.25", "port": 25}
+
+Targets tagged with ``"site"`` and ``"uplink"`` (e.g. a gateway reached
+through one ISP) also feed the failover engine in ``routing``.
+
+All probes run concurrently on one event loop. Start times are spread across
+each target's interval and results are written to ``NetworkStatus`` in batches.
+"""
+import asyncio
+import heapq
+import json
+import math
+import ssl
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+
+PROBE_TYPES = ("tcp", "dns", "http")
+DEFAULT_INTERVAL = 60.0
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_CONCURRENCY = 500
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class ProbeTarget:
+    __slots__ = ("name", "type", "host", "port", "url", "interval", "timeout", "site", "uplink")
+
+    def __init__(self, name, type="tcp", host=None, port=None, url=None,
+                 interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT, site=None, uplink=None):
+        if type not in PROBE_TYPES:
+            raise ValueError(f"Unknown probe type for {name}: {type}")
+        if type == "http":
+            if not url:
+                raise ValueError(f"HTTP probe {name} needs a url")
+            host = host or urlsplit(url).hostname
+        elif not host:
+            raise ValueError(f"{type.upper()} probe {name} needs a host")
+        if type == "tcp" and not port:
+            raise ValueError(f"TCP probe {name} needs a port")
+
+        self.name = name
+        self.type = type
+        self.host = host
+        self.port = int(port) if port else None
+        self.url = url
+        self.interval = float(interval)
+        self.timeout = float(timeout)
+        # A non-positive interval would make the scheduler spin; NaN compares false to everything
+        if not (math.isfinite(self.interval) and self.interval > 0):
+            raise ValueError(f"Probe {name} needs a positive interval")
+        if not (math.isfinite(self.timeout) and self.timeout > 0):
+            raise ValueError(f"Probe {name} needs a positive timeout")
+        self.site = site
+        self.uplink = uplink
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: data[key] for key in cls.__slots__ if key in data})
+
+
+def load_inventory():
+    """Read probe targets from ``PROBE_INVENTORY_FILE`` and ``PROBE_TARGETS``"""
+    entries = list(getattr(settings, "PROBE_TARGETS", []))
+    inventory_file = getattr(settings, "PROBE_INVENTORY_FILE", None)
+    if inventory_file and Path(inventory_file).exists():
+        with open(inventory_file) as f:
+            entries.extend(json.load(f))
+    return [ProbeTarget.from_dict(entry) for entry in entries]
+
+
+def _result(target, latency, status, error=None):
+    result = {
+        "service": target.name,
+        "latency": round(latency, 2) if latency is not None else None,
+        "packet_loss": 0.0 if status == "Up" else 100.0,
+        "status": status,
+        "timestamp": timezone.now().isoformat(),
+    }
+    if error:
+        result["error"] = error
+    return result
+
+
+_tls_context = None
+
+
+def tls_context():
+    """The client TLS context every HTTPS probe shares; building one loads the whole CA store"""
+    global _tls_context
+    if _tls_context is None:
+        _tls_context = ssl.create_default_context()
+    return _tls_context
+
+
+async def _close(writer, timeout):
+    writer.close()
+    try:
+        await asyncio.wait_for(writer.wait_closed(), timeout)
+    except (OSError, asyncio.TimeoutError):
+        pass  # the probe already has its answer
+
+
+async def probe_tcp(target):
+    started = time.perf_counter()
+    _, writer = await asyncio.wait_for(
+        asyncio.open_connection(target.host, target.port), target.timeout
+    )
+    latency = (time.perf_counter() - started) * 1000
+    await _close(writer, target.timeout)
+    return latency, "Up"
+
+
+async def probe_dns(target):
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    await asyncio.wait_for(loop.getaddrinfo(target.host, None), target.timeout)
+    return (time.perf_counter() - started) * 1000, "Up"
+
+
+async def probe_http(target):
+    """Send a bare HEAD request; any response below 500 counts as up"""
+    parts = urlsplit(target.url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+
+    started = time.perf_counter()
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=tls_context() if secure else None
+        )
+        try:
+            writer.write(
+                f"HEAD {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                f"User-Agent: govlink-probe\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            return await reader.readline()
+        finally:
+            await _close(writer, target.timeout)
+
+    status_line = await asyncio.wait_for(exchange(), target.timeout)
+    latency = (time.perf_counter() - started) * 1000
+    try:
+        code = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        raise ConnectionError(f"Malformed HTTP response: {status_line[:80]!r}")
+    return latency, "Up" if code < 500 else "Down"
+
+
+PROBES = {"tcp": probe_tcp, "dns": probe_dns, "http": probe_http}
+
+
+async def run_probe(target):
+    try:
+        latency, status = await PROBES[target.type](target)
+        return _result(target, latency, status)
+    except asyncio.TimeoutError:
+        return _result(target, None, "Down", "timeout")
+    except (OSError, ConnectionError, ssl.SSLError) as e:
+        return _result(target, None, "Down", str(e) or e.__class__.__name__)
+    except Exception as e:
+        # e.g. UnicodeError for a host IDNA can't encode; one bad target mustn't sink the batch
+        print(f"Probe {target.name} error: {str(e)}")
+        return _result(target, None, "Down", str(e) or e.__class__.__name__)
+
+
+async def probe_all(targets, concurrency=DEFAULT_CONCURRENCY):
+    """Probe every target once, concurrently"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(target):
+        async with semaphore:
+            return await run_probe(target)
+
+    return await asyncio.gather(*(bounded(target) for target in targets))
+
+
+def save_results(results):
+    """Bulk-write probe results to ``NetworkStatus`` and the time-series tables"""
+    from . import anomaly, http_cache, live, metric_writer, timeseries
+    from .models import NetworkStatus
+
+    rows = []
+    for result in results:
+        rows.append(NetworkStatus(
+            service=result["service"],
+            # NetworkStatus.latency is an integer column; -1 marks an unreachable service
+            latency=round(result["latency"]) if result["latency"] is not None else -1,
+            packet_loss=result["packet_loss"],
+            status=result["status"],
+            timestamp=result["timestamp"],
+        ))
+    NetworkStatus.objects.bulk_create(rows, batch_size=DEFAULT_BATCH_SIZE)
+    # bulk_create sends no post_save, so cached responses are invalidated here
+    http_cache.invalidate("topology", *http_cache.status_scopes(row.service for row in rows))
+    metric_writer.submit_samples(timeseries.network_status_samples(results))
+    live.publish_status(results)
+    anomaly.observe_status(results)
+    return len(rows)
+
+
+class ProbeScheduler:
+    """
+    Runs each target on its own interval. First runs are offset by a stable
+    per-target fraction of the interval so a large inventory doesn't burst.
+    """
+
+    def __init__(self, targets, concurrency=DEFAULT_CONCURRENCY, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, writer=save_results):
+        self.targets = list(targets)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writer = writer
+        self.probes_run = 0
+        self._buffer = []
+        self._in_flight = set()
+        self._running = set()
+        self._write_lock = None
+
+    @staticmethod
+    def _offset(target):
+        # crc32 is stable across processes, unlike hash()
+        return (zlib.crc32(target.name.encode()) % 10_000) / 10_000 * target.interval
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        loop = asyncio.get_running_loop()
+        # One write at a time: SQLite allows a single writer anyway
+        async with self._write_lock:
+            try:
+                await loop.run_in_executor(None, self.writer, batch)
+            except Exception as e:
+                print(f"Probe result write error: {str(e)}")
+
+    async def _flusher(self, stop):
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush()
+
+    async def run(self, duration=None):
+        """Probe until ``duration`` seconds pass (forever when ``None``)"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self._write_lock = asyncio.Lock()
+        stop = asyncio.Event()
+        flusher = asyncio.ensure_future(self._flusher(stop))
+        started = time.monotonic()
+        schedule = [(started + self._offset(t), i) for i, t in enumerate(self.targets)]
+        heapq.heapify(schedule)
+
+        async def probe(index):
+            self._running.add(index)
+            try:
+                async with semaphore:
+                    result = await run_probe(self.targets[index])
+            finally:
+                self._running.discard(index)
+            self.probes_run += 1
+            self._buffer.append(result)
+            if len(self._buffer) >= self.batch_size:
+                await self._flush()
+
+        try:
+            while schedule:
+                due, index = schedule[0]
+                now = time.monotonic()
+                if duration is not None and due - started >= duration:
+                    break
+                if due > now:
+                    await asyncio.sleep(due - now)
+                    continue
+                heapq.heapreplace(schedule, (due + self.targets[index].interval, index))
+                if index in self._running:
+                    continue  # previous run still waiting on its timeout; skip this round
+                task = asyncio.ensure_future(probe(index))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+        finally:
+            if self._in_flight:
+                await asyncio.gather(*self._in_flight, return_exceptions=True)
+            stop.set()
+            await flusher
+            await self._flush()
@@ -0,0 +1,419 @@
+"""
+ISP failover recommendations for multi-uplink sites.
+
+Each (site, uplink) keeps EWMA latency, packet loss and throughput fed from
+three places: probe results for inventory targets tagged with ``site`` and
+``uplink``, per-interface rates from the bandwidth sampler for the local
+site, and measurements posted by site agents. An uplink's cost is its
+latency plus a penalty per percent of loss (and per missing Mbps below the
+throughput floor); an uplink that is stale, failed its last probe
+outright or is mostly lossy costs ``inf``.
+
+A site's recommended uplink only changes when another uplink has been
+cheaper by ``switch_margin`` for ``hold_seconds`` in a row, or immediately
+when the recommended one goes down, so a noisy link doesn't flap. Updates
+mark their site dirty and only dirty sites are re-evaluated, plus sites
+where an uplink has since gone stale or a pending switch's hold has run out.
+
+Agent and sampler measurements are stored as ``UplinkMeasurement`` rows
+rather than fed to this process's engine directly; each process's
+``RoutingFeed`` replays them, so every worker holds the same statistics.
+"""
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+ALPHA = 0.2
+LOSS_PENALTY_MS = 50.0  # cost of each percent of packet loss, in ms of latency
+THROUGHPUT_PENALTY_MS = 10.0  # cost of each Mbps below min_throughput
+DOWN_LOSS = 90.0
+STALE_AFTER = 120.0
+
+
+def parse_measurement(value):
+    """``float(value)``, rejecting NaN and infinities, which would stick in an EWMA forever"""
+    if value is None:
+        return None
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{value} is not a finite number")
+    return value
+
+
+def parse_active(value):
+    """An agent's ``active`` flag: a JSON boolean, or "true"/"false"/"1"/"0" from form posts"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("true", "1", "false", "0"):
+        return value.strip().lower() in ("true", "1")
+    raise ValueError(f"active must be a boolean, not {value!r}")
+
+
+class UplinkStats:
+    __slots__ = ("name", "latency", "loss", "throughput", "samples", "updated", "down")
+
+    def __init__(self, name):
+        self.name = name
+        self.latency = None
+        self.loss = None
+        self.throughput = None
+        self.samples = 0
+        self.updated = 0.0
+        self.down = False  # last probe got no answer at all; not smoothed
+
+    def update(self, latency=None, loss=None, throughput=None, now=None, alpha=ALPHA):
+        def ewma(current, value):
+            return value if current is None else current + alpha * (value - current)
+
+        # Validate everything before touching state so a bad value changes nothing
+        latency, loss, throughput = map(parse_measurement, (latency, loss, throughput))
+        if throughput is not None:
+            self.throughput = ewma(self.throughput, throughput)
+        if latency is None and loss is None:
+            return  # throughput alone says nothing about whether the uplink is healthy
+        if latency is not None:
+            self.latency = ewma(self.latency, latency)
+        if loss is not None:
+            self.loss = ewma(self.loss, loss)
+        self.down = latency is None and loss is not None and loss >= 100.0
+        self.samples += 1
+        self.updated = max(self.updated, now if now is not None else time.monotonic())
+
+    def as_dict(self):
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+
+        return {
+            "uplink": self.name,
+            "latency": rounded(self.latency),
+            "packet_loss": rounded(self.loss),
+            "throughput": rounded(self.throughput),
+            "samples": self.samples,
+            "down": self.down,
+        }
+
+
+class Site:
+    __slots__ = ("name", "uplinks", "current", "recommended", "candidate", "candidate_since",
+                 "reason", "costs", "changed_at", "due")
+
+    def __init__(self, name):
+        self.name = name
+        self.uplinks = {}
+        self.current = None  # uplink the site reports as carrying traffic
+        self.recommended = None
+        self.candidate = None
+        self.candidate_since = None
+        self.reason = "Collecting measurements"
+        self.costs = {}
+        self.changed_at = None
+        self.due = None  # when the decision can change without a new measurement
+
+
+class RoutingEngine:
+    def __init__(self, switch_margin=0.2, hold_seconds=30.0, stale_after=STALE_AFTER,
+                 min_throughput=0.0, alpha=ALPHA, clock=time.monotonic):
+        self.switch_margin = switch_margin
+        self.hold_seconds = hold_seconds
+        self.stale_after = stale_after
+        self.min_throughput = min_throughput
+        self.alpha = alpha
+        self.clock = clock
+        self.sites = {}
+        self.evaluations = 0
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def observe(self, site, uplink, latency=None, loss=None, throughput=None, active=False, at=None):
+        """
+        Fold one measurement into ``site``/``uplink`` and mark the site for
+        re-evaluation. ``at`` is when it was taken, on ``clock``; default now.
+        """
+        with self._lock:
+            state = self.sites.get(site)
+            if state is None:
+                state = self.sites[site] = Site(site)
+            stats = state.uplinks.get(uplink)
+            if stats is None:
+                stats = state.uplinks[uplink] = UplinkStats(uplink)
+            stats.update(latency, loss, throughput, self.clock() if at is None else at, self.alpha)
+            if active or state.current is None:
+                state.current = uplink
+            self._dirty.add(site)
+
+    def cost(self, stats, now):
+        """Latency-equivalent cost in ms; ``None`` if unmeasured, ``inf`` if down or stale"""
+        if stats.samples == 0:
+            return None
+        if now - stats.updated >= self.stale_after:
+            return math.inf
+        if stats.down or (stats.loss is not None and stats.loss >= DOWN_LOSS):
+            return math.inf
+        if stats.latency is None:
+            return math.inf if stats.loss is None else LOSS_PENALTY_MS * stats.loss
+        cost = stats.latency + LOSS_PENALTY_MS * (stats.loss or 0.0)
+        if stats.throughput is not None and stats.throughput < self.min_throughput:
+            cost += THROUGHPUT_PENALTY_MS * (self.min_throughput - stats.throughput)
+        return cost
+
+    def _reason(self, site, active, best):
+        stats_active, stats_best = site.uplinks[active], site.uplinks[best]
+        if math.isinf(site.costs[active]):
+            return "Uplink down"
+        if (stats_active.loss or 0) - (stats_best.loss or 0) >= 1.0:
+            return "Packet loss"
+        if (stats_active.throughput is not None and stats_active.throughput < self.min_throughput):
+            return "Low throughput"
+        return "High latency"
+
+    def _evaluate(self, site, now):
+        self._decide(site, now)
+        deadlines = [
+            stats.updated + self.stale_after for stats in site.uplinks.values()
+            if stats.samples and stats.updated + self.stale_after > now
+        ]
+        if site.candidate is not None:
+            deadlines.append(site.candidate_since + self.hold_seconds)
+        site.due = min(deadlines) if deadlines else None
+
+    def _decide(self, site, now):
+        costs = {name: self.cost(stats, now) for name, stats in site.uplinks.items()}
+        site.costs = {name: cost for name, cost in costs.items() if cost is not None}
+        if not site.costs:
+            return
+        best = min(site.costs, key=lambda name: (site.costs[name], name != site.recommended))
+        active = site.recommended or site.current
+        if active not in site.costs:
+            active = best
+
+        if math.isinf(site.costs[best]):
+            site.recommended = active
+            site.candidate = site.candidate_since = None
+            site.reason = "All uplinks down"
+            return
+
+        better = best != active and site.costs[best] < site.costs[active] * (1 - self.switch_margin)
+        if math.isinf(site.costs[active]) and best != active:
+            # The recommended uplink is down: fail over without waiting out the hold
+            self._switch(site, best, now, "Uplink down")
+        elif better:
+            if site.candidate != best:
+                site.candidate, site.candidate_since = best, now
+            if now - site.candidate_since >= self.hold_seconds:
+                self._switch(site, best, now, self._reason(site, active, best))
+            else:
+                site.recommended = active
+        else:
+            site.recommended = active
+            site.candidate = site.candidate_since = None
+            if site.recommended == site.current:
+                site.reason = "Stable connection"
+
+    @staticmethod
+    def _switch(site, uplink, now, reason):
+        site.recommended = uplink
+        site.candidate = site.candidate_since = None
+        # Switching back to the uplink already in use needs no action
+        site.reason = "Stable connection" if uplink == site.current else reason
+        site.changed_at = now
+
+    def evaluate(self):
+        """Re-evaluate sites whose statistics changed, or whose decision came due, since the last call"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            now = self.clock()
+            dirty.update(name for name, state in self.sites.items() if state.due is not None and state.due <= now)
+            for name in dirty:
+                self._evaluate(self.sites[name], now)
+            self.evaluations += len(dirty)
+            return len(dirty)
+
+    def recommendations(self, site=None):
+        """One entry per site, in the shape of the dashboard's smart routing panel"""
+        self.evaluate()
+        with self._lock:
+            if site is not None:
+                sites = [self.sites[site]]  # KeyError for an unknown site
+            else:
+                sites = sorted(self.sites.values(), key=lambda s: (s.recommended == s.current, s.name))
+            result = []
+            for state in sites:
+                failover = state.recommended if state.recommended != state.current else None
+                result.append({
+                    "site": state.name,
+                    "currentRoute": state.current,
+                    "failover": failover or _runner_up(state),
+                    "status": "Recommended" if failover else "Not Needed",
+                    "reason": state.reason,
+                    "uplinks": [
+                        dict(stats.as_dict(), cost=_finite(state.costs.get(name)))
+                        for name, stats in state.uplinks.items()
+                    ],
+                })
+            return result
+
+
+def _finite(value):
+    if value is None or math.isinf(value):
+        return None
+    return round(value, 2)
+
+
+def _runner_up(site):
+    """Best alternative to the current uplink, shown even when no switch is needed"""
+    others = [name for name in site.costs if name != site.current and not math.isinf(site.costs[name])]
+    return min(others, key=lambda name: site.costs[name]) if others else None
+
+
+class RoutingFeed:
+    """
+    Feeds an engine from ``NetworkStatus`` rows of site/uplink-tagged probe
+    targets and from ``UplinkMeasurement`` rows. Rows are read past an id
+    watermark, so rows written by other processes are picked up too. The
+    first sync replays the last ``stale_after`` seconds, so a worker that
+    just started agrees with those already running.
+    """
+
+    def __init__(self, engine, inventory_ttl=60.0):
+        self.engine = engine
+        self.inventory_ttl = inventory_ttl
+        self.watermarks = {}
+        self._uplinks = {}
+        self._loaded = 0.0
+        self._lock = threading.Lock()
+
+    def _uplink_targets(self):
+        from .probes import load_inventory
+
+        if time.monotonic() - self._loaded > self.inventory_ttl:
+            try:
+                self._uplinks = {
+                    target.name: (target.site, target.uplink)
+                    for target in load_inventory() if target.site and target.uplink
+                }
+            except (OSError, ValueError, TypeError) as e:
+                print(f"Routing inventory error: {str(e)}")
+            self._loaded = time.monotonic()
+        return self._uplinks
+
+    def _unseen(self, queryset, key, wall):
+        watermark = self.watermarks.get(key)
+        if watermark is None:
+            # Anything older than stale_after would be stale on arrival anyway
+            queryset = queryset.filter(timestamp__gte=wall - timedelta(seconds=self.engine.stale_after))
+        else:
+            queryset = queryset.filter(id__gt=watermark)
+        return queryset.order_by("id")
+
+    def sync(self):
+        from .models import NetworkStatus, UplinkMeasurement
+
+        with self._lock:
+            now, wall = self.engine.clock(), timezone.now()
+
+            def taken_at(timestamp):
+                return now - max(0.0, (wall - timestamp).total_seconds())
+
+            count = 0
+            uplinks = self._uplink_targets()
+            if uplinks:
+                rows = self._unseen(NetworkStatus.objects.filter(service__in=list(uplinks)), "status", wall)
+                for pk, timestamp, service, latency, loss, status in rows.values_list(
+                    "id", "timestamp", "service", "latency", "packet_loss", "status"
+                ).iterator(2000):
+                    site, uplink = uplinks[service]
+                    if status == "Up" and latency >= 0:
+                        self.engine.observe(site, uplink, latency=latency, loss=loss, at=taken_at(timestamp))
+                    else:
+                        self.engine.observe(site, uplink, loss=100.0, at=taken_at(timestamp))
+                    self.watermarks["status"] = pk
+                    count += 1
+
+            rows = self._unseen(UplinkMeasurement.objects.all(), "measurement", wall)
+            for pk, timestamp, site, uplink, latency, loss, throughput, active in rows.values_list(
+                "id", "timestamp", "site", "uplink", "latency", "packet_loss", "throughput", "active"
+            ).iterator(2000):
+                self.engine.observe(
+                    site, uplink, latency=latency, loss=loss, throughput=throughput, active=active,
+                    at=taken_at(timestamp),
+                )
+                self.watermarks["measurement"] = pk
+                count += 1
+            return count
+
+
+_pruned = 0.0
+
+
+def record_measurements(measurements):
+    """
+    Store ``(site, uplink, values, active)`` measurements, ``values`` holding
+    any of ``latency``, ``loss`` and ``throughput``, for every process's feed
+    to replay. Rows past ``ROUTING_STALE_AFTER`` are pruned once per that
+    many seconds.
+    """
+    global _pruned
+    from django.conf import settings
+    from .models import UplinkMeasurement
+
+    rows = []
+    for site, uplink, values, active in measurements:
+        latency, loss, throughput = (
+            parse_measurement(values.get(field)) for field in ("latency", "loss", "throughput")
+        )
+        rows.append(UplinkMeasurement(
+            site=site, uplink=uplink, latency=latency, packet_loss=loss, throughput=throughput, active=active,
+        ))
+    UplinkMeasurement.objects.bulk_create(rows)
+    if time.monotonic() - _pruned >= settings.ROUTING_STALE_AFTER:
+        _pruned = time.monotonic()
+        cutoff = timezone.now() - timedelta(seconds=settings.ROUTING_STALE_AFTER)
+        UplinkMeasurement.objects.filter(timestamp__lt=cutoff).delete()
+    return len(rows)
+
+
+def observe_interfaces(sample, site, interface_uplinks):
+    """Sampler listener: per-NIC rates as throughput for the local site's uplinks"""
+    measurements = [
+        (site, interface_uplinks[nic], {"throughput": rates["upload_mbps"] + rates["download_mbps"]}, False)
+        for nic, rates in (sample.get("interfaces") or {}).items() if interface_uplinks.get(nic)
+    ]
+    if measurements:
+        try:
+            record_measurements(measurements)
+        except DatabaseError as e:
+            print(f"Routing measurement error: {str(e)}")
+
+
+_engine = None
+_feed = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide engine, configured from settings"""
+    global _engine, _feed
+    if _engine is None:
+        from django.conf import settings
+
+        with _engine_lock:
+            if _engine is None:
+                engine = RoutingEngine(
+                    switch_margin=settings.ROUTING_SWITCH_MARGIN,
+                    hold_seconds=settings.ROUTING_HOLD_SECONDS,
+                    stale_after=settings.ROUTING_STALE_AFTER,
+                    min_throughput=settings.ROUTING_MIN_THROUGHPUT,
+                )
+                _feed = RoutingFeed(engine)
+                _engine = engine
+    return _engine
+
+
+def current_recommendations(site=None):
+    engine = get_engine()
+    _feed.sync()
+    return engine.recommendations(site)
@@ -4,4 +4,4 @@ from .models import NetworkStatus
 class NetworkStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = NetworkStatus
-        fields = '__all__'
+        fields = ['id', 'service', 'latency', 'packet_loss', 'status', 'timestamp']
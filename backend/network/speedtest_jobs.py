@@ -0,0 +1,226 @@
+"""
+Single-flight speed test jobs.
+
+Only one speed test runs at a time across every worker. Submissions made
+while a test is running join that run, and a finished result is reused
+until its TTL expires, so concurrent clicks don't compete for the uplink
+being measured. Jobs are ``SpeedTestJob`` rows, so a status poll can land on
+any worker; a unique constraint on the active job settles races between
+workers, and a job whose worker died is given up after ``max_runtime``.
+State writes retry with backoff while the database is locked; if they keep
+failing the job is released as failed so it can't block the next test.
+"""
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+WRITE_ATTEMPTS = 5
+WRITE_BACKOFF = 0.05  # seconds before the first retry; doubles after each
+
+
+def _write_state(pk, **fields):
+    """Update one job row in its own short transaction, retrying while the database is locked"""
+    from django.db import OperationalError, transaction
+
+    from .models import SpeedTestJob
+
+    delay = WRITE_BACKOFF
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return SpeedTestJob.objects.filter(pk=pk).update(**fields)
+        except OperationalError:
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(delay)
+            delay *= 2
+
+
+class SpeedTestRunner:
+    def __init__(self, run_test, cache_ttl=300, history_size=50, max_runtime=300.0, on_result=None):
+        self.run_test = run_test
+        self.cache_ttl = cache_ttl
+        self.history_size = history_size
+        self.max_runtime = max_runtime
+        self.on_result = on_result
+        self._max_jobs = history_size * 2
+
+    def _release_abandoned(self, job):
+        """Fail ``job`` if it has been active longer than any run takes; its worker is gone"""
+        from django.utils import timezone
+
+        from .models import SpeedTestJob
+
+        now = timezone.now()
+        if now - (job.started_at or job.submitted_at) < timedelta(seconds=self.max_runtime):
+            return False
+        SpeedTestJob.objects.filter(pk=job.pk, active=True).update(
+            active=False, status=FAILED, error="Speed test was abandoned", finished_at=now,
+        )
+        return True
+
+    def submit(self, force=False):
+        """
+        Return ``(job, created)``: the in-flight job, a cached result within
+        the TTL (unless ``force``), or a newly started job.
+        """
+        from django.db import IntegrityError, transaction
+        from django.db.models import F
+
+        from .models import SpeedTestJob
+
+        for attempt in range(3):
+            current = SpeedTestJob.objects.filter(active=True).first()
+            if current is not None and not self._release_abandoned(current):
+                SpeedTestJob.objects.filter(pk=current.pk).update(submissions=F("submissions") + 1)
+                current.refresh_from_db()
+                return current, False
+            if not force:
+                cached = self.latest()
+                if cached is not None:
+                    return cached, False
+            try:
+                with transaction.atomic():
+                    job = SpeedTestJob.objects.create(job_id=uuid.uuid4().hex)
+                break
+            except IntegrityError:
+                # Another worker started one between the read and the insert; join it
+                continue
+        else:
+            raise RuntimeError("Could not start or join a speed test")
+
+        self._start(job)
+        return job, True
+
+    def _start(self, job):
+        threading.Thread(target=self._run_thread, args=(job,), name="speed-test", daemon=True).start()
+
+    def _run_thread(self, job):
+        from django.db import close_old_connections
+
+        try:
+            self._run(job)
+        finally:
+            # The runner thread outlives the request; don't leave its connection open
+            close_old_connections()
+
+    def _run(self, job):
+        from django.db import DatabaseError
+        from django.utils import timezone
+
+        try:
+            _write_state(job.pk, status=RUNNING, started_at=timezone.now())
+        except DatabaseError as e:
+            self._give_up(job, f"Could not start the speed test: {str(e)}")
+            return
+        try:
+            result = self.run_test()
+            if result is None:
+                raise RuntimeError("Speed test failed")
+            outcome = {"status": DONE, "result": result}
+        except Exception as e:
+            print(f"Speed test error: {str(e)}")
+            outcome = {"status": FAILED, "error": str(e)}
+        try:
+            _write_state(job.pk, active=False, finished_at=timezone.now(), **outcome)
+        except DatabaseError as e:
+            self._give_up(job, f"Could not store the speed test result: {str(e)}")
+            return
+        try:
+            self._prune()
+        except DatabaseError as e:
+            print(f"Speed test prune error: {str(e)}")
+
+        if outcome["status"] == DONE and self.on_result:
+            try:
+                self.on_result(outcome["result"])
+            except Exception as e:
+                print(f"Speed test result hook error: {str(e)}")
+
+    def _give_up(self, job, error):
+        """Release the active slot after a failed state write so the next test isn't blocked"""
+        from django.db import DatabaseError
+        from django.utils import timezone
+
+        print(f"Speed test job error: {error}")
+        try:
+            _write_state(job.pk, active=False, status=FAILED, error=error, finished_at=timezone.now())
+        except DatabaseError as e:
+            # Left active; submit() gives it up after max_runtime
+            print(f"Speed test job error: {str(e)}")
+
+    def _prune(self):
+        from .models import SpeedTestJob
+
+        cutoff = SpeedTestJob.objects.order_by("-id").values_list("id", flat=True)[self._max_jobs:self._max_jobs + 1]
+        if cutoff:
+            SpeedTestJob.objects.filter(id__lte=cutoff[0], active=False).delete()
+
+    def get(self, job_id):
+        from .models import SpeedTestJob
+
+        return SpeedTestJob.objects.filter(job_id=job_id).first()
+
+    async def aget(self, job_id):
+        from .models import SpeedTestJob
+
+        return await SpeedTestJob.objects.filter(job_id=job_id).afirst()
+
+    def latest(self):
+        """The newest successful job finished within the TTL, or None"""
+        from django.utils import timezone
+
+        from .models import SpeedTestJob
+
+        return SpeedTestJob.objects.filter(
+            status=DONE, finished_at__gte=timezone.now() - timedelta(seconds=self.cache_ttl),
+        ).order_by("-finished_at").first()
+
+    def history(self):
+        """Successful jobs, newest first"""
+        from .models import SpeedTestJob
+
+        return list(SpeedTestJob.objects.filter(status=DONE).order_by("-finished_at")[:self.history_size])
+
+
+def record_speed_test(result):
+    """Keep completed speed tests in the time-series history"""
+    from django.utils import timezone as django_timezone
+    from .metric_writer import submit_samples
+
+    timestamp = django_timezone.now()
+    submit_samples([
+        ("speedtest", "download_speed", timestamp, result["download_speed"]),
+        ("speedtest", "upload_speed", timestamp, result["upload_speed"]),
+        ("speedtest", "ping", timestamp, result["ping"]),
+    ])
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """Return the process-wide speed test runner, configured from settings"""
+    global _runner
+    if _runner is None:
+        from django.conf import settings
+
+        from .network_monitor import RealTimeBandwidth
+
+        with _runner_lock:
+            if _runner is None:
+                _runner = SpeedTestRunner(
+                    RealTimeBandwidth().get_speed_test,
+                    cache_ttl=settings.SPEED_TEST_CACHE_TTL,
+                    history_size=settings.SPEED_TEST_HISTORY_SIZE,
+                    max_runtime=settings.SPEED_TEST_MAX_RUNTIME,
+                    on_result=record_speed_test,
+                )
+    return _runner
@@ -1,3 +1,899 @@
-from django.test import TestCase
+import asyncio
+import struct
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.db.models import QuerySet
+from django.test import Client, RequestFactory, TestCase, override_settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    agent, anomaly, authentication, benchmark, capture_analytics, http_cache, live, llm, lru, ping_sweep, routing,
+    speedtest_jobs, timeseries,
+)
+from .authentication import tokens_for
+from .capture_ingest import ingest_capture
+from .models import Alert, Capture, CollectorAgent, MetricSample, NetworkStatus, SpeedTestJob, UplinkMeasurement
+from .pcap_reader import iter_pcap_batches
+from .probes import ProbeTarget
+from .speedtest_jobs import SpeedTestRunner
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class BenchmarkTests(TestCase):
+    def result(self, p95, rps, errors=0):
+        return {"p95_ms": p95, "throughput_rps": rps, "errors": errors}
+
+    def test_percentiles_interpolate(self):
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(benchmark.percentile([5], 99), 5)
+        self.assertIsNone(benchmark.percentile([], 95))
+
+    def test_compare_flags_latency_throughput_and_error_regressions(self):
+        baseline = {"results": {
+            "fast": self.result(10.0, 100.0), "slow": self.result(10.0, 100.0),
+            "starved": self.result(10.0, 100.0), "failing": self.result(10.0, 100.0),
+            "gone": self.result(10.0, 100.0),
+        }}
+        current = {"results": {
+            "fast": self.result(11.0, 95.0), "slow": self.result(13.0, 100.0),
+            "starved": self.result(10.0, 70.0), "failing": self.result(10.0, 100.0, errors=1),
+            "new": self.result(10.0, 100.0),
+        }}
+        rows, regressions = benchmark.compare(baseline, current)
+        self.assertEqual(regressions, ["slow", "starved", "failing"])
+        self.assertEqual([row[0] for row in rows], ["fast", "slow", "starved", "failing"])
+
+    def test_requests_must_be_positive(self):
+        with self.assertRaisesMessage(CommandError, "requests must be at least 1"):
+            call_command("benchmark", "--requests", "0")
+        with self.assertRaisesMessage(CommandError, "concurrency levels must be at least 1"):
+            call_command("benchmark", "--concurrency", "4,0")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TimeseriesTests(TestCase):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def test_choose_tier(self):
+        for step, tier in ((1, timeseries.RAW), (59, timeseries.RAW), (60, 60), (3599, 60),
+                           (3600, 3600), (86399, 3600), (86400, 86400), (30 * 86400, 86400)):
+            with self.subTest(step=step):
+                self.assertEqual(timeseries.choose_tier(step), tier)
+
+    def test_query_range_reads_the_coarsest_tier_that_fits(self):
+        timeseries.record_samples(
+            ("web", "latency", self.start + timedelta(minutes=k), float(k % 10)) for k in range(3 * 24 * 60)
+        )
+        end = self.start + timedelta(days=3)
+
+        tier, step, points = timeseries.query_range("web", "latency", self.start, self.start + timedelta(hours=1))
+        self.assertEqual((tier, step), ("raw", 8))
+        tier, step, points = timeseries.query_range("web", "latency", self.start, end)
+        self.assertEqual((tier, step), ("1m", 540))
+        tier, step, points = timeseries.query_range("web", "latency", self.start, end, step=3600)
+        self.assertEqual((tier, step, len(points)), ("1h", 3600, 72))
+        self.assertEqual(sum(point["count"] for point in points), 3 * 24 * 60)
+
+    def test_small_explicit_step_is_coarsened_to_max_points(self):
+        end = self.start + timedelta(days=365)
+        tier, step, points = timeseries.query_range("web", "latency", self.start, end, step=1, max_points=100)
+        self.assertGreaterEqual(step, 365 * 86400 / 100)
+
+    def test_non_finite_samples_are_skipped(self):
+        written = timeseries.record_samples([
+            ("web", "latency", self.start, float("nan")),
+            ("web", "latency", self.start, float("inf")),
+            ("web", "latency", self.start, None),
+            ("web", "latency", self.start, 12.0),
+        ])
+        self.assertEqual(written, 1)
+        self.assertEqual(list(MetricSample.objects.values_list("value", flat=True)), [12.0])
+
+    def test_parse_parameters(self):
+        self.assertEqual(timeseries.parse_step("5m"), 300)
+        self.assertIsNone(timeseries.parse_step(" "))
+        self.assertEqual(timeseries.parse_time("0"), datetime(1970, 1, 1, tzinfo=timezone.utc))
+        for parse, value in ((timeseries.parse_step, "inf"), (timeseries.parse_step, "0"),
+                             (timeseries.parse_time, "1e20"), (timeseries.parse_time, "tomorrow")):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse(value)
+
+    def test_range_view_rejects_out_of_range_parameters(self):
+        for query in ("step=inf", "to=1e20", "from=inf", "to=0001-01-01T00:00:00"):
+            with self.subTest(query=query):
+                response = Client().get(f"/api/metrics/range/?service=web&metric=latency&{query}")
+                self.assertEqual(response.status_code, 400)
+        response = Client().get("/api/metrics/range/?service=web&metric=latency&step=%20")
+        self.assertEqual(response.status_code, 200)
+
+
+class LiveUpdateTests(TestCase):
+    def test_subscription_coalesces_pending_events_per_key(self):
+        async def scenario():
+            broadcaster = live.Broadcaster()
+            subscription = broadcaster.subscribe(["bandwidth", "status"])
+            broadcaster.publish("bandwidth", "current", {"mbps": 1})
+            broadcaster.publish("status", "web", {"status": "Down"})
+            broadcaster.publish("bandwidth", "current", {"mbps": 2})
+            broadcaster.publish("alert", 1, {"alert": "ignored"})
+            return await subscription.next_batch(timeout=1)
+
+        self.assertEqual(asyncio.run(scenario()), [("status", {"status": "Down"}), ("bandwidth", {"mbps": 2})])
+
+    def test_status_is_published_only_when_it_changes(self):
+        published = []
+        original, live.broadcaster.publish = live.broadcaster.publish, lambda *args: published.append(args)
+        self.addCleanup(setattr, live.broadcaster, "publish", original)
+        live.publish_status([{"service": "live-test", "status": "Up"}])
+        live.publish_status([{"service": "live-test", "status": "Up"}, {"service": "live-test", "status": "Down"}])
+        self.assertEqual([args[2]["status"] for args in published], ["Up", "Down"])
+
+    def test_stream_is_refused_outside_asgi(self):
+        response = Client().get("/api/live/stream/")
+        self.assertEqual(response.status_code, 503)
+
+
+class PingSweepTests(TestCase):
+    def test_parses_unix_and_windows_output(self):
+        unix = (
+            "3 packets transmitted, 2 received, 33.3333% packet loss, time 402ms\n"
+            "rtt min/avg/max/mdev = 10.100/12.200/14.300/1.050 ms\n"
+        )
+        self.assertEqual(ping_sweep.parse_ping_output(unix), {
+            "sent": 3, "received": 2, "loss": 33.33, "min": 10.1, "avg": 12.2, "max": 14.3, "mdev": 1.05,
+        })
+        windows = (
+            "    Packets: Sent = 4, Received = 4, Lost = 0 (0% loss),\n"
+            "    Minimum = 1ms, Maximum = 3ms, Average = 2ms\n"
+        )
+        self.assertEqual(ping_sweep.parse_ping_output(windows), {
+            "sent": 4, "received": 4, "loss": 0.0, "min": 1.0, "avg": 2.0, "max": 3.0, "mdev": None,
+        })
+
+    def test_expands_and_deduplicates_targets(self):
+        self.assertEqual(
+            ping_sweep.expand_targets("10.0.0.0/30, 10.0.0.1 example.com"),
+            ["10.0.0.1", "10.0.0.2", "example.com"],
+        )
+        self.assertEqual(ping_sweep.expand_targets(["192.168.1.7/32"]), ["192.168.1.7"])
+        for targets in ("10.0.0.0/8", "bad host!", 5, {"host": "a"}):
+            with self.subTest(targets=targets), self.assertRaises(ValueError):
+                ping_sweep.expand_targets(targets)
+
+    def test_sweep_reports_hosts_past_the_deadline_as_timed_out(self):
+        async def fake_ping(host, count, timeout):
+            if host == "10.0.0.2":
+                await asyncio.sleep(5)
+            return {"host": host, "status": "up", "sent": 1, "received": 1}
+
+        with mock.patch.object(ping_sweep, "ping_host", fake_ping):
+            result = ping_sweep.sweep("10.0.0.1 10.0.0.2", deadline=0.1)
+        self.assertEqual([r["status"] for r in result["results"]], ["up", "timeout"])
+        self.assertEqual((result["summary"]["up"], result["summary"]["timeout"]), (1, 1))
+
+
+class QueuedRunner(SpeedTestRunner):
+    """Runs its jobs only when the test calls ``finish()``, on the test's thread"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queued = []
+
+    def _start(self, job):
+        self.queued.append(job)
+
+    def finish(self):
+        while self.queued:
+            self._run(self.queued.pop(0))
+
+
+SPEED_RESULT = {"download_speed": 90.0, "upload_speed": 10.0, "ping": 12.0}
+
+
+class SpeedTestJobTests(TestCase):
+    """Two runners sharing the database stand in for two workers"""
+
+    def flaky_updates(self, failures):
+        """Make the next ``failures`` queryset updates fail as if SQLite were locked"""
+        real_update = QuerySet.update
+        remaining = [failures]
+
+        def update(queryset, **fields):
+            if remaining[0]:
+                remaining[0] -= 1
+                raise OperationalError("database table is locked: network_speedtestjob")
+            return real_update(queryset, **fields)
+
+        self.enterContext(mock.patch.object(speedtest_jobs.time, "sleep"))
+        return mock.patch.object(QuerySet, "update", autospec=True, side_effect=update)
+
+    def test_workers_share_the_running_job_and_its_result(self):
+        first, second = QueuedRunner(lambda: SPEED_RESULT), QueuedRunner(lambda: SPEED_RESULT)
+        job, created = first.submit()
+        joined, joined_created = second.submit()
+        self.assertTrue(created)
+        self.assertFalse(joined_created)
+        self.assertEqual((joined.job_id, joined.submissions), (job.job_id, 2))
+        self.assertEqual(second.queued, [])
+        self.assertEqual(second.get(job.job_id).status, speedtest_jobs.PENDING)
+
+        first.finish()
+        self.assertEqual(second.get(job.job_id).status, speedtest_jobs.DONE)
+        self.assertEqual(second.latest().result, SPEED_RESULT)
+        self.assertEqual(second.submit(), (second.latest(), False))
+        self.assertEqual([j.job_id for j in second.history()], [job.job_id])
+
+        forced, created = second.submit(force=True)
+        self.assertTrue(created)
+        self.assertNotEqual(forced.job_id, job.job_id)
+
+    def test_a_job_whose_worker_died_is_failed_and_replaced(self):
+        from django.utils import timezone as django_timezone
+
+        SpeedTestJob.objects.create(job_id="lost", submitted_at=django_timezone.now() - timedelta(hours=1))
+        runner = QueuedRunner(lambda: None, max_runtime=60)
+        job, created = runner.submit()
+        self.assertTrue(created)
+        self.assertEqual(SpeedTestJob.objects.get(job_id="lost").status, speedtest_jobs.FAILED)
+        runner.finish()
+        self.assertEqual(runner.get(job.job_id).status, speedtest_jobs.FAILED)
+
+    def test_state_writes_retry_while_the_database_is_locked(self):
+        runner = QueuedRunner(lambda: SPEED_RESULT)
+        job, _ = runner.submit()
+        with self.flaky_updates(2):
+            runner.finish()
+        self.assertEqual(runner.get(job.job_id).status, speedtest_jobs.DONE)
+
+    def test_a_job_is_released_when_its_state_cannot_be_written(self):
+        runner = QueuedRunner(lambda: SPEED_RESULT)
+        job, _ = runner.submit()
+        with self.flaky_updates(speedtest_jobs.WRITE_ATTEMPTS):
+            runner.finish()
+        stored = runner.get(job.job_id)
+        self.assertEqual((stored.status, stored.active), (speedtest_jobs.FAILED, False))
+        self.assertTrue(runner.submit(force=True)[1])
+
+
+class ProbeInventoryTests(TestCase):
+    def test_rejects_non_positive_intervals_and_timeouts(self):
+        for field, value in (("interval", 0), ("interval", -5), ("interval", "nan"), ("timeout", 0)):
+            with self.subTest(field=field, value=value), self.assertRaises(ValueError):
+                ProbeTarget("web", host="example.com", port=443, **{field: value})
+        target = ProbeTarget("web", host="example.com", port=443, interval="2.5", timeout=1)
+        self.assertEqual((target.interval, target.timeout), (2.5, 1.0))
+
+    def test_run_probes_reports_an_invalid_inventory(self):
+        entry = {"name": "web", "host": "example.com", "port": 443, "interval": 0}
+        with override_settings(PROBE_TARGETS=[entry], PROBE_INVENTORY_FILE=None):
+            with self.assertRaisesMessage(CommandError, "positive interval"):
+                call_command("run_probes", "--once")
+
+
+CSV_HEADER = '"No.","Time","Source","Destination","Protocol","Length","Info"\n'
+
+
+def _csv_rows(first, last):
+    return "".join(
+        f'"{k}","{k * 0.5}","10.0.0.1","10.0.0.{2 + k % 2}","TCP","{100 + k}","x"\n' for k in range(first, last + 1)
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CaptureIngestTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.enterContext(override_settings(CAPTURE_DIR=str(self.directory)))
+
+    def upload(self, name, content):
+        upload = SimpleUploadedFile("upload.csv", content.encode())
+        return Client().post("/api/captures/upload/", {"file": upload, "name": name})
+
+    def test_reingest_is_idempotent_and_picks_up_appended_rows(self):
+        path = self.directory / "live.csv"
+        path.write_text(CSV_HEADER + _csv_rows(1, 4))
+        capture, ingested = ingest_capture(path)
+        self.assertEqual(ingested, 4)
+        self.assertEqual(ingest_capture(path)[1], 0)
+
+        # A partial trailing line waits for the writer to finish it
+        path.write_text(CSV_HEADER + _csv_rows(1, 6) + '"7","3.5","10.0.0.1"')
+        capture, ingested = ingest_capture(path)
+        self.assertEqual(ingested, 2)
+        capture.refresh_from_db()
+        self.assertEqual((capture.packet_count, capture.last_frame), (6, 6))
+        self.assertEqual(sum(capture.flows.values_list("packets", flat=True)), 6)
+        self.assertEqual(capture.flows.count(), 2)
+
+    def test_upload_rejects_names_that_are_not_capture_files(self):
+        for name in ("..", ".", "x/..", "run.sh"):
+            with self.subTest(name=name):
+                self.assertEqual(self.upload(name, CSV_HEADER + _csv_rows(1, 1)).status_code, 400)
+        response = self.upload("../../office.CSV", CSV_HEADER + _csv_rows(1, 2))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()["name"], response.json()["ingested"]), ("office.CSV", 2))
+        self.assertTrue((self.directory / "office.CSV").exists())
+
+    def test_rejected_upload_leaves_no_capture_or_file(self):
+        response = self.upload("bad.csv", "not,a,wireshark,export\n1,2,3,4\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Capture.objects.exists())
+        self.assertFalse((self.directory / "bad.csv").exists())
+
+    def test_flows_limit_must_be_positive(self):
+        path = self.directory / "a.csv"
+        path.write_text(CSV_HEADER + _csv_rows(1, 4))
+        capture, _ = ingest_capture(path)
+        url = f"/api/captures/{capture.pk}/flows/"
+        self.assertEqual(len(Client().get(url, {"limit": 1}).json()), 1)
+        for limit in ("-1", "0", "x"):
+            with self.subTest(limit=limit):
+                self.assertEqual(Client().get(url, {"limit": limit}).status_code, 400)
+
+
+class CaptureAnalyticsTests(TestCase):
+    records = [
+        (1, 0.0, "10.0.0.1", "10.0.0.2", "TCP", 1000, ""),
+        (2, 0.5, "10.0.0.2", "10.0.0.1", "TCP", 100, ""),
+        (3, 1.2, "10.0.0.3", "10.0.0.1", "DNS", 80, ""),
+        (4, 1.4, "aa:bb", "Broadcast", "ARP", 60, "Who has 10.0.0.9? Tell 10.0.0.3"),
+        (5, 1.5, "aa:bb", "Broadcast", "ARP", 60, "Who has 10.0.0.9? Tell 10.0.0.3"),
+    ]
+
+    def columns(self):
+        return capture_analytics.CaptureColumns.from_batches([(self.records, 0)])
+
+    def test_talkers_protocols_and_throughput(self):
+        columns = self.columns()
+        self.assertEqual([t["host"] for t in columns.top_talkers(2)], ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(columns.top_talkers(2)[0]["bytes_sent"], 1000)
+        self.assertEqual(len(columns.top_talkers(10_000)), 5)
+        self.assertEqual([p["protocol"] for p in columns.protocol_mix()], ["TCP", "ARP", "DNS"])
+        self.assertEqual(
+            [(b["time"], b["bytes"], b["packets"]) for b in columns.throughput(1)],
+            [(0.0, 1100, 2), (1.0, 200, 3)],
+        )
+        storms = columns.arp_storms(window=1, threshold=1)
+        self.assertEqual([(s["source"], s["target"], s["requests"]) for s in storms], [("aa:bb", "10.0.0.9", 2)])
+
+    def test_rejects_bucket_widths_that_would_explode(self):
+        columns = self.columns()
+        for call in (lambda: columns.throughput(0), lambda: columns.throughput("nan"),
+                     lambda: columns.throughput(0.00001), lambda: columns.arp_storms(window=-1),
+                     lambda: columns.arp_storms(threshold="inf")):
+            with self.assertRaises(ValueError):
+                call()
+
+    def test_a_failed_load_leaves_no_lock_behind(self):
+        capture = Capture(pk=987654, name="broken.csv", path="/nonexistent/broken.csv", bytes_processed=1)
+
+        def failing_reader(path):
+            raise ValueError("Not a Wireshark CSV export")
+
+        with self.assertRaises(ValueError):
+            capture_analytics.load_columns(capture, batches=failing_reader)
+        self.assertNotIn((capture.pk, capture.bytes_processed), capture_analytics._load_locks)
+
+
+def _tcp_frame(source, destination, sport, dport, flags=0x02, payload=b""):
+    """Ethernet + IPv4 + TCP frame"""
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, 1, 0, 0x50, flags, 64240, 0, 0) + payload
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0,
+                     bytes(source), bytes(destination)) + tcp
+    return b"\x00\x11\x22\x33\x44\x55" + b"\x66\x77\x88\x99\xaa\xbb" + b"\x08\x00" + ip
+
+
+def _pcap(frames):
+    data = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+    for k, frame in enumerate(frames):
+        data += struct.pack("<IIII", 1700000000 + k, 500000, len(frame), len(frame)) + frame
+    return data
+
+
+def _pcapng(frames):
+    def block(block_type, body):
+        body += b"\x00" * (-len(body) % 4)
+        length = len(body) + 12
+        return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+    data = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    data += block(1, struct.pack("<HHI", 1, 0, 65535))
+    for k, frame in enumerate(frames):
+        micros = (1700000000 + k) * 1_000_000 + 500000
+        data += block(6, struct.pack("<IIIII", 0, micros >> 32, micros & 0xFFFFFFFF, len(frame), len(frame)) + frame)
+    return data
+
+
+FRAMES = [
+    _tcp_frame([10, 0, 0, 1], [10, 0, 0, 2], 51000, 80),
+    _tcp_frame([10, 0, 0, 2], [10, 0, 0, 1], 80, 51000, flags=0x12),
+    _tcp_frame([10, 0, 0, 1], [10, 0, 0, 3], 51001, 443, flags=0x18, payload=b"\x17\x03\x03\x00\x01\x00"),
+]
+
+
+class PcapReaderTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, data):
+        path = Path(self.directory.name) / name
+        path.write_bytes(data)
+        return path
+
+    def records(self, path, offset=0):
+        return [record for records, _ in iter_pcap_batches(path, offset) for record in records]
+
+    def test_pcap_and_pcapng_decode_to_the_same_records(self):
+        expected = [
+            (1, 0.0, "10.0.0.1", "10.0.0.2", "HTTP", len(FRAMES[0]),
+             "51000  >  80 [SYN] Seq=1 Ack=0 Win=64240 Len=0"),
+            (2, 1.0, "10.0.0.2", "10.0.0.1", "HTTP", len(FRAMES[1]),
+             "80  >  51000 [SYN, ACK] Seq=1 Ack=0 Win=64240 Len=0"),
+            (3, 2.0, "10.0.0.1", "10.0.0.3", "TLS", len(FRAMES[2]), "Application Data"),
+        ]
+        self.assertEqual(self.records(self.write("a.pcap", _pcap(FRAMES))), expected)
+        self.assertEqual(self.records(self.write("a.pcapng", _pcapng(FRAMES))), expected)
+
+    def test_resuming_numbers_frames_like_a_full_read(self):
+        path = self.write("a.pcapng", _pcapng(FRAMES))
+        _, end = next(iter_pcap_batches(path, chunk_bytes=1))  # first packet only
+        self.assertEqual(self.records(path, end), self.records(path)[1:])
+
+    def test_malformed_files_raise_value_error(self):
+        data = _pcapng(FRAMES)
+        # Enhanced packet block claiming more captured bytes than it holds
+        corrupt = bytearray(data)
+        struct.pack_into("<I", corrupt, 28 + 20 + 20, 10_000)
+        for name, body in (("bad.pcapng", bytes(corrupt)), ("junk.pcap", b"not a capture" * 4)):
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                self.records(self.write(name, body))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_pcap_ingest_is_idempotent_and_picks_up_appended_packets(self):
+        path = self.write("live.pcap", _pcap(FRAMES[:2]))
+        capture, ingested = ingest_capture(path)
+        self.assertEqual(ingested, 2)
+        self.assertEqual(ingest_capture(path)[1], 0)
+
+        path.write_bytes(_pcap(FRAMES))
+        capture, ingested = ingest_capture(path)
+        self.assertEqual(ingested, 1)
+        capture.refresh_from_db()
+        self.assertEqual((capture.packet_count, capture.last_frame), (3, 3))
+        self.assertEqual(Capture.objects.count(), 1)
+        self.assertEqual(sum(capture.flows.values_list("packets", flat=True)), 3)
+
+
+class AnomalyDetectorTests(TestCase):
+    def setUp(self):
+        self.events = []
+        self.detector = anomaly.AnomalyDetector(
+            warmup=10, clear_after=3, on_change=lambda alert, event: self.events.append((event, dict(alert))),
+        )
+        self.time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def observe(self, *values, metric="latency"):
+        raised = []
+        for value in values:
+            self.time += timedelta(seconds=10)
+            raised += self.detector.observe("web", metric, value, self.time)
+        return raised
+
+    def transitions(self):
+        return [(event, alert["rule"], alert["severity"]) for event, alert in self.events]
+
+    def test_open_escalate_and_resolve(self):
+        self.assertEqual(self.observe(*[20.0] * 10), [])
+
+        opened = self.observe(24.0)
+        self.assertEqual([(a["rule"], a["severity"]) for a in opened], [("spike", "Warning")])
+        self.assertEqual(self.observe(24.0), [])  # still open: counted, not raised again
+        self.assertEqual(self.observe(40.0)[0]["severity"], "Critical")
+        self.assertEqual(self.detector.active[("web", "latency")]["spike"]["count"], 3)
+
+        self.observe(20.0, 20.0)
+        self.assertIn(("web", "latency"), self.detector.active)
+        self.observe(20.0)
+        self.assertNotIn(("web", "latency"), self.detector.active)
+        self.assertEqual(self.transitions(), [
+            ("opened", "spike", "Warning"), ("escalated", "spike", "Critical"), ("resolved", "spike", "Critical"),
+        ])
+        self.assertEqual(self.events[-1][1]["resolved_at"], self.time)
+
+    def test_an_anomalous_sample_resets_the_clear_streak(self):
+        self.observe(*[1.0] * 10, metric="up")
+        self.observe(0.0, 1.0, 1.0, 0.0, 1.0, 1.0, metric="up")
+        self.assertEqual(self.transitions(), [("opened", "down", "Critical")])
+        self.observe(1.0, metric="up")
+        self.assertEqual(self.transitions()[-1], ("resolved", "down", "Critical"))
+
+    def test_non_finite_samples_are_ignored(self):
+        self.observe(*[20.0] * 10)
+        self.assertEqual(self.observe(float("nan"), float("inf"), float("-inf")), [])
+        state = self.detector.series[("web", "latency")]
+        self.assertEqual((state.count, state.mean), (10, 20.0))
+        self.assertEqual(self.observe(40.0)[0]["severity"], "Critical")
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_stored_transitions_share_one_open_row_per_series(self):
+        self.observe(*[20.0] * 10, 40.0)
+        opened = self.events[0][1]
+        other_process = dict(opened, id=opened["id"] + 1000)
+        anomaly._store(opened, "opened")
+        anomaly._store(other_process, "opened")
+        self.assertEqual(Alert.objects.filter(resolved_at__isnull=True).count(), 1)
+
+        self.observe(20.0, 20.0, 20.0)
+        anomaly._store(self.events[-1][1], "resolved")
+        self.assertFalse(Alert.objects.filter(resolved_at__isnull=True).exists())
+
+
+class AskTests(TestCase):
+    def setUp(self):
+        stub = llm.LLMClient(api_key="test", model="test", client=benchmark._llm_stub(0.0, tokens=3))
+        self.enterContext(mock.patch.object(llm, "_client", stub))
+
+    def ask(self, body):
+        return Client().post("/api/ask/", body, content_type="application/json")
+
+    def test_answers_are_cached_per_normalized_question(self):
+        first = self.ask({"question": "Why is the network slow?"})
+        self.assertEqual(first.json(), {"response": "token0 token1 token2 ", "cached": False})
+        again = self.ask({"question": "  why is the   NETWORK slow? "})
+        self.assertEqual(again.json(), {"response": "token0 token1 token2 ", "cached": True})
+
+    def test_question_must_be_a_non_empty_string(self):
+        for question in (1, ["why"], {"q": 1}, None, "", "   "):
+            with self.subTest(question=question):
+                self.assertEqual(self.ask({"question": question}).status_code, 400)
+        with self.assertRaises(ValueError):
+            llm.normalize(1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RoutingEngineTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.engine = routing.RoutingEngine(hold_seconds=30.0, stale_after=120.0, clock=self.clock)
+
+    def recommendation(self):
+        [site] = self.engine.recommendations()
+        return site
+
+    def test_switch_waits_for_hold(self):
+        self.engine.observe("hq", "a", latency=50, loss=0, active=True)
+        self.engine.observe("hq", "b", latency=60, loss=0)
+        self.assertEqual(self.recommendation()["status"], "Not Needed")
+        for _ in range(20):
+            self.engine.observe("hq", "a", latency=200, loss=0)
+        self.assertEqual(self.recommendation()["status"], "Not Needed")
+        self.clock.now += 29
+        self.assertEqual(self.recommendation()["status"], "Not Needed")
+        # The hold runs out without a new measurement
+        self.clock.now += 1
+        site = self.recommendation()
+        self.assertEqual((site["status"], site["failover"], site["reason"]), ("Recommended", "b", "High latency"))
+
+    def test_stale_uplink_fails_over_without_a_new_measurement(self):
+        self.engine.observe("hq", "a", latency=20, loss=0, active=True)
+        self.clock.now += 60
+        self.engine.observe("hq", "b", latency=80, loss=0)
+        self.assertEqual(self.recommendation()["status"], "Not Needed")
+        self.clock.now += 60
+        site = self.recommendation()
+        self.assertEqual((site["status"], site["failover"], site["reason"]), ("Recommended", "b", "Uplink down"))
+        self.assertEqual(self.engine.evaluate(), 0)
+
+    def test_non_finite_measurements_change_nothing(self):
+        self.engine.observe("hq", "a", latency=20, loss=0)
+        for value in ("nan", float("inf"), "-inf"):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                self.engine.observe("hq", "a", latency=10, loss=value)
+        self.assertEqual(self.recommendation()["uplinks"][0]["samples"], 1)
+
+    def test_parse_active(self):
+        for value, expected in ((True, True), (False, False), (None, False), ("true", True), (" False", False),
+                                ("1", True), ("0", False)):
+            with self.subTest(value=value):
+                self.assertIs(routing.parse_active(value), expected)
+        for value in ("yes", "", 1, [True]):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                routing.parse_active(value)
+
+
+class RoutingMeasurementTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(routing.RoutingFeed, "_uplink_targets", return_value={}))
+
+    def engine(self):
+        engine = routing.RoutingEngine(hold_seconds=0.0)
+        return engine, routing.RoutingFeed(engine)
+
+    def post(self, body):
+        return Client().post("/api/routing/measurements/", body, content_type="application/json")
+
+    def test_measurements_are_shared_by_every_engine(self):
+        first, first_feed = self.engine()
+        first_feed.sync()
+        response = self.post([
+            {"site": "hq", "uplink": "a", "latency": 300, "packet_loss": 0, "active": "true"},
+            {"site": "hq", "uplink": "b", "latency": 30, "packet_loss": 0, "active": False},
+        ])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"accepted": 2})
+        self.assertEqual(first_feed.sync(), 2)
+        self.assertEqual(first_feed.sync(), 0)
+        # A worker that starts later replays the same rows
+        second, second_feed = self.engine()
+        self.assertEqual(second_feed.sync(), 2)
+        self.assertEqual(first.recommendations(), second.recommendations())
+        [site] = first.recommendations()
+        self.assertEqual((site["currentRoute"], site["failover"], site["status"]), ("a", "b", "Recommended"))
+
+    def test_invalid_measurements_store_nothing(self):
+        for body in ({"site": "hq", "uplink": "a", "latency": "NaN"},
+                     {"site": "hq", "uplink": "a", "latency": 10, "active": "false-ish"},
+                     [{"site": "hq", "uplink": "a", "latency": 10}, {"site": "hq"}]):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(UplinkMeasurement.objects.exists())
+
+    def test_old_rows_are_not_replayed_and_get_pruned(self):
+        routing.record_measurements([("hq", "a", {"latency": 10.0}, True)])
+        UplinkMeasurement.objects.update(timestamp=datetime.now(timezone.utc) - timedelta(seconds=600))
+        engine, feed = self.engine()
+        self.assertEqual(feed.sync(), 0)
+        with mock.patch.object(routing, "_pruned", 0.0):
+            routing.record_measurements([("hq", "b", {"throughput": 5.0}, False)])
+        self.assertEqual(list(UplinkMeasurement.objects.values_list("uplink", flat=True)), ["b"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NetworkStatusListTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            NetworkStatus.objects.create(service="dns" if i % 2 else "web", latency=10 + i, packet_loss=0, status="Up")
+
+    def get(self, **params):
+        response = Client().get("/api/network-status/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_are_newest_first_and_follow_cursors(self):
+        first = self.get(page_size=3)
+        self.assertEqual([row["latency"] for row in first["results"]], [14, 13, 12])
+        rest = Client().get(first["next"]).json()
+        self.assertEqual([row["latency"] for row in rest["results"]], [11, 10])
+        self.assertIsNone(rest["next"])
+
+    def test_filters_and_latest(self):
+        self.assertEqual({row["service"] for row in self.get(service="dns")["results"]}, {"dns"})
+        self.assertEqual(self.get(status="Down")["results"], [])
+        latest = self.get(latest=1)
+        self.assertEqual([(row["service"], row["latency"]) for row in latest], [("dns", 13), ("web", 14)])
+
+    def test_bad_time_filter_is_rejected(self):
+        self.assertEqual(Client().get("/api/network-status/", {"from": "yesterday-ish"}).status_code, 400)
+
+
+calls = []
+
+
+@http_cache.cache_response(["private"])
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def private_view(request):
+    calls.append(request.user.pk)
+    return Response({"calls": len(calls)})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        http_cache._cache().clear()
+        calls.clear()
+        user = get_user_model().objects.create_user("viewer", "viewer@example.com", "password")
+        self.token = str(tokens_for(user).access_token)
+
+    def get(self, token=None, **headers):
+        if token:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        return private_view(RequestFactory().get("/private/", **headers))
+
+    def test_stored_body_and_304_only_for_authenticated_requests(self):
+        first = self.get(self.token)
+        self.assertEqual((first.status_code, first["X-Cache"]), (200, "MISS"))
+
+        second = self.get(self.token)
+        self.assertEqual((second.status_code, second["X-Cache"]), (200, "HIT"))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(len(calls), 1)
+
+        revalidated = self.get(self.token, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+        for headers in ({}, {"HTTP_IF_NONE_MATCH": first["ETag"]}):
+            with self.subTest(headers=headers):
+                anonymous = self.get(**headers)
+                self.assertEqual(anonymous.status_code, 401)
+                self.assertFalse(anonymous.has_header("ETag"))
+        self.assertEqual(self.get("not-a-token").status_code, 401)
+        self.assertEqual(len(calls), 1)
+
+    def test_invalidation_changes_the_etag(self):
+        first = self.get(self.token)
+        http_cache.invalidate("private")
+        fresh = self.get(self.token, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((fresh.status_code, fresh["X-Cache"]), (200, "MISS"))
+        self.assertNotEqual(fresh["ETag"], first["ETag"])
+        self.assertEqual(len(calls), 2)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_no_etag_without_a_cache_that_keeps_versions(self):
+        response = self.get(self.token)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+
+class AuthenticationTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(authentication, "_denylist", authentication.Denylist()))
+        self.user = get_user_model().objects.create_user("admin", "admin@example.com", "password")
+
+    def login(self, **body):
+        return Client().post("/api/login/", body, content_type="application/json")
+
+    def logout(self, access, **body):
+        return Client().post("/api/logout/", body, content_type="application/json",
+                             HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_login(self):
+        response = self.login(email="admin@example.com", password="password")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["username"], "admin")
+        for body in ({"email": "admin@example.com", "password": "wrong"},
+                     {"email": "nobody@example.com", "password": "password"},
+                     {"email": "admin@example.com"}):
+            with self.subTest(body=body):
+                self.assertEqual(self.login(**body).status_code, 400)
+
+    def test_logout_revokes_both_tokens(self):
+        tokens = self.login(email="admin@example.com", password="password").json()
+        self.assertEqual(self.logout(tokens["access_token"], refresh_token=tokens["refresh_token"]).status_code, 200)
+        self.assertEqual(self.logout(tokens["access_token"]).status_code, 401)
+        self.assertTrue(authentication.get_denylist().is_revoked(RefreshToken(tokens["refresh_token"])))
+
+    def test_deactivating_a_user_revokes_their_tokens(self):
+        access = str(tokens_for(self.user).access_token)
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        self.assertEqual(self.logout(access).status_code, 401)
+
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = lru.LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_entries_expire(self):
+        cache = lru.LRUCache(ttl=10)
+        with mock.patch.object(lru.time, "monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with mock.patch.object(lru.time, "monotonic", return_value=110.0):
+            self.assertEqual(cache.get("a"), 1)
+        with mock.patch.object(lru.time, "monotonic", return_value=110.5):
+            self.assertIsNone(cache.get("a"))
+
+    def test_zero_size_stores_nothing(self):
+        cache = lru.LRUCache(max_size=0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+class BatchEncodingTests(TestCase):
+    def test_round_trip(self):
+        samples = [
+            ("web", "latency", 1700000002000, 12.5),
+            ("web", "latency", 1700000001000, 10.25),
+            ("dns", "packet_loss", 1700000001500, 0.0),
+        ]
+        body = agent.encode_batch(samples, "agent-1", "epoch-a", 7, site="hq", pending=3)
+        header, decoded = agent.decode_batch(body)
+
+        self.assertEqual(header, {"agent": "agent-1", "site": "hq", "epoch": "epoch-a", "seq": 7, "pending": 3})
+        as_epoch_ms = sorted(
+            (service, metric, round(timestamp.timestamp() * 1000), value)
+            for service, metric, timestamp, value in decoded
+        )
+        self.assertEqual(as_epoch_ms, sorted(samples))
+
+    def test_rejects_malformed_and_oversized_batches(self):
+        body = agent.encode_batch([("web", "latency", 1700000000000, 1.0)] * 1000, "agent-1", "epoch-a", 1)
+        for payload, max_bytes in ((b"not deflate", 1024), (body, 64)):
+            with self.subTest(payload=payload[:8]), self.assertRaises(ValueError):
+                agent.decode_batch(payload, max_bytes)
+
+
+@override_settings(AGENT_INGEST_TOKEN="secret", CACHES=LOCMEM_CACHES)
+class BatchIngestTests(TestCase):
+    def post(self, body, token="secret"):
+        return Client().post(
+            "/api/ingest/batches/", data=body, content_type=agent.CONTENT_TYPE,
+            HTTP_AUTHORIZATION=f"Bearer {token}", HTTP_CONTENT_ENCODING="deflate",
+        )
+
+    def batch(self, seq, epoch="epoch-a", timestamp=1700000000000):
+        return agent.encode_batch([("web", "latency", timestamp, 20.0)], "agent-1", epoch, seq, site="hq")
+
+    def test_replayed_batches_are_acknowledged_but_not_stored_again(self):
+        response = self.post(self.batch(1))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"agent": "agent-1", "epoch": "epoch-a", "seq": 1, "stored": True, "samples": 1})
+
+        replay = self.post(self.batch(1))
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()["stored"], False)
+        self.assertEqual(MetricSample.objects.count(), 1)
+
+        self.assertEqual(self.post(self.batch(2, timestamp=1700000060000)).status_code, 201)
+        self.assertEqual(self.post(self.batch(1)).json()["stored"], False)
+        self.assertEqual(MetricSample.objects.count(), 2)
+        self.assertEqual(CollectorAgent.objects.get(agent_id="agent-1").last_seq, 2)
+
+    def test_another_epoch_is_refused_without_reopening_stored_seqs(self):
+        self.post(self.batch(5))
+        self.assertEqual(self.post(self.batch(1, epoch="epoch-b")).status_code, 409)
+        self.assertEqual(CollectorAgent.objects.get(agent_id="agent-1").last_seq, 5)
+        self.assertEqual(MetricSample.objects.count(), 1)
+
+    def test_token_is_required(self):
+        self.assertEqual(self.post(self.batch(1), token="wrong").status_code, 403)
+        with override_settings(AGENT_INGEST_TOKEN=""):
+            self.assertEqual(self.post(self.batch(1), token="").status_code, 403)
+        self.assertFalse(CollectorAgent.objects.exists())
+
+
+class AsyncViewValidationTests(TestCase):
+    def test_alert_limit_must_be_positive(self):
+        now = datetime.now(timezone.utc)
+        for i in range(3):
+            Alert.objects.create(service=f"svc{i}", metric="latency", rule="zscore", severity="Warning",
+                                 severity_rank=anomaly.SEVERITY_RANK["Warning"], message="slow", value=1.0,
+                                 first_seen=now, last_seen=now)
+        self.assertEqual(len(Client().get("/api/alerts/", {"limit": 2}).json()), 2)
+        for limit in ("0", "-1", "two"):
+            with self.subTest(limit=limit):
+                self.assertEqual(Client().get("/api/alerts/", {"limit": limit}).status_code, 400)
+
+    def test_network_action_rejects_malformed_targets(self):
+        for body in ({"action": "ping", "targets": 5}, {"action": "ping", "targets": [1]},
+                     {"action": "ping", "ip_address": 5}, {"action": "ping", "targets": "bad host!"}):
+            with self.subTest(body=body):
+                response = Client().post("/api/network-action/", body, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
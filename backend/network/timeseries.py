@@ -0,0 +1,365 @@
+"""
+Time-series storage for service and bandwidth metrics.
+
+Raw samples go into ``MetricSample``; 1-minute, 1-hour and 1-day rollups in
+``MetricRollup`` are updated incrementally in the same transaction. Each rollup
+keeps a log-bucketed histogram so p95 stays mergeable across buckets and tiers.
+"""
+import json
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import MetricRollup, MetricSample
+
+RAW = 0
+TIERS = (60, 3600, 86400)  # rollup resolutions in seconds, finest first
+TIER_NAMES = {RAW: "raw", 60: "1m", 3600: "1h", 86400: "1d"}
+
+DEFAULT_RETENTION_DAYS = {"raw": 2, "1m": 14, "1h": 180, "1d": 1825}
+DEFAULT_MAX_POINTS = 500
+
+# Histogram bins grow by 5%, so percentiles are within ~2.5% of the true value
+_GAMMA = 1.05
+_LOG_GAMMA = math.log(_GAMMA)
+_ZERO_BIN = "z"
+
+_STEP_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_LOOKUP_CHUNK = 200
+
+
+def _bin_for(value):
+    if value <= 0:
+        return _ZERO_BIN
+    return str(math.floor(math.log(value) / _LOG_GAMMA))
+
+
+def _bin_value(key):
+    if key == _ZERO_BIN:
+        return 0.0
+    return _GAMMA ** (int(key) + 0.5)
+
+
+def merge_histograms(target, source):
+    for key, count in source.items():
+        target[key] = target.get(key, 0) + count
+    return target
+
+
+def histogram_percentile(histogram, pct, lower=None, upper=None):
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = math.ceil(pct / 100 * total)
+    seen = 0
+    value = None
+    for key in sorted(histogram, key=lambda k: -math.inf if k == _ZERO_BIN else int(k)):
+        seen += histogram[key]
+        if seen >= rank:
+            value = _bin_value(key)
+            break
+    if lower is not None:
+        value = max(value, lower)
+    if upper is not None:
+        value = min(value, upper)
+    return value
+
+
+def bucket_start(timestamp, resolution):
+    epoch = int(timestamp.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % resolution, tz=dt_timezone.utc)
+
+
+class _Aggregate:
+    __slots__ = ("count", "total", "min", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        key = _bin_for(value)
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+
+    def merge_into(self, rollup):
+        rollup.count += self.count
+        rollup.sum += self.total
+        rollup.min = self.min if rollup.min is None else min(rollup.min, self.min)
+        rollup.max = self.max if rollup.max is None else max(rollup.max, self.max)
+        rollup.histogram = merge_histograms(dict(rollup.histogram or {}), self.histogram)
+        rollup.p95 = histogram_percentile(rollup.histogram, 95, rollup.min, rollup.max)
+
+
+def record_samples(samples):
+    """
+    Store raw samples and fold them into every rollup tier.
+
+    ``samples`` is an iterable of ``(service, metric, timestamp, value)`` tuples.
+    Missing and non-finite values are skipped. Returns the number of samples written.
+    """
+    rows = []
+    aggregates = defaultdict(_Aggregate)
+    for service, metric, timestamp, value in samples:
+        if value is None:
+            continue
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        value = float(value)
+        if not math.isfinite(value):
+            # NaN/inf can't be binned and would fail the whole batch
+            continue
+        rows.append((service, metric, timestamp, value))
+        epoch = int(timestamp.timestamp())
+        for resolution in TIERS:
+            bucket = datetime.fromtimestamp(epoch - epoch % resolution, tz=dt_timezone.utc)
+            aggregates[(service, metric, resolution, bucket)].add(value)
+
+    if not rows:
+        return 0
+
+    try:
+        _write(rows, aggregates)
+    except IntegrityError:
+        # Another writer created one of our buckets first; merge into it instead
+        _write(rows, aggregates)
+    return len(rows)
+
+
+def _insert_samples(rows):
+    # bulk_create() spends most of its time building and preparing model
+    # instances; a prepared INSERT over plain tuples is several times faster
+    table = connection.ops.quote_name(MetricSample._meta.db_table)
+    columns = ", ".join(
+        connection.ops.quote_name(MetricSample._meta.get_field(name).column)
+        for name in ("service", "metric", "timestamp", "value")
+    )
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s)",
+            [(s, m, adapt(t), v) for s, m, t, v in rows],
+        )
+
+
+def _write(rows, aggregates):
+    with transaction.atomic():
+        _insert_samples(rows)
+
+        # One lookup per chunk of services rather than per series; extra rows
+        # from the service x metric x bucket cross product are simply ignored
+        services = sorted({key[0] for key in aggregates})
+        metrics = {key[1] for key in aggregates}
+        buckets = {key[3] for key in aggregates}
+        existing = {}
+        for i in range(0, len(services), _LOOKUP_CHUNK):
+            query = MetricRollup.objects.select_for_update().filter(
+                service__in=services[i:i + _LOOKUP_CHUNK], metric__in=metrics, bucket__in=buckets
+            )
+            for rollup in query:
+                key = (rollup.service, rollup.metric, rollup.resolution, rollup.bucket)
+                if key in aggregates:
+                    existing[key] = rollup
+
+        to_create, to_update = [], []
+        for key, aggregate in aggregates.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                service, metric, resolution, bucket = key
+                rollup = MetricRollup(
+                    service=service, metric=metric, resolution=resolution, bucket=bucket,
+                    count=0, sum=0.0, min=None, max=None, histogram={},
+                )
+                to_create.append(rollup)
+            else:
+                to_update.append(rollup)
+            aggregate.merge_into(rollup)
+
+        MetricRollup.objects.bulk_create(to_create, batch_size=500)
+        if to_update:
+            _update_rollups(to_update)
+
+
+def _update_rollups(rollups):
+    # bulk_update() builds one CASE expression per column, which grows
+    # quadratically with the batch; a prepared per-row UPDATE stays linear
+    table = connection.ops.quote_name(MetricRollup._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {table} SET count = %s, sum = %s, min = %s, max = %s, p95 = %s, histogram = %s "
+            f"WHERE id = %s",
+            [
+                (r.count, r.sum, r.min, r.max, r.p95, json.dumps(r.histogram), r.pk)
+                for r in rollups
+            ],
+        )
+
+
+def network_status_samples(rows, timestamp=None):
+    """Latency, packet loss and availability samples for ``NetworkStatus``-shaped dicts"""
+    timestamp = timestamp or timezone.now()
+    samples = []
+    for row in rows:
+        ts = row.get("timestamp") or timestamp
+        if isinstance(ts, str):
+            ts = parse_datetime(ts) or timestamp
+        service = row["service"]
+        samples.append((service, "latency", ts, row.get("latency")))
+        samples.append((service, "packet_loss", ts, row.get("packet_loss")))
+        samples.append((service, "up", ts, 1.0 if row.get("status") == "Up" else 0.0))
+    return samples
+
+
+def parse_step(value):
+    """Parse ``300``, ``30s``, ``5m``, ``1h`` or ``1d`` into seconds"""
+    value = "" if value is None else str(value).strip().lower()
+    if not value:
+        return None
+    unit = _STEP_UNITS.get(value[-1])
+    number = value[:-1] if unit else value
+    try:
+        step = int(float(number) * (unit or 1))
+    except OverflowError:
+        raise ValueError(f"Invalid step: {value}")
+    if step <= 0:
+        raise ValueError("step must be positive")
+    return step
+
+
+def parse_time(value, default=None):
+    """Parse an ISO-8601 datetime or epoch seconds"""
+    if value is None or value == "":
+        return default
+    try:
+        return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        # Not a number, or an epoch outside what datetime can represent
+        pass
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid datetime: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def choose_tier(step):
+    """Coarsest stored tier whose resolution still satisfies ``step``"""
+    chosen = RAW
+    for resolution in TIERS:
+        if resolution <= step:
+            chosen = resolution
+    return chosen
+
+
+def query_range(service, metric, start, end, step=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Return ``(tier, step, points)`` for one series between ``start`` and ``end``.
+
+    The step, explicit or not, is raised as needed so the result has at
+    most ``max_points`` points. Rows from the selected tier are merged into
+    ``step``-sized buckets when the tier is finer than the step.
+    """
+    span = max((end - start).total_seconds(), 1)
+    step = max(step or 1, math.ceil(span / max_points))
+    tier = choose_tier(step)
+    if tier != RAW:
+        # Keep output buckets aligned to whole rollup buckets
+        step = math.ceil(step / tier) * tier
+
+    buckets = {}
+    if tier == RAW:
+        rows = MetricSample.objects.filter(
+            service=service, metric=metric, timestamp__gte=start, timestamp__lt=end
+        ).order_by("timestamp").values_list("timestamp", "value")
+        for timestamp, value in rows.iterator():
+            aggregate = buckets.setdefault(bucket_start(timestamp, step), _Aggregate())
+            aggregate.add(value)
+        points = [_point(bucket, a.count, a.total, a.min, a.max, a.histogram) for bucket, a in buckets.items()]
+    else:
+        rows = MetricRollup.objects.filter(
+            service=service, metric=metric, resolution=tier,
+            bucket__gte=bucket_start(start, tier), bucket__lt=end,
+        ).order_by("bucket").values_list("bucket", "count", "sum", "min", "max", "histogram")
+        for bucket, count, total, low, high, histogram in rows.iterator():
+            key = bucket_start(bucket, step) if step > tier else bucket
+            merged = buckets.get(key)
+            if merged is None:
+                buckets[key] = [count, total, low, high, dict(histogram)]
+            else:
+                merged[0] += count
+                merged[1] += total
+                merged[2] = min(merged[2], low)
+                merged[3] = max(merged[3], high)
+                merge_histograms(merged[4], histogram)
+        points = [_point(bucket, *values) for bucket, values in buckets.items()]
+
+    return TIER_NAMES[tier], step, points
+
+
+def _point(bucket, count, total, low, high, histogram):
+    return {
+        "timestamp": bucket.isoformat(),
+        "count": count,
+        "min": low,
+        "max": high,
+        "avg": total / count if count else None,
+        "p95": histogram_percentile(histogram, 95, low, high),
+    }
+
+
+def retention_cutoffs(now=None):
+    now = now or timezone.now()
+    retention = {**DEFAULT_RETENTION_DAYS, **getattr(settings, "METRICS_RETENTION_DAYS", {})}
+    return {name: now - timedelta(days=days) for name, days in retention.items()}
+
+
+def _delete_chunked(queryset, chunk):
+    # Each chunk is its own short transaction, so writers never wait long
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list("id", flat=True)[:chunk])
+        if not ids:
+            return deleted
+        deleted += model.objects.filter(id__in=ids).delete()[0]
+
+
+def prune(now=None, chunk=None):
+    """Delete rows older than each tier's retention; returns deleted counts per tier"""
+    chunk = chunk or getattr(settings, "METRIC_PRUNE_CHUNK", 5000)
+    cutoffs = retention_cutoffs(now)
+    deleted = {"raw": _delete_chunked(MetricSample.objects.filter(timestamp__lt=cutoffs["raw"]), chunk)}
+    for resolution in TIERS:
+        name = TIER_NAMES[resolution]
+        deleted[name] = _delete_chunked(
+            MetricRollup.objects.filter(resolution=resolution, bucket__lt=cutoffs[name]), chunk
+        )
+    return deleted
+
+
+def compact():
+    """
+    Hand space freed by ``prune()`` back: checkpoint and truncate the WAL,
+    refresh planner statistics and, if the database was created with
+    incremental auto-vacuum, release free pages a few at a time.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor.execute("PRAGMA optimize")
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:
+            cursor.execute("PRAGMA incremental_vacuum(1000)")
@@ -0,0 +1,338 @@
+"""
+Network topology built from observed traffic and probe results.
+
+The graph is an adjacency index (``node -> set of neighbours``) that only
+ever grows by applying new rows: flows and ARP bindings from ingested
+captures, and the latest ``NetworkStatus`` per probed service. ``sync()``
+reads rows past per-table id watermarks, so each call costs only the rows
+written since the last one, and captures ingested by another process show
+up the same way. A union-find over the same links answers "are these
+connected" and component sizes in near-constant time; paths and
+neighbourhoods are BFS over the index.
+
+ARP never crosses a router, so every address bound in a capture's ARP
+traffic hangs off one segment node for that capture. A MAC with a known IP
+binding is folded into the IP's node.
+"""
+import heapq
+import ipaddress
+import threading
+from collections import deque
+from functools import lru_cache
+
+MONITOR = "monitor"
+SKIPPED_ADDRESSES = {"", "Broadcast"}
+_SYNC_CHUNK = 5000
+
+
+@lru_cache(maxsize=65536)
+def classify(address):
+    """Node type for an address seen in a capture, or ``None`` if it isn't a host"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return "device"  # link-layer address (possibly vendor-prefixed, e.g. "Intel_20:e9:d7")
+    if ip.is_multicast or ip.is_unspecified or ip.is_loopback:
+        return None
+    if ip.version == 4 and ip.packed[-1] == 255:
+        return None  # limited or (assuming the usual /24) subnet broadcast
+    if ip.is_private or ip.is_link_local:
+        return "host"
+    return "external"
+
+
+class TopologyGraph:
+    def __init__(self):
+        self.nodes = {}
+        self.adjacency = {}
+        self.links = {}
+        self.aliases = {}  # link-layer address -> IP node it was folded into
+        self._parent = {}
+        self._size = {}
+        self.version = 0
+        self.watermarks = {"flow": 0, "address": 0, "status": 0}
+        self._snapshots = {}
+        self._lock = threading.RLock()
+
+    def _canonical(self, node_id):
+        return self.aliases.get(node_id, node_id)
+
+    def _find(self, node_id):
+        parent = self._parent
+        while parent[node_id] != node_id:
+            parent[node_id] = parent[parent[node_id]]
+            node_id = parent[node_id]
+        return node_id
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a == b:
+            return
+        if self._size[a] < self._size[b]:
+            a, b = b, a
+        self._parent[b] = a
+        self._size[a] += self._size.pop(b)
+
+    def component_size(self, node_id):
+        with self._lock:
+            node_id = self._canonical(node_id)
+            if node_id not in self.nodes:
+                raise KeyError(node_id)
+            return self._size[self._find(node_id)]
+
+    def connected(self, a, b):
+        with self._lock:
+            a, b = self._canonical(a), self._canonical(b)
+            for node_id in (a, b):
+                if node_id not in self.nodes:
+                    raise KeyError(node_id)
+            return self._find(a) == self._find(b)
+
+    def add_node(self, node_id, type, label=None, status="active", **attrs):
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = {"id": node_id, "type": type, "label": label or node_id, "status": status}
+            self.adjacency[node_id] = set()
+            self._parent[node_id] = node_id
+            self._size[node_id] = 1
+            self.version += 1
+        elif node["status"] != status:
+            node["status"] = status
+            self.version += 1
+        node.update(attrs)
+        return node
+
+    def add_link(self, a, b, kind, protocol=None, status="active"):
+        a, b = self._canonical(a), self._canonical(b)
+        if a == b:
+            return
+        key = (a, b) if a < b else (b, a)
+        link = self.links.get(key)
+        if link is None:
+            link = self.links[key] = {"source": key[0], "target": key[1], "kind": kind, "status": status,
+                                      "protocols": set()}
+            self.adjacency[a].add(b)
+            self.adjacency[b].add(a)
+            self._union(a, b)
+            self.version += 1
+        elif link["status"] != status:
+            link["status"] = status
+            self.version += 1
+        if protocol and protocol not in link["protocols"]:
+            link["protocols"].add(protocol)
+            self.version += 1
+
+    def fold(self, mac, ip):
+        """Merge the node for link-layer address ``mac`` into IP node ``ip``"""
+        if mac in self.aliases or mac == ip:
+            return
+        self.aliases[mac] = ip
+        node = self.nodes.get(ip)
+        if node is not None:
+            node["mac"] = mac
+        if mac not in self.nodes:
+            return
+        for neighbour in list(self.adjacency[mac]):
+            key = (mac, neighbour) if mac < neighbour else (neighbour, mac)
+            link = self.links.pop(key)
+            self.adjacency[neighbour].discard(mac)
+            if neighbour != ip:
+                self.add_link(ip, neighbour, link["kind"], status=link["status"])
+                merged = self.links[(ip, neighbour) if ip < neighbour else (neighbour, ip)]
+                merged["protocols"] |= link["protocols"]
+        del self.adjacency[mac]
+        del self.nodes[mac]
+        # The folded node stays in the union-find tree (others may point through it)
+        # but no longer counts towards its component's size
+        self._union(ip, mac)
+        self._size[self._find(ip)] -= 1
+        self.version += 1
+
+    def add_flow(self, source, destination, protocol):
+        ends = []
+        for address in (source, destination):
+            if address in SKIPPED_ADDRESSES:
+                return
+            address = self._canonical(address)
+            type = classify(address)
+            if type is None:
+                return
+            ends.append((address, type))
+        for address, type in ends:
+            self.add_node(address, type)
+        self.add_link(ends[0][0], ends[1][0], "traffic", protocol)
+
+    def add_binding(self, capture_name, ip, mac):
+        type = classify(ip)
+        if type is None or type == "device":
+            return
+        segment = f"segment:{capture_name}"
+        self.add_node(segment, "segment", label=f"{capture_name} LAN")
+        self.add_node(ip, type)
+        self.fold(mac, ip)
+        self.add_link(segment, ip, "arp")
+
+    def add_service(self, name, status, host=None, latency=None):
+        node_status = "active" if status == "Up" else "down"
+        self.add_node(MONITOR, "monitor", label="GovLink monitor")
+        service = f"service:{name}"
+        self.add_node(service, "service", label=name, status=node_status, latency=latency)
+        self.add_link(MONITOR, service, "probe", status=node_status)
+        if host:
+            host = self._canonical(host)
+            if host in self.nodes:
+                self.add_link(service, host, "probe", status=node_status)
+
+    def sync(self):
+        """Apply rows written since the last sync; returns how many were applied"""
+        from .models import Flow, HostAddress, NetworkStatus
+        from .probes import load_inventory
+
+        applied = 0
+        with self._lock:
+            query = HostAddress.objects.filter(id__gt=self.watermarks["address"]).order_by("id")
+            for pk, ip, mac, capture in query.values_list("id", "ip", "mac", "capture__name").iterator(_SYNC_CHUNK):
+                self.add_binding(capture, ip, mac)
+                self.watermarks["address"] = pk
+                applied += 1
+
+            query = Flow.objects.filter(id__gt=self.watermarks["flow"]).order_by("id")
+            for pk, source, destination, protocol in query.values_list(
+                "id", "source", "destination", "protocol"
+            ).iterator(_SYNC_CHUNK):
+                self.add_flow(source, destination, protocol)
+                self.watermarks["flow"] = pk
+                applied += 1
+
+            if not self.watermarks["status"]:
+                # First sync: only recent history matters for current service state
+                latest = NetworkStatus.objects.order_by("-id").values_list("id", flat=True).first() or 0
+                self.watermarks["status"] = max(latest - _SYNC_CHUNK, 0)
+            rows = list(
+                NetworkStatus.objects.filter(id__gt=self.watermarks["status"])
+                .order_by("id").values_list("id", "service", "status", "latency")
+            )
+            if rows:
+                try:
+                    hosts = {target.name: target.host for target in load_inventory()}
+                except (OSError, ValueError, TypeError):
+                    hosts = {}
+                latest = {service: (status, latency) for _, service, status, latency in rows}
+                for service, (status, latency) in latest.items():
+                    self.add_service(service, status, hosts.get(service), latency)
+                self.watermarks["status"] = rows[-1][0]
+                applied += len(rows)
+        return applied
+
+    def reachable(self, node_id, max_depth=None, limit=None):
+        """
+        Nodes reachable from ``node_id`` with their hop counts, nearest first.
+        The search stops once ``limit`` nodes besides the start are found.
+        """
+        with self._lock:
+            start = self._canonical(node_id)
+            if start not in self.adjacency:
+                raise KeyError(node_id)
+            depths = {start: 0}
+            frontier = deque([start])
+            while frontier:
+                current = frontier.popleft()
+                depth = depths[current]
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                for neighbour in self.adjacency[current]:
+                    if neighbour not in depths:
+                        depths[neighbour] = depth + 1
+                        frontier.append(neighbour)
+                        if limit is not None and len(depths) > limit:
+                            return depths
+            return depths
+
+    def shortest_path(self, source, target):
+        """Fewest-hop path as a list of node ids, or ``None``; bidirectional BFS"""
+        with self._lock:
+            source, target = self._canonical(source), self._canonical(target)
+            for node_id in (source, target):
+                if node_id not in self.adjacency:
+                    raise KeyError(node_id)
+            if source == target:
+                return [source]
+            if self._find(source) != self._find(target):
+                return None
+
+            parents = ({source: None}, {target: None})
+            frontiers = ([source], [target])
+            while frontiers[0] and frontiers[1]:
+                # Expand the smaller side; hubs (gateways) keep the other side cheap
+                side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+                seen, other = parents[side], parents[1 - side]
+                next_frontier = []
+                for current in frontiers[side]:
+                    for neighbour in self.adjacency[current]:
+                        if neighbour in seen:
+                            continue
+                        seen[neighbour] = current
+                        if neighbour in other:
+                            return self._join(parents, neighbour)
+                        next_frontier.append(neighbour)
+                frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+            return None
+
+    @staticmethod
+    def _join(parents, meeting):
+        path = []
+        node_id = meeting
+        while node_id is not None:
+            path.append(node_id)
+            node_id = parents[0][node_id]
+        path.reverse()
+        node_id = parents[1][meeting]
+        while node_id is not None:
+            path.append(node_id)
+            node_id = parents[1][node_id]
+        return path
+
+    def snapshot(self, limit=200, center=None, depth=2):
+        """
+        ``{"nodes": [...], "links": [...]}`` in the shape ``NetworkTopology.tsx``
+        expects: the ``limit`` best-connected nodes, or the neighbourhood of
+        ``center``. Cached until the graph changes.
+        """
+        with self._lock:
+            key = (limit, center, depth)
+            cached = self._snapshots.get(key)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+
+            if center is not None:
+                depths = self.reachable(center, depth)
+                selected = heapq.nsmallest(limit, depths, key=lambda n: (depths[n], -len(self.adjacency[n]), n))
+            else:
+                selected = heapq.nsmallest(limit, self.adjacency, key=lambda n: (-len(self.adjacency[n]), n))
+            chosen = set(selected)
+            nodes = [dict(self.nodes[n], degree=len(self.adjacency[n])) for n in selected]
+            links = []
+            for n in selected:
+                for neighbour in self.adjacency[n]:
+                    if neighbour in chosen and n < neighbour:
+                        link = self.links[(n, neighbour)]
+                        links.append(dict(link, protocols=sorted(link["protocols"])))
+            result = {
+                "nodes": nodes,
+                "links": links,
+                "total_nodes": len(self.nodes),
+                "total_links": len(self.links),
+            }
+            if len(self._snapshots) > 32:
+                self._snapshots.clear()
+            self._snapshots[key] = (self.version, result)
+            return result
+
+
+_graph = TopologyGraph()
+
+
+def get_topology():
+    """Return the process-wide graph, brought up to date with the database"""
+    _graph.sync()
+    return _graph
@@ -1,12 +1,39 @@
+from django.conf import settings
 from django.urls import path
-from .views import NetworkStatusList, LoginView
+from .views import LoginView
 from . import views
+from . import async_views
+from . import live
 
 urlpatterns = [
-    path('network-status/', NetworkStatusList.as_view(), name='network-status'),
+    path('network-status/', views.network_status_list, name='network-status'),
     path('login/', LoginView.as_view(), name="login"),
-    path('ask/', views.ask_openai, name='ask_openai'),
+    path('logout/', views.logout, name='logout'),
+    path('ask/', async_views.ask_openai, name='ask_openai'),
+    path('bandwidth-metrics/', views.bandwidth_metrics, name='bandwidth-metrics'),
     path('bandwidth/current/', views.real_time_bandwidth, name='real-time-bandwidth'),
-    path('bandwidth/speedtest/', views.speed_test, name='speed-test'),
-    path('network-action/', views.network_action, name='network-action'),
+    path('bandwidth/speedtest/', async_views.speed_test, name='speed-test'),
+    path('bandwidth/speedtest/history/', views.speed_test_history, name='speed-test-history'),
+    path('bandwidth/speedtest/<str:job_id>/', views.speed_test_status, name='speed-test-status'),
+    path('network-action/', async_views.network_action, name='network-action'),
+    path('live/stream/', live.live_stream, name='live-stream'),
+    path('captures/', views.capture_list, name='capture-list'),
+    path('captures/upload/', views.capture_upload, name='capture-upload'),
+    path('captures/<int:capture_id>/flows/', views.capture_flows, name='capture-flows'),
+    path('captures/<int:capture_id>/analytics/<str:kind>/', views.capture_analysis, name='capture-analytics'),
+    path('topology/', views.topology, name='topology'),
+    path('topology/path/', views.topology_path, name='topology-path'),
+    path('topology/reachable/', views.topology_reachable, name='topology-reachable'),
+    path('routing/', views.routing_recommendations, name='routing'),
+    path('routing/measurements/', views.routing_measurements, name='routing-measurements'),
+    path('alerts/', async_views.alerts, name='alerts'),
+    path('dashboard/snapshot/', async_views.dashboard_snapshot, name='dashboard-snapshot'),
+    path('ingest/batches/', views.ingest_batch, name='ingest-batch'),
+    path('ingest/agents/', views.collector_agents, name='collector-agents'),
+    path('metrics/range/', views.metric_range, name='metric-range'),
+    path(
+        'bandwidth/history/', views.metric_range,
+        {'metric': 'current_usage', 'service': settings.BANDWIDTH_SERVICE_NAME}, name='bandwidth-history',
+    ),
+    path('network-status/history/', views.metric_range, {'metric': 'latency'}, name='network-status-history'),
 ]
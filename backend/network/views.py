@@ -3,50 +3,127 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
-from .models import NetworkStatus, CustomUser, BandwidthMetrics
+from rest_framework_simplejwt.exceptions import TokenError
+from .models import NetworkStatus, CustomUser, BandwidthMetrics, Capture
 from .serializers import NetworkStatusSerializer
-from rest_framework.decorators import api_view
+from .pagination import NetworkStatusPagination
+from rest_framework.decorators import api_view, authentication_classes, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
 from django.conf import settings
-import openai
-from .network_monitor import RealTimeBandwidth, execute_ping
+from django.db import connection
+from django.utils import timezone
+from datetime import timedelta
+from .speedtest_jobs import get_runner as get_speed_test_runner
+from .capture_ingest import CAPTURE_EXTENSIONS, ingest_capture
+from pathlib import Path
+from .bandwidth_sampler import get_sampler
+from . import timeseries
+from .topology import get_topology
+from . import routing
+from .authentication import tokens_for, revoke
+from .http_cache import cache_response, status_scopes
+from . import agent as collector
+import hmac
 import json
 import os
 from dotenv import load_dotenv
-import requests
-from openai import OpenAI
 
 load_dotenv()  # Load environment variables
 
+STATUS_FIELDS = ('id', 'service', 'latency', 'packet_loss', 'status', 'timestamp')
+
+def latest_status_ids():
+    """
+    Id of the newest ``NetworkStatus`` row per service. A recursive CTE walks
+    the (service, id) index one distinct service at a time and each lookup is
+    a single index probe, so the cost depends on the number of services, not
+    the number of rows.
+    """
+    table = connection.ops.quote_name(NetworkStatus._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH RECURSIVE services(name) AS (
+                SELECT MIN(service) FROM {table}
+                UNION ALL
+                SELECT (SELECT MIN(service) FROM {table} WHERE service > services.name)
+                FROM services WHERE services.name IS NOT NULL
+            )
+            SELECT (SELECT id FROM {table} WHERE service = services.name ORDER BY id DESC LIMIT 1)
+            FROM services WHERE services.name IS NOT NULL
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
 class NetworkStatusList(generics.ListAPIView):
+    """
+    Probe history, newest first, one keyset-paginated page at a time.
+
+    Filters: ``service`` and ``status`` (comma-separated), ``from``/``to``
+    (ISO-8601 or epoch seconds). ``?latest=1`` returns just the newest row
+    per service instead.
+    """
     queryset = NetworkStatus.objects.all()
     serializer_class = NetworkStatusSerializer
+    pagination_class = NetworkStatusPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = NetworkStatus.objects.all()
+        if params.get('latest') in ('1', 'true'):
+            queryset = queryset.filter(id__in=latest_status_ids())
+        for field in ('service', 'status'):
+            values = [v for v in params.get(field, '').split(',') if v]
+            if values:
+                queryset = queryset.filter(**{f'{field}__in': values})
+        start = timeseries.parse_time(params.get('from'))
+        end = timeseries.parse_time(params.get('to'))
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        try:
+            queryset = self.get_queryset()
+        except (ValueError, OverflowError) as e:
+            return Response({'error': str(e)}, status=400)
+
+        # Plain dicts from values() skip per-field serializer work on large pages
+        rows = queryset.values(*STATUS_FIELDS)
+        if request.query_params.get('latest') in ('1', 'true'):
+            return Response(list(rows.order_by('service')))
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(page)
+
+
+def _status_list_scopes(request):
+    services = [v for v in request.GET.get('service', '').split(',') if v]
+    # A service filter only depends on those services' rows
+    return status_scopes(services)[1:] if services else ['network_status']
+
+network_status_list = cache_response(_status_list_scopes)(NetworkStatusList.as_view())
 
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        print("Raw Request Data:", request.data)  # Debugging
-
         email = request.data.get("email")
         password = request.data.get("password")
 
         if not email or not password:
-            print("Error: Missing email or password")  # Debugging
             return Response({"error": "Missing email or password"}, status=400)
 
-        try:
-            user = CustomUser.objects.get(email=email)
-        except CustomUser.DoesNotExist:
-            print("Error: User not found")  # Debugging
+        # One query by email; checking the password here avoids authenticate()
+        # loading the same row again by username
+        user = CustomUser.objects.filter(email=email).first()
+        if user is None:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            CustomUser().set_password(password)
             return Response({"error": "Invalid credentials"}, status=400)
 
-        # Authenticate using username (Django expects username, not email)
-        user = authenticate(username=user.username, password=password)
-
-        if user:
-            refresh = RefreshToken.for_user(user)
+        if user.is_active and user.check_password(password):
+            refresh = tokens_for(user)
             return Response(
                 {
                     "access_token": str(refresh.access_token),
@@ -61,111 +138,311 @@ class LoginView(APIView):
                 status=200,
             )
 
-        print("Error: Authentication failed")  # Debugging
         return Response({"error": "Invalid credentials"}, status=400)
 
 @api_view(['POST'])
-def ask_openai(request):
-    try:
-        question = request.data.get('question')
-        if not question:
-            return Response({'error': 'Question is required'}, status=400)
-
-        # AI/ML API configuration - using same setup as travel.py
-        base_url = "https://api.aimlapi.com/v1"
-        api_key = os.getenv('AI_ML_API_KEY')
-        
-        api = OpenAI(api_key=api_key, base_url=base_url)
-        
-        completion = api.chat.completions.create(
-            model="mistralai/Mistral-7B-Instruct-v0.2",
-            messages=[
-                {"role": "system", "content": "You are a network diagnostic assistant. Be descriptive and helpful with network-related questions."},
-                {"role": "user", "content": question},
-            ],
-            temperature=0.7,
-            max_tokens=256,
-        )
-
-        response = completion.choices[0].message.content
-        return Response({'response': response})
-            
-    except Exception as e:
-        print(f"AI/ML API Error: {str(e)}")
-        return Response({'error': 'Failed to get response from AI service'}, status=500)
+def logout(request):
+    """Revoke the presented access token and, if posted, the refresh token"""
+    if request.auth is None:
+        return Response({'error': 'Not authenticated'}, status=401)
+    revoke(request.auth)
+    refresh_token = request.data.get('refresh_token')
+    if refresh_token:
+        try:
+            revoke(RefreshToken(refresh_token))
+        except TokenError as e:
+            return Response({'error': str(e)}, status=400)
+    return Response({'message': 'Logged out'})
 
-@api_view(['GET'])
-def bandwidth_metrics(request):
-    metrics = BandwidthMetrics.objects.all()
-    data = [{
+def bandwidth_metric_rows():
+    return [{
         'service': m.service,
         'usage': m.usage_display(),
         'peakTime': m.peak_time.strftime('%H:%M')
-    } for m in metrics]
-    return Response(data)
+    } for m in BandwidthMetrics.objects.all()]
 
-bandwidth_monitor = RealTimeBandwidth()
+@cache_response(['bandwidth_metrics'])
+@api_view(['GET'])
+def bandwidth_metrics(request):
+    return Response(bandwidth_metric_rows())
+
+@api_view(['GET'])
+def metric_range(request, metric=None, service=None):
+    service = request.query_params.get('service', service)
+    metric = request.query_params.get('metric', metric)
+    if not service or not metric:
+        return Response({'error': 'service and metric are required'}, status=400)
+
+    try:
+        end = timeseries.parse_time(request.query_params.get('to'), default=timezone.now())
+        start = timeseries.parse_time(
+            request.query_params.get('from'), default=end - timedelta(hours=1)
+        )
+        step = timeseries.parse_step(request.query_params.get('step'))
+    except (ValueError, OverflowError) as e:
+        return Response({'error': str(e)}, status=400)
+    if start >= end:
+        return Response({'error': '"from" must be before "to"'}, status=400)
+
+    tier, step, points = timeseries.query_range(service, metric, start, end, step)
+    return Response({
+        'service': service,
+        'metric': metric,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'step': step,
+        'tier': tier,
+        'points': points,
+    })
 
 @api_view(['GET'])
 def real_time_bandwidth(request):
     try:
-        usage_data = bandwidth_monitor.get_network_usage()
+        sampler = get_sampler()
+        window = request.query_params.get('window')
+        if window is not None:
+            try:
+                window = int(window)
+            except ValueError:
+                return Response({'error': 'window must be an integer'}, status=400)
+            return Response({'samples': sampler.window(window)})
+
+        usage_data = sampler.current()
+        if usage_data is None:
+            return Response({'error': 'Bandwidth sampler is warming up'}, status=503)
         return Response(usage_data)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
-def speed_test(request):
+def speed_test_status(request, job_id):
+    job = get_speed_test_runner().get(job_id)
+    if job is None:
+        return Response({'error': 'Unknown speed test job'}, status=404)
+    return Response(job.as_dict())
+
+@api_view(['GET'])
+def speed_test_history(request):
+    return Response([job.as_dict() for job in get_speed_test_runner().history()])
+
+def _int_param(params, name, default=None):
+    value = params.get(name)
+    if value is None:
+        return default
+    return int(value)
+
+@cache_response(['topology'])
+@api_view(['GET'])
+def topology(request):
+    """Observed topology: the best-connected nodes, or ``?node=`` and its neighbourhood"""
+    params = request.query_params
     try:
-        speed_data = bandwidth_monitor.get_speed_test()
-        if speed_data:
-            return Response(speed_data)
-        return Response({'error': 'Speed test failed'}, status=500)
-    except Exception as e:
-        return Response({'error': str(e)}, status=500)
+        limit = min(_int_param(params, 'limit', settings.TOPOLOGY_SNAPSHOT_LIMIT), 5000)
+        depth = _int_param(params, 'depth', 2)
+    except ValueError:
+        return Response({'error': 'limit and depth must be integers'}, status=400)
+    try:
+        return Response({'result': get_topology().snapshot(limit=limit, center=params.get('node'), depth=depth)})
+    except KeyError:
+        return Response({'error': 'Unknown node'}, status=404)
+
+@api_view(['GET'])
+def topology_path(request):
+    source = request.query_params.get('source')
+    target = request.query_params.get('target')
+    if not source or not target:
+        return Response({'error': 'source and target are required'}, status=400)
+    try:
+        path = get_topology().shortest_path(source, target)
+    except KeyError as e:
+        return Response({'error': f'Unknown node: {e.args[0]}'}, status=404)
+    return Response({
+        'source': source,
+        'target': target,
+        'reachable': path is not None,
+        'hops': len(path) - 1 if path else None,
+        'path': path,
+    })
+
+@api_view(['GET'])
+def topology_reachable(request):
+    params = request.query_params
+    node = params.get('node')
+    if not node:
+        return Response({'error': 'node is required'}, status=400)
+    try:
+        depth = _int_param(params, 'depth')
+        limit = min(_int_param(params, 'limit', 500), 5000)
+    except ValueError:
+        return Response({'error': 'depth and limit must be integers'}, status=400)
+    graph = get_topology()
+    try:
+        if depth is None:
+            count = graph.component_size(node) - 1
+            depths = graph.reachable(node, limit=limit)
+        else:
+            depths = graph.reachable(node, depth)
+            count = len(depths) - 1
+    except KeyError:
+        return Response({'error': 'Unknown node'}, status=404)
+    # BFS order is already nearest first
+    nearest = [(node_id, hops) for node_id, hops in depths.items() if hops][:limit]
+    return Response({
+        'node': node,
+        'count': count,
+        'nodes': [{'id': node_id, 'hops': hops} for node_id, hops in nearest],
+    })
+
+@api_view(['GET'])
+def routing_recommendations(request):
+    """Failover recommendations per site; sites that should switch come first"""
+    try:
+        return Response(routing.current_recommendations(request.query_params.get('site')))
+    except KeyError:
+        return Response({'error': 'Unknown site'}, status=404)
 
 @api_view(['POST'])
-def network_action(request):
-    action = request.data.get('action')
-    ip_address = request.data.get('ip_address')
-    
-    if action == 'ping':
-        if not ip_address:
-            return Response({'error': 'IP address is required'}, status=400)
-        result = execute_ping(ip_address)
-        return Response(result)
-    
-    elif action == 'topology':
-        try:
-            # Get API key from environment variable
-            api_key = os.getenv('OPENAI_API_KEY')
-            client = openai.OpenAI(api_key=api_key)
-            
-            completion = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": """You are a network topology analyzer. 
-                    Generate a realistic network topology with nodes and links. 
-                    Return only valid JSON that matches this structure exactly:
-                    {
-                        "nodes": [
-                            {"id": "string", "type": "string", "label": "string", "status": "string"}
-                        ],
-                        "links": [
-                            {"source": "string", "target": "string", "status": "string"}
-                        ]
-                    }
-                    Include core routers, switches, firewalls, and servers. Make sure all IDs referenced in links exist in nodes."""},
-                    {"role": "user", "content": "Generate a realistic enterprise network topology with core infrastructure, servers, and security devices."}
-                ]
-            )
-            
-            # Parse the response and ensure it's valid JSON
-            topology_data = json.loads(completion.choices[0].message.content)
-            return Response({'result': topology_data})
-            
-        except Exception as e:
-            print(f"Topology generation error: {str(e)}")
-            return Response({'error': 'Failed to generate network topology'}, status=500)
-    
-    return Response({'error': 'Invalid action'}, status=400)
+def routing_measurements(request):
+    """Accept one measurement or a list from a site agent"""
+    measurements = request.data if isinstance(request.data, list) else [request.data]
+    parsed = []
+    try:
+        for item in measurements:
+            site, uplink = item.get('site'), item.get('uplink')
+            if not site or not uplink:
+                raise ValueError('site and uplink are required')
+            values = {}
+            for field, key in (('latency', 'latency'), ('loss', 'packet_loss'), ('throughput', 'throughput')):
+                if item.get(key) is not None:
+                    values[field] = routing.parse_measurement(item[key])
+            parsed.append((str(site), str(uplink), values, routing.parse_active(item.get('active'))))
+    except (AttributeError, TypeError, ValueError) as e:
+        return Response({'error': f'Invalid measurement: {str(e)}'}, status=400)
+
+    # Stored rather than observed here, so every worker's engine replays them
+    return Response({'accepted': routing.record_measurements(parsed)}, status=202)
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def ingest_batch(request):
+    """Store one compressed sample batch from a collector agent; replays are acknowledged, not rewritten"""
+    token = settings.AGENT_INGEST_TOKEN
+    if not token:
+        return Response({'error': 'Batch ingest is disabled; set AGENT_INGEST_TOKEN'}, status=403)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response({'error': 'Invalid agent token'}, status=403)
+    if request.headers.get('Content-Encoding') != 'deflate':
+        return Response({'error': 'Batches must be deflate-compressed'}, status=415)
+
+    body = request.body
+    try:
+        header, samples = collector.decode_batch(body, settings.INGEST_MAX_BATCH_BYTES)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    try:
+        agent, stored = collector.store_batch(header, samples, size=len(body))
+    except collector.EpochMismatch as e:
+        return Response({'error': str(e)}, status=409)
+    return Response(
+        {'agent': agent.agent_id, 'epoch': agent.epoch, 'seq': header['seq'], 'stored': stored,
+         'samples': len(samples) if stored else 0},
+        status=201 if stored else 200,
+    )
+
+@api_view(['GET'])
+def collector_agents(request):
+    """Sync state of every collector agent, least recently heard from first"""
+    return Response(collector.agent_states())
+
+def _capture_summary(capture):
+    return {
+        'id': capture.id,
+        'name': capture.name,
+        'packets': capture.packet_count,
+        'last_frame': capture.last_frame,
+        'bytes_processed': capture.bytes_processed,
+        'updated_at': capture.updated_at.isoformat(),
+    }
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def capture_upload(request):
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'error': 'A capture file is required'}, status=400)
+
+    name = Path(request.data.get('name') or upload.name or '').name
+    # Path('..').name is '..' and Path('.').name is '': both would resolve to a directory
+    if name in ('', '.', '..') or not name.lower().endswith(CAPTURE_EXTENSIONS):
+        return Response(
+            {'error': f"Capture name must be a file name ending in {', '.join(CAPTURE_EXTENSIONS)}"}, status=400,
+        )
+    capture_dir = Path(settings.CAPTURE_DIR)
+    capture_dir.mkdir(parents=True, exist_ok=True)
+    path = capture_dir / name
+    existed = Capture.objects.filter(name=name).exists()
+    with open(path, 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+
+    try:
+        capture, ingested = ingest_capture(path, name=name)
+    except ValueError as e:
+        if not existed:
+            # Don't leave a half-ingested capture and its file behind for a rejected upload
+            Capture.objects.filter(name=name).delete()
+            path.unlink(missing_ok=True)
+        return Response({'error': str(e)}, status=400)
+    return Response({**_capture_summary(capture), 'ingested': ingested}, status=201)
+
+@api_view(['GET'])
+def capture_list(request):
+    return Response([_capture_summary(c) for c in Capture.objects.order_by('-updated_at')])
+
+@api_view(['GET'])
+def capture_flows(request, capture_id):
+    try:
+        limit = min(int(request.query_params.get('limit', 100)), 1000)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    if limit < 1:
+        return Response({'error': 'limit must be at least 1'}, status=400)
+    try:
+        capture = Capture.objects.get(pk=capture_id)
+    except Capture.DoesNotExist:
+        return Response({'error': 'Unknown capture'}, status=404)
+    flows = capture.flows.order_by('-bytes').values(
+        'source', 'destination', 'protocol', 'packets', 'bytes', 'first_seen', 'last_seen'
+    )[:limit]
+    return Response(list(flows))
+
+@api_view(['GET'])
+def capture_analysis(request, capture_id, kind):
+    # numpy is only loaded once analytics are actually requested
+    from . import capture_analytics
+
+    try:
+        capture = Capture.objects.get(pk=capture_id)
+    except Capture.DoesNotExist:
+        return Response({'error': 'Unknown capture'}, status=404)
+
+    params = request.query_params
+    try:
+        columns = capture_analytics.load_columns(capture, cache_size=settings.CAPTURE_ANALYTICS_CACHE_SIZE)
+        if kind == 'talkers':
+            result = columns.top_talkers(int(params.get('n', 10)))
+        elif kind == 'protocols':
+            result = columns.protocol_mix()
+        elif kind == 'throughput':
+            result = columns.throughput(float(params.get('interval', 1)))
+        elif kind == 'arp-storms':
+            result = columns.arp_storms(float(params.get('window', 10)), float(params.get('threshold', 1)))
+        else:
+            return Response({'error': 'Unknown analysis'}, status=404)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    except OSError:
+        return Response({'error': 'Capture file is no longer available'}, status=410)
+
+    return Response({'capture': capture.name, 'packets': len(columns), 'result': result})
@@ -5,16 +5,45 @@ import { useRouter } from "next/navigation";
 import Navbar from "@/components/navbar";
 import SpeedChart from "@/components/SpeedChart";
 import RoutingMap from "@/components/RoutingMap";
-import { fetchNetworkStatus, fetchRealTimeBandwidth, runSpeedTest } from "@/lib/api";
+import {
+  askAI,
+  fetchAlerts,
+  fetchDashboardSnapshot,
+  fetchRealTimeBandwidth,
+  fetchRoutingRecommendations,
+  runSpeedTest,
+  subscribeLiveUpdates,
+} from "@/lib/api";
 import {
   networkHealthData,
-  aiAlertsData,
-  smartRoutingData,
   bandwidthAnalyticsData,
   offlineSyncData,
 } from "@/lib/dummyData";
 import NetworkTopology from "@/components/NetworkTopology";
 
+type Alert = {
+  id: number;
+  alert: string;
+  severity: "Critical" | "Warning" | "Info";
+  timestamp: string;
+  score: number;
+  resolved_at: string | null;
+};
+
+const SEVERITY_ORDER = { Critical: 2, Warning: 1, Info: 0 };
+
+// Open alerts first by severity, then by how anomalous they are
+const rankAlerts = (alerts: Alert[]) =>
+  [...alerts].sort((a, b) => SEVERITY_ORDER[b.severity] - SEVERITY_ORDER[a.severity] || b.score - a.score);
+
+type RoutingRecommendation = {
+  site: string;
+  currentRoute: string;
+  failover: string | null;
+  status: "Recommended" | "Not Needed";
+  reason: string;
+};
+
 // Define Type for Network Data
 type NetworkStatus = {
   service: string;
@@ -60,6 +89,8 @@ export default function Dashboard() {
   const [configOutput, setConfigOutput] = useState("");
   const [isConfiguring, setIsConfiguring] = useState(false);
   const [realTimeBandwidth, setRealTimeBandwidth] = useState(null);
+  const [alerts, setAlerts] = useState<Alert[]>([]);
+  const [routing, setRouting] = useState<RoutingRecommendation[]>([]);
   const [speedTestResults, setSpeedTestResults] = useState(null);
   const [isTestingSpeed, setIsTestingSpeed] = useState(false);
   const [selectedAction, setSelectedAction] = useState("");
@@ -113,24 +144,75 @@ export default function Dashboard() {
     if (!token) {
       router.push("/login"); // Redirect if no token
     } else {
-      fetchNetworkStatus().then((data) => setNetworkData(data));
+      // Initial panels in one request; the effects below keep them fresh
+      fetchDashboardSnapshot(["status", "bandwidth", "alerts", "routing"])
+        .then((snapshot) => {
+          if (Array.isArray(snapshot.status)) setNetworkData(snapshot.status);
+          if (snapshot.bandwidth?.current) setRealTimeBandwidth(snapshot.bandwidth.current);
+          if (Array.isArray(snapshot.alerts)) setAlerts(rankAlerts(snapshot.alerts));
+          if (Array.isArray(snapshot.routing)) setRouting(snapshot.routing);
+        })
+        .catch((error) => console.error('Error fetching dashboard snapshot:', error));
       setLoading(false); // Stop loading after authentication check
     }
   }, [router]);
 
-  // Add this effect for real-time updates
+  // Real-time bandwidth and anomaly alerts (opens/escalations/resolutions) share one
+  // pushed stream; poll if the browser can't stream or the backend isn't served over ASGI
   useEffect(() => {
-    const fetchBandwidth = async () => {
-      try {
-        const data = await fetchRealTimeBandwidth();
-        setRealTimeBandwidth(data);
-      } catch (error) {
-        console.error('Error fetching bandwidth:', error);
+    const startPolling = () => {
+      const fetchBandwidth = async () => {
+        try {
+          const data = await fetchRealTimeBandwidth();
+          setRealTimeBandwidth(data);
+        } catch (error) {
+          console.error('Error fetching bandwidth:', error);
+        }
+      };
+
+      // Bandwidth every second, alerts every 30 seconds
+      const interval = setInterval(fetchBandwidth, 1000);
+      const alertInterval = setInterval(() => {
+        fetchAlerts().then((data) => Array.isArray(data) && setAlerts(rankAlerts(data)));
+      }, 30000);
+      return () => {
+        clearInterval(interval);
+        clearInterval(alertInterval);
+      };
+    };
+
+    if (typeof EventSource === 'undefined') {
+      return startPolling();
+    }
+    let stopPolling: (() => void) | undefined;
+    const unsubscribe = subscribeLiveUpdates(
+      {
+        bandwidth: setRealTimeBandwidth,
+        alert: (alert: Alert) =>
+          setAlerts((current) => {
+            const others = current.filter((a) => a.id !== alert.id);
+            return rankAlerts(alert.resolved_at ? others : [...others, alert]);
+          }),
+      },
+      undefined,
+      () => {
+        if (!stopPolling) stopPolling = startPolling();
       }
+    );
+    return () => {
+      unsubscribe();
+      stopPolling?.();
     };
+  }, []);
+
+  // Failover recommendations are recomputed server-side as uplink measurements arrive
+  useEffect(() => {
+    const loadRouting = () =>
+      fetchRoutingRecommendations()
+        .then((data) => Array.isArray(data) && setRouting(data))
+        .catch((error) => console.error('Error fetching routing recommendations:', error));
 
-    // Update every second
-    const interval = setInterval(fetchBandwidth, 1000);
+    const interval = setInterval(loadRouting, 10000);
     return () => clearInterval(interval);
   }, []);
 
@@ -139,16 +221,7 @@ export default function Dashboard() {
     
     setIsAsking(true);
     try {
-      const response = await fetch('http://localhost:8000/api/ask/', {
-        method: 'POST',
-        headers: { 
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('access_token')}`
-        },
-        body: JSON.stringify({ question })
-      });
-      const data = await response.json();
-      setAiResponse(data.response);
+      await askAI(question, setAiResponse);
     } catch (error) {
       setAiResponse("Sorry, I couldn't process your question. Please try again.");
     }
@@ -163,23 +236,14 @@ export default function Dashboard() {
 
     setIsConfiguring(true);
     try {
-      const response = await fetch('http://localhost:8000/api/ask/', {
-        method: 'POST',
-        headers: { 
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('access_token')}`
-        },
-        body: JSON.stringify({ 
-          question: `Provide step-by-step configuration instructions for the following:
+      await askAI(`Provide step-by-step configuration instructions for the following:
             Device Type: ${selectedDeviceType}
             Model: ${selectedModel}
             Task: ${configTask}
             
-            Please provide the configuration steps in a clear, numbered format.`
-        })
-      });
-      const data = await response.json();
-      setConfigOutput(data.response);
+            Please provide the configuration steps in a clear, numbered format.`,
+        setConfigOutput
+      );
     } catch (error) {
       setConfigOutput("Sorry, I couldn't generate the configuration steps. Please try again.");
     }
@@ -287,23 +351,14 @@ Approximate round trip times in milli-seconds:
 
     setIsDiagnosing(true);
     try {
-      const response = await fetch('http://localhost:8000/api/ask/', {
-        method: 'POST',
-        headers: { 
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('access_token')}`
-        },
-        body: JSON.stringify({ 
-          question: `Diagnose this network error and provide a solution: ${errorCode}. 
+      await askAI(`Diagnose this network error and provide a solution: ${errorCode}. 
                     Please format your response as:
                     1. Error Description
                     2. Possible Causes
                     3. Recommended Solutions
-                    4. Prevention Tips`
-        })
-      });
-      const data = await response.json();
-      setDiagnosticResult(data.response);
+                    4. Prevention Tips`,
+        setDiagnosticResult
+      );
     } catch (error) {
       setDiagnosticResult("Sorry, I couldn't diagnose the error. Please try again.");
     }
@@ -427,10 +482,13 @@ Approximate round trip times in milli-seconds:
           <div className="bg-white p-6 shadow-md rounded-lg">
             <h2 className="text-lg md:text-xl font-semibold">AI-Powered Alerts & Insights</h2>
             <ul className="mt-4">
-              {aiAlertsData.map((alert) => (
+              {alerts.length === 0 && (
+                <li className="py-2 text-gray-500">No anomalies detected</li>
+              )}
+              {alerts.map((alert) => (
                 <li key={alert.id} className={`py-2 border-b ${alert.severity === "Critical" ? "text-red-500" : alert.severity === "Warning" ? "text-yellow-500" : "text-gray-600"}`}>
                   <span>{alert.alert}</span>
-                  <span className="text-sm text-gray-400 ml-2">{alert.timestamp}</span>
+                  <span className="text-sm text-gray-400 ml-2">{new Date(alert.timestamp).toLocaleTimeString()}</span>
                 </li>
               ))}
             </ul>
@@ -439,6 +497,23 @@ Approximate round trip times in milli-seconds:
 
         {/* Smart Routing & Bandwidth Analytics */}
         <div className="mt-6 grid grid-cols-1 lg:grid-cols-2 gap-6">
+          {/* Smart Routing */}
+          <div className="bg-white p-6 shadow-md rounded-lg">
+            <h2 className="text-lg md:text-xl font-semibold">Smart Routing & ISP Failover</h2>
+            <ul className="mt-4">
+              {routing.length === 0 && (
+                <li className="py-2 text-gray-500">No uplink measurements yet</li>
+              )}
+              {routing.map((route) => (
+                <li key={route.site} className={`py-2 border-b ${route.status === "Recommended" ? "text-yellow-600" : "text-gray-600"}`}>
+                  <span className="font-medium">{route.site}:</span> {route.currentRoute}
+                  {route.status === "Recommended" && <span> → switch to {route.failover}</span>}
+                  <span className="text-sm text-gray-400 ml-2">{route.reason}</span>
+                </li>
+              ))}
+            </ul>
+          </div>
+
           {/* Network Device Configuration */}
           <div className="bg-white p-6 shadow-md rounded-lg">
             <h2 className="text-lg md:text-xl font-semibold">Network Device Configuration</h2>
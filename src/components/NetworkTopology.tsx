@@ -16,6 +16,8 @@ interface Link {
 interface TopologyData {
   nodes: Node[];
   links: Link[];
+  total_nodes?: number;
+  total_links?: number;
 }
 
 interface NetworkTopologyProps {
@@ -27,10 +29,10 @@ interface NetworkTopologyProps {
 const NetworkTopology: React.FC<NetworkTopologyProps> = ({ data }) => {
   if (!data?.result) return null;
   
-  const { nodes, links } = data.result;
+  const { nodes, links, total_nodes, total_links } = data.result;
 
   return (
-    <div className="h-96 border rounded-md p-4">
+    <div className="h-96 border rounded-md p-4 overflow-y-auto">
       <div className="grid grid-cols-2 gap-4">
         {nodes.map((node) => (
           <div 
@@ -46,6 +48,8 @@ const NetworkTopology: React.FC<NetworkTopologyProps> = ({ data }) => {
       </div>
       <div className="mt-4 text-sm text-gray-500">
         {links.length} active connections
+        {total_nodes !== undefined && total_nodes > nodes.length &&
+          ` (showing ${nodes.length} of ${total_nodes} devices, ${total_links} connections)`}
       </div>
     </div>
   );
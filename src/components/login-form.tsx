@@ -33,6 +33,7 @@ export function LoginForm({ className, ...props }: React.ComponentProps<"div">)
       );
   
       localStorage.setItem("access_token", response.data.access_token);
+      localStorage.setItem("refresh_token", response.data.refresh_token);
       router.push("/dashboard");
     } catch (err) {
       setError("Invalid email or password");
@@ -4,6 +4,7 @@ import Image from "next/image";
 import { useEffect, useState } from "react";
 import { useRouter } from "next/navigation";
 import { Bell, UserCircle, LogOut, Settings, User } from "lucide-react"; // Icons
+import { logout } from "@/lib/api";
 
 export default function Navbar() {
   const router = useRouter();
@@ -20,7 +21,8 @@ export default function Navbar() {
   }, []);
 
   // Logout function
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    await logout();
     localStorage.removeItem("access_token");
     localStorage.removeItem("refresh_token");
     localStorage.removeItem("user");
@@ -2,8 +2,9 @@ import axios from "axios";
 
 const API_URL = "http://127.0.0.1:8000/api/";
 
+// Newest status per service; the full history is paginated at network-status/
 export const fetchNetworkStatus = async () => {
-  const response = await axios.get(`${API_URL}network-status/`);
+  const response = await axios.get(`${API_URL}network-status/`, { params: { latest: 1 } });
   return response.data;
 };
 
@@ -25,11 +26,117 @@ export const fetchRealTimeBandwidth = async () => {
     return response.json();
 };
 
-export const runSpeedTest = async () => {
-    const response = await fetch('http://localhost:8000/api/bandwidth/speedtest/', {
+export const fetchAlerts = async () => {
+    const response = await fetch('http://localhost:8000/api/alerts/', {
         headers: {
             'Authorization': `Bearer ${localStorage.getItem('access_token')}`
         }
     });
     return response.json();
 };
+
+export const fetchRoutingRecommendations = async () => {
+    const response = await fetch('http://localhost:8000/api/routing/', {
+        headers: {
+            'Authorization': `Bearer ${localStorage.getItem('access_token')}`
+        }
+    });
+    return response.json();
+};
+
+// Several dashboard panels in one request; sections that failed or timed out are listed in `errors`
+export const fetchDashboardSnapshot = async (fields: string[] = []) => {
+    const params = new URLSearchParams();
+    if (fields.length) params.set('fields', fields.join(','));
+    const response = await fetch(`http://localhost:8000/api/dashboard/snapshot/?${params}`, {
+        headers: {
+            'Authorization': `Bearer ${localStorage.getItem('access_token')}`
+        }
+    });
+    return response.json();
+};
+
+// Asks the assistant and calls onToken with the answer so far as tokens stream in
+export const askAI = async (question: string, onToken: (text: string) => void) => {
+    const response = await fetch('http://localhost:8000/api/ask/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${localStorage.getItem('access_token')}`
+        },
+        body: JSON.stringify({ question, stream: true })
+    });
+    if (!response.ok || !response.body) {
+        throw new Error((await response.json()).error || 'AI request failed');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let text = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        text += decoder.decode(value, { stream: true });
+        onToken(text);
+    }
+    return text;
+};
+
+// Submits a speed test job (or joins the one already running) and polls until it finishes
+export const runSpeedTest = async (pollIntervalMs = 2000) => {
+    const headers = {
+        'Authorization': `Bearer ${localStorage.getItem('access_token')}`,
+        'Content-Type': 'application/json'
+    };
+    let job = await (await fetch('http://localhost:8000/api/bandwidth/speedtest/', {
+        method: 'POST',
+        headers
+    })).json();
+
+    while (job.status === 'pending' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, pollIntervalMs));
+        job = await (await fetch(`http://localhost:8000/api/bandwidth/speedtest/${job.job_id}/`, {
+            headers
+        })).json();
+    }
+    return job.status === 'done' ? job.result : { error: job.error || 'Speed test failed' };
+};
+
+// Opens one Server-Sent Events connection for live bandwidth/status/alert pushes.
+// Returns a function that closes the stream.
+// onUnavailable runs if the server refuses the stream (e.g. 503 when not served over ASGI)
+export const subscribeLiveUpdates = (
+    handlers: { [topic: string]: (data: any) => void },
+    topics: string[] = Object.keys(handlers),
+    onUnavailable?: () => void
+) => {
+    const params = new URLSearchParams({ topics: topics.join(',') });
+    const token = localStorage.getItem('access_token');
+    if (token) params.set('token', token);
+
+    const source = new EventSource(`http://localhost:8000/api/live/stream/?${params}`);
+    topics.forEach((topic) => {
+        source.addEventListener(topic, (event) => {
+            handlers[topic]?.(JSON.parse((event as MessageEvent).data));
+        });
+    });
+    // EventSource retries dropped connections itself; CLOSED means the response was refused
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) onUnavailable?.();
+    };
+    return () => source.close();
+};
+
+// Revokes the current tokens server-side; the caller clears localStorage either way
+export const logout = async () => {
+    const token = localStorage.getItem('access_token');
+    if (!token) return;
+    await fetch('http://localhost:8000/api/logout/', {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ refresh_token: localStorage.getItem('refresh_token') }),
+    }).catch(() => undefined);
+};